@@ -14,7 +14,7 @@ class FaqHandler(BaseHandler):
         robot_id = kwargs.get("robot_id")
         method = kwargs.get("method")
         data = kwargs.get("data", {})
-        allowed_methods = ["add", "update", "delete", "ask"]
+        allowed_methods = ["add", "update", "delete", "ask", "bulk_add"]
         if method not in allowed_methods:
             raise MethodNotAllowException(method, allowed_methods)
 
@@ -35,6 +35,9 @@ class FaqHandler(BaseHandler):
     async def _handle_ask(self, robot_id, data):
         return await faq.faq_ask(robot_id, data["question"])
 
+    async def _handle_bulk_add(self, robot_id, data):
+        return await faq.faq_bulk_update(robot_id, data["items"], start=data.get("start", 0))
+
 
 class FaqChitchatHandler(FaqHandler):
     """处理基于FAQ的闲聊相关的请求."""
@@ -57,6 +60,11 @@ class FaqChitchatHandler(FaqHandler):
     async def _handle_ask(self, robot_id, data):
         return await faq.faq_chitchat_ask(robot_id, data["question"])
 
+    async def _handle_bulk_add(self, robot_id, data):
+        return await faq.faq_bulk_update(
+            robot_id, data["items"], chitchat=True, start=data.get("start", 0)
+        )
+
     async def _handle_delete(self, robot_id, data):
         ids = data.pop("chatfest_ids")
         data["faq_ids"] = ids
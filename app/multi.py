@@ -20,7 +20,7 @@ class NLUTrainHandler(BaseHandler):
             send_train_task(robot_code, version)
             return response_data
         elif method == "checkout":
-            return checkout(robot_code, MODEL_TYPE_NLU, version)
+            return await checkout(robot_code, MODEL_TYPE_NLU, version)
         else:
             raise MethodNotAllowException(method, "train, checkout")
 
@@ -32,9 +32,9 @@ class GraphHandler(BaseHandler):
         version = kwargs["version"]
         data = kwargs.get("data", None)
         if method == "train":
-            return graph_train(robot_code, version, data)
+            return await graph_train(robot_code, version, data)
         elif method == "checkout":
-            return checkout(robot_code, MODEL_TYPE_DIALOGUE, version)
+            return await checkout(robot_code, MODEL_TYPE_DIALOGUE, version)
         else:
             raise MethodNotAllowException(method, "train, checkout")
 
@@ -1,8 +1,8 @@
 from app.base import BaseHandler
-from backend import analyze, session_reply
+from backend import analyze, analyze_batch, session_reply
 from utils.define import FAQ_DEFAULT_PERSPECTIVE
 
-__all__ = ["ReplySessionHandler", "NLUHandler"]
+__all__ = ["ReplySessionHandler", "NLUHandler", "NLUBatchHandler"]
 
 
 class ReplySessionHandler(BaseHandler):
@@ -49,3 +49,11 @@ class NLUHandler(BaseHandler):
         text = kwargs["text"]
 
         return await analyze(robot_code, text)
+
+
+class NLUBatchHandler(BaseHandler):
+    async def _get_result_dict(self, **kwargs):
+        robot_code = kwargs["robot_id"]
+        texts = kwargs["texts"]
+
+        return await analyze_batch(robot_code, texts)
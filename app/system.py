@@ -1,12 +1,19 @@
 from app.base import BaseHandler
-from backend import cluster, delete, delete_graph, push, sensitive_words
+from app.executor import send_train_task
+from backend import (apply_bundle, bundle_manifest, cluster, cluster_status,
+                     delete, delete_graph, invalidate_faq_cache, metrics,
+                     push, sensitive_words)
+from utils.exceptions import MethodNotAllowException
 
 __all__ = [
     "PushHandler",
+    "BundleHandler",
     "DeleteHandler",
     "ClusterHandler",
+    "ClusterStatusHandler",
     "DeleteGraphHandler",
     "SensitiveWordsHandler",
+    "MetricsHandler",
 ]
 
 
@@ -17,6 +24,26 @@ class PushHandler(BaseHandler):
         return await push(robot_code, version)
 
 
+class BundleHandler(BaseHandler):
+    """正式环境接收测试环境推送的模型包."""
+
+    async def _get_result_dict(self, **kwargs):
+        method = kwargs["method"]
+        robot_code = kwargs["robot_id"]
+        if method == "manifest":
+            return bundle_manifest(robot_code)
+        elif method == "apply":
+            version = kwargs["version"]
+            response_data = await apply_bundle(robot_code, version, kwargs["data"])
+            if response_data["nlu_updated"]:
+                send_train_task(robot_code, version)
+            return response_data
+        elif method == "invalidate_faq_cache":
+            return await invalidate_faq_cache(robot_code)
+        else:
+            raise MethodNotAllowException(method, "manifest, apply, invalidate_faq_cache")
+
+
 class DeleteHandler(BaseHandler):
     async def _get_result_dict(self, **kwargs):
         robot_code = kwargs["robot_id"]
@@ -27,7 +54,7 @@ class DeleteGraphHandler(BaseHandler):
     async def _get_result_dict(self, **kwargs):
         robot_code = kwargs["robot_id"]
         graph_id = kwargs["graph_id"]
-        return delete_graph(robot_code, graph_id)
+        return await delete_graph(robot_code, graph_id)
 
 
 class ClusterHandler(BaseHandler):
@@ -36,6 +63,12 @@ class ClusterHandler(BaseHandler):
         return cluster(robot_code)
 
 
+class ClusterStatusHandler(BaseHandler):
+    async def _get_result_dict(self, **kwargs):
+        job_id = kwargs["job_id"]
+        return cluster_status(job_id)
+
+
 class SensitiveWordsHandler(BaseHandler):
     async def _get_result_dict(self, **kwargs):
         robot_code = kwargs["robot_id"]
@@ -45,3 +78,8 @@ class SensitiveWordsHandler(BaseHandler):
         # TODO
         strict = False
         return await sensitive_words(robot_code, text, labels, strict)
+
+
+class MetricsHandler(BaseHandler):
+    async def _get_result_dict(self, **kwargs):
+        return metrics()
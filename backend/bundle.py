@@ -0,0 +1,145 @@
+"""推送到正式环境的模型包.
+
+模型包包含机器人某个版本的全部对话流程配置和nlu训练数据，每一部分称为一个part，名称为 ``graph/<对话流程id>`` 或者 ``nlu``。
+manifest 记录每个part内容的hash值，推送时先获取正式环境的manifest，只发送hash值发生变化的part，
+正式环境校验完整个模型包之后再一次性应用，并保存新的manifest。传输时模型包经过gzip压缩和base64编码。
+"""
+import base64
+import binascii
+import gzip
+import json
+import os
+from os.path import exists, join
+
+from config import global_config
+from utils.exceptions import BundleCorruptedException
+from utils.funcs import hash_string
+
+__all__ = [
+    "graph_part",
+    "part_hash",
+    "make_bundle",
+    "diff_bundle",
+    "encode_bundle",
+    "decode_bundle",
+    "load_manifest",
+    "save_manifest",
+    "clear_manifest",
+]
+
+NLU_PART = "nlu"
+_GRAPH_PREFIX = "graph/"
+_MANIFEST_FILE = "bundle_manifest.json"
+
+graph_storage_folder = global_config["graph_storage_folder"]
+
+
+def graph_part(graph_id):
+    """对话流程配置对应的part名称."""
+    return _GRAPH_PREFIX + graph_id
+
+
+def is_graph_part(name):
+    return name.startswith(_GRAPH_PREFIX)
+
+
+def graph_id_of(name):
+    return name[len(_GRAPH_PREFIX):]
+
+
+def part_hash(data):
+    """计算part内容的hash值，对话流程配置中保存的版本号不参与计算."""
+    if isinstance(data, dict) and "version" in data:
+        data = {key: value for key, value in data.items() if key != "version"}
+    content = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    return hash_string(content.encode("utf-8"))
+
+
+def make_bundle(graphs, nlu_data):
+    """生成模型包.
+
+    Args:
+        graphs (dict): key为对话流程id，value为对话流程配置
+        nlu_data (dict): nlu训练数据，没有时为None
+
+    Returns:
+        dict: manifest为 part名称 -> hash值，parts为 part名称 -> 内容
+    """
+    parts = {graph_part(graph_id): data for graph_id, data in graphs.items()}
+    if nlu_data:
+        parts[NLU_PART] = nlu_data
+    return {"manifest": {name: part_hash(data) for name, data in parts.items()}, "parts": parts}
+
+
+def diff_bundle(bundle, remote_manifest):
+    """只保留与对方manifest中hash值不同的part.
+
+    Args:
+        bundle (dict): make_bundle生成的模型包
+        remote_manifest (dict): 对方当前的manifest
+
+    Returns:
+        dict: 需要发送的模型包，manifest不变，如果与对方完全一致则返回None
+    """
+    if bundle["manifest"] == remote_manifest:
+        return None
+    parts = {
+        name: data
+        for name, data in bundle["parts"].items()
+        if remote_manifest.get(name) != bundle["manifest"][name]
+    }
+    return {"manifest": bundle["manifest"], "parts": parts}
+
+
+def encode_bundle(bundle):
+    """压缩并编码为可以放在json中传输的字符串."""
+    content = json.dumps(bundle, ensure_ascii=False).encode("utf-8")
+    return base64.b64encode(gzip.compress(content)).decode("ascii")
+
+
+def decode_bundle(text):
+    """encode_bundle的逆操作，并校验每个part的hash值.
+
+    Raises:
+        BundleCorruptedException: 模型包无法解码，或者part的内容与manifest中的hash值不一致
+    """
+    try:
+        bundle = json.loads(gzip.decompress(base64.b64decode(text)).decode("utf-8"))
+    except (binascii.Error, OSError, EOFError, ValueError) as error:
+        raise BundleCorruptedException("模型包无法解码: {}".format(error))
+    for name, data in bundle["parts"].items():
+        if name not in bundle["manifest"]:
+            raise BundleCorruptedException("模型包的manifest中没有{}".format(name))
+        if part_hash(data) != bundle["manifest"][name]:
+            raise BundleCorruptedException("模型包中{}的内容校验失败".format(name))
+    return bundle
+
+
+def _get_manifest_path(robot_code):
+    return join(graph_storage_folder, robot_code, _MANIFEST_FILE)
+
+
+def load_manifest(robot_code):
+    """读取最后一次应用的模型包的manifest，不存在时返回空的manifest."""
+    path = _get_manifest_path(robot_code)
+    if not exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(robot_code, manifest):
+    """保存manifest，先写入临时文件再重命名."""
+    path = _get_manifest_path(robot_code)
+    os.makedirs(join(graph_storage_folder, robot_code), exist_ok=True)
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def clear_manifest(robot_code):
+    """机器人的配置在模型包之外被修改时清除manifest，下一次推送会发送完整的模型包."""
+    path = _get_manifest_path(robot_code)
+    if exists(path):
+        os.remove(path)
@@ -1,12 +1,15 @@
-import time
-
 from backend.dialogue import nodes
 from backend.dialogue.context import StateTracker
+from backend.dialogue.nodes.builtin.planner import AbilityPlanner
+from backend.dialogue.session import create_session_store
 from config import global_config
+from utils.define import FAQ_PREFETCH_CHITCHAT, FAQ_PREFETCH_OFF
 from utils.exceptions import (ConversationNotFoundException,
                               DialogueStaticCheckException)
 
 conversation_expired_time = global_config["conversation_expired_time"]
+FAQ_PREFETCH = global_config["faq_prefetch"]
+FAQ_PREFETCH_DEFAULT = global_config["faq_prefetch_default"]
 
 TYPE_NODE_MAPPING = {
     node.NODE_NAME: node
@@ -34,23 +37,29 @@ class Agent(object):
         robot_code (str): 机器人唯一标识
         interpreter (backend.nlu.interpreter.CustormInterpreter): nlu语义理解器
         graphs (dict): 对话流程配置，key为graph的id，value为该graph的具体配置
-        user_store (dict): 会话状态存储字典。key为会话id，value为 `StateTracker`对象
+        user_store (SessionStore): 会话状态存储，按照最后活跃时间过期，参见backend.dialogue.session
         graphs (dict): 机器人主导的对话流程图集合。key为graph的id，value为该graph的起始节点
+        graph_nodes (dict): key为graph的id，value为该graph中 节点id -> 节点 的映射
         robot_ledding_graphs (dict): 用户主导的对话起始节点集合
+        ability_planner (AbilityPlanner): 对话流程中引用到的内置识别能力
+        faq_prefetch (str): faq预取策略，参见utils.define中的FAQ_PREFETCH_*
     """
 
     def __init__(self, robot_code, interpreter, graphs):
         self.robot_code = robot_code
         self.interpreter = interpreter
         self.graph_configs = graphs
-        # save the user states in memory
-        self.user_store = dict()
+        self.graph_nodes = {}
+        self.user_store = create_session_store(
+            robot_code, conversation_expired_time, lambda state: StateTracker.load_state(self, state)
+        )
 
         self.graphs = {
-            graph_id: self.build_graph(graph)
+            graph_id: self.build_graph(graph, graph_id)
             for graph_id, graph in self.graph_configs.items()
         }
         self.slots_abilities = {}
+        self.faq_prefetch = FAQ_PREFETCH.get(robot_code, FAQ_PREFETCH_DEFAULT)
         self._init_graphs()
 
     def _init_graphs(self):
@@ -61,8 +70,11 @@ class Agent(object):
             internal_abilities.update(
                 self.graph_configs[graph_id]["global_slots"].values()
             )
+        # 只预加载对话流程用到的内置识别能力依赖的模型
+        self.ability_planner = AbilityPlanner(internal_abilities)
+        self.ability_planner.load_models()
 
-    def build_graph(self, graph):
+    def build_graph(self, graph, graph_id):
         """
         将对话流程配置构造成节点图
         """
@@ -76,6 +88,7 @@ class Agent(object):
                 )
             node_class = TYPE_NODE_MAPPING[node_type]
             nodes_mapping[node_id] = node_class(node_meta)
+            nodes_mapping[node_id].graph_id = graph_id
             # 静态检查节点
             try:
                 nodes_mapping[node_id].static_check()
@@ -118,32 +131,53 @@ class Agent(object):
                 raise DialogueStaticCheckException(
                     "node_type", "对话流程根节点的类型必须是开始节点", node.config.get("node_id", "未知")
                 )
+        self.graph_nodes[graph_id] = nodes_mapping
         return start_nodes
 
-    def update_dialogue_graph(self, graph):
+    async def update_dialogue_graph(self, graph):
         """
         更新Agent中的nlu解释器和对话流程配置，此操作会清空所有的缓存对话
         """
         graph_id = graph["id"]
         self.graph_configs[graph_id] = graph
-        self.graphs[graph_id] = self.build_graph(graph)
+        self.graphs[graph_id] = self.build_graph(graph, graph_id)
         self._init_graphs()
         # 清空所有会话缓存
-        self.user_store = {}
+        await self.user_store.clear()
 
-    def delete_dialogue_graph(self, graph_id):
+    async def delete_dialogue_graph(self, graph_id):
         """
-        删除Agent中的对话流程配置
+        删除Agent中的对话流程配置，此操作会清空所有的缓存对话
         """
         if graph_id in self.graph_configs:
             del self.graph_configs[graph_id]
         if graph_id in self.graphs:
             del self.graphs[graph_id]
+        self.graph_nodes.pop(graph_id, None)
+        # 会话的游标可能指向被删除的对话流程
+        await self.user_store.clear()
 
-    def update_interpreter(self, interpreter):
+    async def update_interpreter(self, interpreter):
+        # 旧模型的解析结果缓存不再使用
+        self.interpreter.clear_cache()
         self.interpreter = interpreter
         # 清空所有会话的缓存
-        self.user_store = {}
+        await self.user_store.clear()
+
+    async def _process_message(self, message, sender_id, params, **kwargs):
+        state_tracker = await self.user_store.load(sender_id)
+        if state_tracker is None:
+            state_tracker = StateTracker(self, sender_id, params)
+        raw_message = await self.interpreter.parse(message)
+        if self.faq_prefetch != FAQ_PREFETCH_OFF:
+            raw_message.prefetch_faq(with_chitchat=self.faq_prefetch == FAQ_PREFETCH_CHITCHAT)
+        try:
+            state_tracker.update_params(params)
+            response = await state_tracker.handle_message(raw_message, **kwargs)
+        finally:
+            # 对话流程没有用到faq时，取消预取
+            raw_message.cancel_faq_prefetch()
+        return state_tracker, response
 
     async def handle_message(self, message, sender_id, params={}, **kwargs):
         """回复用户
@@ -158,28 +192,35 @@ class Agent(object):
         Returns:
             str: 小语机器人答复用户的内容
         """
-        self._clear_expired_session()
-        if sender_id not in self.user_store:
-            self._clear_expired_session()
-            state_tracker = StateTracker(self, sender_id, params)
-            self.user_store[sender_id] = state_tracker
-        state_tracker = self.user_store[sender_id]
-        raw_message = await self.interpreter.parse(message)
-        state_tracker.update_params(params)
-        response = await state_tracker.handle_message(raw_message, **kwargs)
+        state_tracker, response = await self._process_message(message, sender_id, params, **kwargs)
+        await self.user_store.save(state_tracker)
         return response
 
-    def _clear_expired_session(self):
-        """清理过期的会话"""
-        expired_list = []
-        for uid, context in self.user_store.items():
-            if time.time() - context.start_time > conversation_expired_time:
-                expired_list.append(uid)
+    async def reply(self, message, sender_id, params={}, traceback=False, **kwargs):
+        """回复用户，并返回小语平台格式的对话数据
 
-        for uid in expired_list:
-            del self.user_store[uid]
+        与先调用handle_message再调用get_latest_xiaoyu_pack的结果相同，但是只读写一次会话存储。
 
-    def session_exists(self, sender_id):
+        Args:
+            message (str): 用户说话的内容
+            sender_id (str): 会话id
+            params (dict): 建立连接时的参数，一般是首次发起会话时会传递此参数
+            traceback (bool): Default is False. 是否返回调试信息
+            **kwargs: StateTracker.handle_message方法的额外参数
+
+        Returns:
+            dict: 具体参见context.StateTracker.get_latest_xiaoyu_pack
+        """
+        state_tracker, _ = await self._process_message(message, sender_id, params, **kwargs)
+        xiaoyu_pack = state_tracker.get_latest_xiaoyu_pack(traceback=traceback)
+        await self.user_store.save(state_tracker)
+        return xiaoyu_pack
+
+    def clear_expired_sessions(self):
+        """清理过期的会话，由服务的定时任务调用，参见SessionStore.sweep"""
+        return self.user_store.sweep()
+
+    async def session_exists(self, sender_id):
         """
         判断当前会话是否存在
 
@@ -189,13 +230,19 @@ class Agent(object):
         Return:
             bool: 会话存在返回True，反之返回False
         """
-        return sender_id in self.user_store
-
-    def get_latest_xiaoyu_pack(self, uid, traceback=False):
+        return await self.user_store.load(sender_id) is not None
 
-        if uid not in self.user_store:
+    async def get_latest_xiaoyu_pack(self, uid, traceback=False):
+        state_tracker = await self.user_store.load(uid)
+        if state_tracker is None:
             raise ConversationNotFoundException(self.robot_code, uid)
-        return self.user_store.get(uid).get_latest_xiaoyu_pack(traceback=traceback)
+        return state_tracker.get_latest_xiaoyu_pack(traceback=traceback)
+
+    def get_node(self, cursor):
+        """
+        获取游标所在的节点，对话流程或者节点不存在时返回None
+        """
+        return self.graph_nodes.get(cursor.graph_id, {}).get(cursor.node_id)
 
     def get_graph_meta_by_id(self, graph_id, key):
         """
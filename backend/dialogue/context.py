@@ -1,11 +1,50 @@
 import re
+import sys
 import time
+from collections import deque, namedtuple
 
+from backend.dialogue.cursor import NodeCursor
+from config import global_config
 from utils.define import UNK
 from utils.exceptions import DialogueRuntimeException
-from utils.funcs import get_time_stamp
+from utils.funcs import deep_getsizeof, get_time_stamp
 
 FAQ_FLAG = "flag_faq"  # 标识当前返回的为faq
+# 每个会话保留的历史记录条数
+HISTORY_DEPTH = int(global_config["session_history_depth"])
+# 精简记录中保留的用户说话内容的长度
+RECORD_TEXT_LENGTH = 32
+
+# 较早一轮对话中用户消息的精简记录
+# turn为消息的序号，从1开始
+TurnRecord = namedtuple("TurnRecord", ["turn", "intent", "faq_id", "text"])
+
+
+class MessageRecorder(object):
+    """用户消息的记录，只保留最近一条完整的消息对象，更早的消息转换为精简记录.
+
+    Attributes:
+        latest (backend.nlu.Message): 最近一条消息，没有消息时为None
+        records (collections.deque): 更早的消息的精简记录，最多保留depth条
+        count (int): 累计收到的消息条数
+    """
+
+    def __init__(self, depth=HISTORY_DEPTH):
+        self.latest = None
+        self.records = deque(maxlen=depth)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, msg):
+        """记录新的消息，上一条消息只保留精简记录."""
+        latest = self.latest
+        if latest is not None:
+            text = latest.text[:RECORD_TEXT_LENGTH]
+            self.records.append(TurnRecord(self.count, latest.intent, latest.get_faq_id(), text))
+        self.latest = msg
+        self.count += 1
 
 
 class StateTracker(object):
@@ -20,18 +59,20 @@ class StateTracker(object):
         slots_abilities (dict): 每个全局槽位对应的识别能力
         params (dict): 全局参数，流程配置中的global_params字段
         user_id (str): 会话的唯一标识
-        state_recorder (list): 记录经过的每个节点的名称
-        type_recorder (list): 记录经过每个节点的类型信息
-        msg_recorder (list): 每个元素是一个backend.nlu.Message对象，记录每轮对话用户的回复，和nlu理解信息。
-        response_recorder (list): 每个元素记录机器人每一轮对话的回复内容
+        current_state (NodeCursor): 当前对话流程的执行位置，没有正在进行的对话流程时为None
+        state_recorder (collections.deque): 记录最近经过的节点的名称
+        type_recorder (collections.deque): 记录最近经过的节点的类型信息
+        msg_recorder (MessageRecorder): 记录每轮对话用户的回复，和nlu理解信息，只有最近一条是完整的backend.nlu.Message对象
+        response_recorder (collections.deque): 每个元素记录机器人最近每一轮对话的回复内容
         start_time (str): 对话开始时间，为float格式，直接由time.time()得到
         turn_id (int): 当前对话轮数记录
         slot_setting_turns (dict): 槽位填充对应的对话轮数，key为槽位名称，value为轮数
-        time_stamp_turns (list): 记录每一轮对话的时间，每个元素的格式为(开始时间，结束时间)
-                                格式与start_time字段相同，列表元素个数与总的对话轮数相同。
+        time_stamp_turns (collections.deque): 记录最近每一轮对话的时间，每个元素的格式为(开始时间，结束时间)
+                                格式与start_time字段相同。
         is_end (bool): 记录对话是否结束，True为结束，False为未结束。
         dialog_status (str): # 对话状态码。“0”为正常对话流程，“10”为用户主动转人工，“11”为未识别转人工，“20”为机器人挂断
         current_graph_id (str): 记录当前的对话流程术语那个对话流程id
+        version (int): 会话状态在会话存储中的版本号，每次保存加一
 
     """
 
@@ -44,17 +85,105 @@ class StateTracker(object):
         self.params = params
         self.user_id = user_id
         self.current_state = None
-        self.state_recorder = list()
-        self.type_recorder = list()
-        self.msg_recorder = list()
-        self.response_recorder = list()
+        # 历史记录只保留最近的HISTORY_DEPTH条
+        self.state_recorder = deque(maxlen=HISTORY_DEPTH)
+        self.type_recorder = deque(maxlen=HISTORY_DEPTH)
+        self.msg_recorder = MessageRecorder()
+        self.response_recorder = deque(maxlen=HISTORY_DEPTH)
         self.start_time = time.time()
         self.turn_id = 0
         self.entity_setting_turns = {}
-        self.time_stamp_turns = []
+        self.time_stamp_turns = deque(maxlen=HISTORY_DEPTH)
         self.is_end = False
         self.dialog_status = "0"
         self.current_graph_id = ""
+        self.transfer_manual = "0"
+        self.version = 0
+
+    # 保存会话状态时需要序列化的字段，都是json可以表示的数据
+    STATE_FIELDS = (
+        "slots",
+        "slots2alias",
+        "slots2warning",
+        "params",
+        "start_time",
+        "turn_id",
+        "entity_setting_turns",
+        "is_end",
+        "dialog_status",
+        "current_graph_id",
+        "transfer_manual",
+    )
+    # 保存为列表的历史记录字段
+    HISTORY_FIELDS = ("state_recorder", "type_recorder", "response_recorder", "time_stamp_turns")
+
+    def dump_state(self):
+        """导出会话状态，用于保存到外部的会话存储.
+
+        消息记录只保留最近一条消息中生成对话返回数据需要的字段，以及更早的消息的精简记录。
+
+        Returns:
+            dict: 可以直接转换为json的会话状态
+        """
+        state = {field: getattr(self, field) for field in self.STATE_FIELDS}
+        for field in self.HISTORY_FIELDS:
+            state[field] = list(getattr(self, field))
+        state["user_id"] = self.user_id
+        state["current_state"] = self.current_state.to_list() if self.current_state else None
+        latest_msg = self.msg_recorder.latest
+        state["msg"] = latest_msg.dump_state() if latest_msg is not None else None
+        state["msg_records"] = [list(record) for record in self.msg_recorder.records]
+        state["msg_count"] = self.msg_recorder.count
+        return state
+
+    @classmethod
+    def load_state(cls, agent, state):
+        """从dump_state导出的状态恢复会话.
+
+        Args:
+            agent (backend.dialogue.agent.Agent): 会话所属的机器人
+            state (dict): dump_state的返回值
+
+        Returns:
+            StateTracker: 恢复的会话
+        """
+        state_tracker = cls(agent, state["user_id"], {})
+        slots = state_tracker.slots
+        for field in cls.STATE_FIELDS:
+            setattr(state_tracker, field, state[field])
+        for field in cls.HISTORY_FIELDS:
+            getattr(state_tracker, field).extend(state[field])
+        # 对话流程更新后可能增加了新的槽位
+        state_tracker.slots = dict(slots, **state_tracker.slots)
+        if state["current_state"] is not None:
+            cursor = NodeCursor.from_list(state["current_state"])
+            # 对话流程更新后节点可能已经不存在，这时在下一轮对话重新触发对话流程
+            if agent.get_node(cursor) is not None:
+                state_tracker.current_state = cursor
+        msg_recorder = state_tracker.msg_recorder
+        msg_recorder.records.extend(TurnRecord(*record) for record in state["msg_records"])
+        if state["msg"] is not None:
+            msg_recorder.latest = agent.interpreter.get_empty_msg()
+            msg_recorder.latest.load_state(state["msg"])
+        msg_recorder.count = state["msg_count"]
+        return state_tracker
+
+    def memory_size(self):
+        """估算会话占用的内存字节数，不包括与其他会话共享的对话流程配置和语义理解模型.
+
+        Returns:
+            int: 内存字节数
+        """
+        seen = set()
+        size = sys.getsizeof(self) + sys.getsizeof(self.__dict__)
+        for field in self.STATE_FIELDS + self.HISTORY_FIELDS:
+            size += deep_getsizeof(getattr(self, field), seen)
+        size += deep_getsizeof(self.msg_recorder.records, seen)
+        if self.current_state is not None:
+            size += deep_getsizeof(self.current_state.to_list(), seen)
+        if self.msg_recorder.latest is not None:
+            size += self.msg_recorder.latest.memory_size()
+        return size
 
     def update_params(self, params):
         """
@@ -128,7 +257,7 @@ class StateTracker(object):
             # 注意这里一定要先设置当前id，开始节点的调试信息会用到
             self.current_graph_id = triggered_id
             node = triggered_graph[0]
-            self.current_state = node(self)
+            self.current_state = node.cursor()
             self.state_recorder.append(node.config["node_id"])
             self.type_recorder.append(node.NODE_NAME)
             self.reset_status()
@@ -193,7 +322,12 @@ class StateTracker(object):
 
             else:
                 while True:
-                    response = await self.current_state.__anext__()
+                    node = self.agent.get_node(self.current_state)
+                    if node is None:
+                        # 对话流程更新或删除后节点可能已经不存在，与load_state相同，重新触发对话流程
+                        self.current_state = None
+                        return await run()
+                    response = await node.run(self, self.current_state)
                     if response == FAQ_FLAG:
                         # 对话流程内部触发FAQ
                         response = await self.perform_faq()
@@ -207,7 +341,7 @@ class StateTracker(object):
                         # 这种情况下是节点进行切换
                         self.state_recorder.append(response.config["node_id"])
                         self.type_recorder.append(response.NODE_NAME)
-                        self.current_state = response(self)
+                        self.current_state = response.cursor()
                     else:
                         self.current_state = None
                         return await run()
@@ -221,9 +355,9 @@ class StateTracker(object):
         return self.response_recorder[-1]
 
     def _latest_msg(self):
-        if len(self.msg_recorder) == 0:
+        if self.msg_recorder.latest is None:
             return self.agent.interpreter.get_empty_msg()
-        return self.msg_recorder[-1]
+        return self.msg_recorder.latest
 
     def add_traceback_data(self, data):
         """
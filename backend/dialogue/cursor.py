@@ -0,0 +1,41 @@
+"""对话流程的执行位置.
+
+节点的执行过程被拆分为若干步，每次回复用户之后节点暂停，下一条用户消息到达时从暂停的那一步继续执行。
+游标记录了当前所在的节点、节点执行到哪一步，以及节点在多轮对话之间需要保留的局部变量（如填槽节点当前的槽位序号、重复询问的次数），
+游标只包含可以转换为json的数据，可以随会话状态一起保存，在其他服务进程中恢复。
+"""
+
+__all__ = ["NodeCursor", "STEP_START", "STEP_ENTER"]
+
+# 还没有开始执行节点
+STEP_START = 0
+# 开始执行节点，节点自定义的步骤从这之后开始编号
+STEP_ENTER = 1
+
+
+class NodeCursor(object):
+    """对话流程的执行位置.
+
+    Attributes:
+        graph_id (str): 节点所属的对话流程id
+        node_id (str): 节点id
+        step (int): 节点执行到的步骤，含义由节点定义
+        locals (dict): 节点在多轮对话之间保留的局部变量
+    """
+
+    __slots__ = ("graph_id", "node_id", "step", "locals")
+
+    def __init__(self, graph_id, node_id, step=STEP_START, locals=None):
+        self.graph_id = graph_id
+        self.node_id = node_id
+        self.step = step
+        self.locals = {} if locals is None else locals
+
+    def to_list(self):
+        """转换为可以保存的列表."""
+        return [self.graph_id, self.node_id, self.step, self.locals]
+
+    @classmethod
+    def from_list(cls, data):
+        """to_list的逆操作."""
+        return cls(*data)
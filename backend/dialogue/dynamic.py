@@ -1,8 +1,7 @@
 import json
 
-from config import global_config
+from backend.faq.api import faq_engine_request
 from utils.define import FAQ_DEFAULT_PERSPECTIVE
-from utils.funcs import async_post_rpc
 
 __all__ = ["dynamic_qa_train", "dynamic_intent_train", "dynamic_qa_delete", "dynamic_intent_delete"]
 
@@ -11,7 +10,6 @@ ROBOT_CODE_INTENT = "dynamic_intent_db"
 FIX_QUESTIONS = "fix_questions"
 MAIN_QUESTION_PERSPECTIVE = "main_question"
 SUB_QUESTION_PERSPECTIVE = "sub_question"
-FAQ_ENGINE_ADDR = global_config["faq_engine_addr"]
 
 
 async def dynamic_intent_train(data):
@@ -36,7 +34,6 @@ async def dynamic_intent_train(data):
         }
     ]
     """
-    url = "http://{}/robot_manager/single/add_items".format(FAQ_ENGINE_ADDR)
     documents = []
     for item in data:
         doc = {
@@ -48,7 +45,7 @@ async def dynamic_intent_train(data):
         }
         documents.append(doc)
     request_data = {"documents": documents, "robot_code": ROBOT_CODE_INTENT, "use_model": False}
-    await async_post_rpc(url, request_data)
+    await faq_engine_request("add_items", request_data)
     return {"status_code": 0}
 
 
@@ -62,10 +59,9 @@ async def dynamic_qa_delete(data):
         ]
     }
     """
-    url = "http://{}/robot_manager/single/delete_items".format(FAQ_ENGINE_ADDR)
     q_ids = data["qids"]
     request_data = {"q_ids": q_ids, "robot_code": ROBOT_CODE}
-    await async_post_rpc(url, request_data)
+    await faq_engine_request("delete_items", request_data)
     return {"status_code": 0}
 
 
@@ -100,7 +96,6 @@ async def dynamic_qa_train(data):
         },
     ]
     """
-    url = "http://{}/robot_manager/single/add_items".format(FAQ_ENGINE_ADDR)
     documents = []
     for item in data:
         perspective = item["lib_ids"]
@@ -124,7 +119,7 @@ async def dynamic_qa_train(data):
         }
         documents.append(doc)
     request_data = {"documents": documents, "robot_code": ROBOT_CODE, "use_model": False}
-    await async_post_rpc(url, request_data)
+    await faq_engine_request("add_items", request_data)
     return {"status_code": 0}
 
 
@@ -138,8 +133,7 @@ async def dynamic_intent_delete(data):
         ]
     }
     """
-    url = "http://{}/robot_manager/single/delete_items".format(FAQ_ENGINE_ADDR)
     q_ids = data["intent_ids"]
     request_data = {"q_ids": q_ids, "robot_code": ROBOT_CODE_INTENT}
-    await async_post_rpc(url, request_data)
+    await faq_engine_request("delete_items", request_data)
     return {"status_code": 0}
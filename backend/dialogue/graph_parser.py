@@ -5,6 +5,7 @@ import glob
 import json
 import os
 import shutil
+import tempfile
 from os.path import basename, dirname, exists, join
 
 from config import global_config
@@ -19,6 +20,7 @@ __all__ = [
     "get_graph_data",
     "get_all_robot_code",
     "delete_graph",
+    "replace_graphs",
 ]
 
 
@@ -155,3 +157,64 @@ def delete_graph(robot_code, graph_id):
     for path in graph_paths:
         os.remove(path)
     return OperationResult(OperationResult.OPERATION_SUCCESS, "删除对话流程配置成功")
+
+
+def replace_graphs(robot_code, version, graphs, updated):
+    """一次性替换机器人的全部对话流程配置，用于应用推送的模型包.
+
+    新的latest目录和version目录先完整地写入机器人目录下的临时目录，再通过重命名替换原来的目录，
+    任何一步失败都会恢复原来的目录，不会出现新旧配置混合的情况。旧版本目录中的配置不会被修改，仍然可以切换回去。
+
+    Args:
+        robot_code (str): 机器人唯一标识
+        version (str): 流程配置版本
+        graphs (dict): 替换后的全部对话流程配置，key为对话流程id，不在其中的对话流程会从latest目录和version目录中删除
+        updated (iterable): 本次更新的对话流程id，同时保存到version目录
+    """
+    robot_folder = join(graph_storage_folder, robot_code)
+    os.makedirs(robot_folder, exist_ok=True)
+    # 临时目录以.开头，不会被get_all_robot_code等按照目录结构查找配置的函数读取到
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=robot_folder)
+    replaced = []
+    try:
+        latest_staging = join(staging, "latest")
+        os.makedirs(latest_staging)
+        for graph_id, data in graphs.items():
+            _dump_graph(join(latest_staging, graph_id + ".json"), data)
+
+        version_staging = join(staging, version)
+        version_folder = join(robot_folder, version)
+        if exists(version_folder):
+            shutil.copytree(version_folder, version_staging)
+            for path in glob.glob(join(version_staging, "*.json")):
+                if basename(path)[: -len(".json")] not in graphs:
+                    os.remove(path)
+        else:
+            os.makedirs(version_staging)
+        for graph_id in updated:
+            _dump_graph(join(version_staging, graph_id + ".json"), graphs[graph_id])
+
+        for folder_name, folder_staging in ((version, version_staging), ("latest", latest_staging)):
+            target = join(robot_folder, folder_name)
+            backup = join(staging, "backup-" + folder_name)
+            if exists(target):
+                os.rename(target, backup)
+            else:
+                backup = None
+            replaced.append((target, backup))
+            os.rename(folder_staging, target)
+    except BaseException:
+        # 恢复已经被替换的目录
+        for target, backup in reversed(replaced):
+            if exists(target):
+                shutil.rmtree(target)
+            if backup is not None:
+                os.rename(backup, target)
+        raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _dump_graph(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, ensure_ascii=False)
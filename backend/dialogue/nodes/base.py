@@ -7,8 +7,10 @@ from functools import reduce
 from itertools import chain
 
 from backend.dialogue.context import FAQ_FLAG
+from backend.dialogue.cursor import STEP_ENTER, STEP_START, NodeCursor
 from backend.dialogue.nodes.builtin import builtin_intent
 from backend.dialogue.nodes.builtin.hard_code import hard_code_intent
+from backend.dialogue.nodes.builtin.planner import process_builtin_intent
 from utils.exceptions import (DialogueRuntimeException,
                               DialogueStaticCheckException)
 from utils.funcs import levenshtein_sim
@@ -71,12 +73,16 @@ class _BaseNode(object):
 
     Attributes:
         config (dict): 节点配置信息
+        graph_id (str): 节点所属的对话流程id
         default_child (_BaseNode): 默认连接的子节点
         intent_child (dict): key值为intent的id，value为子节点
         branch_child (dict): key值未分支的id，value为子节点
 
     Nodes：
         判断子节点的优先级为intent_child > branch_child > default_child
+
+        节点通过 call(context, cursor) 执行，返回值为回复用户的话术、FAQ_FLAG、下一个节点或者None（结束当前流程），
+        返回话术或者FAQ_FLAG时节点暂停，需要在下一轮对话中继续执行的位置记录在cursor中，参见backend.dialogue.cursor
     """
 
     # 节点类别的名称
@@ -95,6 +101,7 @@ class _BaseNode(object):
 
     def __init__(self, config):
         self.config = config
+        self.graph_id = ""
         self.default_child = None
         self.intent_child = {}
         self.branch_child = {}
@@ -110,14 +117,39 @@ class _BaseNode(object):
         """
         return self.config.get("node_name", "unknown")
 
-    async def __call__(self, context):
-        traceback_data = deepcopy(self.traceback_template)
-        traceback_data["node_name"] = self.node_name
-        context.add_traceback_data(traceback_data)
-        async for item in self.call(context):
-            yield item
+    def cursor(self):
+        """从头开始执行当前节点的游标."""
+        return NodeCursor(self.graph_id, self.config["node_id"])
+
+    async def run(self, context, cursor):
+        """从游标记录的位置继续执行节点，直到节点回复用户或者结束.
+
+        Args:
+            context (StateTracker): 对话上下文
+            cursor (NodeCursor): 节点的执行位置，执行过程中会被更新
+
+        Returns:
+            str, _BaseNode or None: 参见call
+        """
+        if cursor.step == STEP_START:
+            traceback_data = deepcopy(self.traceback_template)
+            traceback_data["node_name"] = self.node_name
+            context.add_traceback_data(traceback_data)
+            cursor.step = STEP_ENTER
+        return await self.call(context, cursor)
 
-    async def call(self, _):
+    async def call(self, context, cursor):
+        """执行节点，子类必须复写该方法
+
+        Args:
+            context (StateTracker): 对话上下文
+            cursor (NodeCursor): 节点的执行位置，第一次执行时step为STEP_ENTER
+
+        Returns:
+            str: 回复用户的话术，或者FAQ_FLAG，节点在下一轮对话中从cursor记录的位置继续执行
+            _BaseNode: 跳转到的下一个节点
+            None: 结束当前流程
+        """
         raise NotImplementedError
 
     def static_check(self):
@@ -242,9 +274,9 @@ class _BaseNode(object):
         if type == "intent":
             if not msg:
                 return False
-            # 如果配置有内置识别能力，则使用内置识别能力进行识别。TODO这里是否有重复识别的问题？
+            # 如果配置有内置识别能力，则使用内置识别能力进行识别，同一个消息只识别一次
             if condition["value"] in builtin_intent:
-                builtin_intent[condition["value"]].on_process_msg(msg)
+                process_builtin_intent(msg, condition["value"])
             return self._eval(msg.intent, condition["value"], operator)
         elif type == "entity":
             if not msg:
@@ -275,24 +307,29 @@ class _BaseNode(object):
                 return True
         return False
 
-    async def forward(self, context, use_default=True, life_cycle=0):
+    async def forward(self, context, cursor, use_default=True, life_cycle=0):
         """
         意图决定下一个节点的走向
 
         Args:
             context (StateTracker): 对话上下文
+            cursor (NodeCursor): 节点的执行位置，剩余的生命周期记录在cursor.locals["life_cycle"]中
             use_default (bool, optional):  如果没有匹配到意图，是否跳转到默认分支节点，默认为True。
             life_cycle (int, optional): 当前节点的生命周期，用于决定没有识别到用户意图时，是否再次询问。默认为0。
+
+        Returns:
+            _BaseNode: 跳转到的下一个节点
+            str: FAQ_FLAG，没有识别到意图，再次询问用户
+            None: use_default为False并且没有识别到意图
         """
+        life_cycle = cursor.locals.get("life_cycle", life_cycle)
         msg = context._latest_msg()
         # 根据当前节点连接线配置的意图重新进行识别
 
         # 如果配置了内置意图，做一下识别
         for target_intent in self.intent_child:
-            if target_intent in builtin_intent:
-                intent = builtin_intent[target_intent].on_process_msg(msg)
-            if target_intent in hard_code_intent:
-                intent = hard_code_intent[target_intent].on_process_msg(msg)
+            if target_intent in builtin_intent or target_intent in hard_code_intent:
+                intent = process_builtin_intent(msg, target_intent)
         # TODO  这里是个坑，这里打下补丁。这里保存原始的intent，如果下一个触发节点为None，则流程结束，需要保存原来的intent
         origin_intent = msg.intent
         await msg.update_intent_by_candidate(self.intent_child)
@@ -314,7 +351,7 @@ class _BaseNode(object):
             )
             if not next_node:
                 msg.intent = origin_intent
-            yield next_node
+            return next_node
         else:
             msg.understanding = "1"
             if use_default:  # 判断其他意图是否跳转
@@ -332,9 +369,9 @@ class _BaseNode(object):
                     msg.set_callback_words(
                         random.choice(callback_words)
                     )
-                    yield FAQ_FLAG
-                    async for item in self.forward(context, life_cycle=life_cycle - 1):
-                        yield item
+                    # 下一轮对话继续识别意图
+                    cursor.locals["life_cycle"] = life_cycle - 1
+                    return FAQ_FLAG
                 else:
                     context.add_traceback_data(
                         {
@@ -347,17 +384,24 @@ class _BaseNode(object):
                     )
                     # 如果没有匹配到意图，跳转到默认分支节点，并强制将当前意图设置为默认意图
                     msg.intent = self.default_intent_id
-                    yield next_node
+                    return next_node
+            return None
 
-    def options(self, context, _repeat_times=1):
+    def options(self, context, cursor):
         """
         选项决定下一个节点的走向
 
         Args:
             context (StateTracker): 对话上下文对象
-            _repeat_times (int): 剩余可以重复询问的次数，用于当用户多次没有回答选项的内容时，跳出对话
+            cursor (NodeCursor): 节点的执行位置，剩余可以重复询问的次数记录在cursor.locals["repeat_times"]中，
+                用于当用户多次没有回答选项的内容时，跳出对话
 
+        Returns:
+            _BaseNode: 用户选择的选项对应的节点
+            str: FAQ_FLAG，用户没有回答选项中的内容，再次询问用户
+            None: 触发了其他对话流程
         """
+        repeat_times = cursor.locals.get("repeat_times", 1)
         msg = context._latest_msg()
         if msg.text in self.option_child:
             option = msg.text
@@ -386,10 +430,10 @@ class _BaseNode(object):
                     "option_list": list(self.option_child.keys()),
                 }
             )
-            yield option_node
-        elif _repeat_times <= 0 and context.trigger():
-            # 触发其他对话流程意图成功，yield None结束当前流程，触发其他流程对话
-            yield None
+            return option_node
+        elif repeat_times <= 0 and context.trigger():
+            # 触发其他对话流程意图成功，返回None结束当前流程，触发其他流程对话
+            return None
         else:
             # 用户没有回答选项中的内容，走faq，FAQ若没有匹配到问题，则会走闲聊
             if "callback_words" in self.config:
@@ -399,8 +443,8 @@ class _BaseNode(object):
             msg.set_callback_words(callback)
             # 这里由于下一轮对话还是让用户进行选择，所以把选项参数返回给前端
             msg.options = self.config.get("options", [])
-            yield FAQ_FLAG
-            yield from self.options(context, _repeat_times - 1)
+            cursor.locals["repeat_times"] = repeat_times - 1
+            return FAQ_FLAG
 
 
 class TriggerNode(_BaseNode):
@@ -6,13 +6,17 @@ from .whether import WhetherNode
 from .date_time import builtin_date_time
 from .regx import builtin_regx
 from .spacy_ner import builtin_spacy_ner
+from .spacy_ner import load_model as load_spacy_model
 from .paddle_ner import builtin_paddle_ner
+from .paddle_ner import load_model as load_paddle_model
 from .intent_slot import builtin_recent_intent, builtin_recent_usersays
 from .hard_code.shejiao import recent_intent_and_syas
 
+# 肯定和否定意图由同一个识别器识别，每个消息只需要识别一次
+whether_node = WhetherNode()
 builtin_intent = {
-    "@sys.intent.confirm": WhetherNode(),
-    "@sys.intent.deny": WhetherNode()
+    "@sys.intent.confirm": whether_node,
+    "@sys.intent.deny": whether_node
 }
 
 builtin_entities = {
@@ -52,5 +56,11 @@ builtin_entities = {
     "@sys.asr_carnumber": AsrCarnumber()
 }
 
+# 依赖较大模型的抽取函数，模型在第一次使用时加载，参见planner.AbilityPlanner.load_models
+model_loaders = {
+    builtin_spacy_ner: load_spacy_model,
+    builtin_paddle_ner: load_paddle_model,
+}
+
 from .hard_code import hard_code_entities
 ne_extract_funcs = list(hard_code_entities.values())
\ No newline at end of file
@@ -1,10 +1,22 @@
 import jieba
 import jieba.posseg as pseg
 
-jieba.enable_paddle()
+__all__ = ["builtin_paddle_ner", "paddle_ner", "load_model"]
+
+# paddle模式在第一次使用时开启，没有使用相关识别能力的机器人不需要加载paddle模型
+_paddle_enabled = False
+
+
+def load_model():
+    """开启jieba的paddle模式，重复调用只会开启一次."""
+    global _paddle_enabled
+    if not _paddle_enabled:
+        jieba.enable_paddle()
+        _paddle_enabled = True
 
 
 def paddle_ner(text):
+    load_model()
     ents = {}
 
     words = list(pseg.cut(text, use_paddle=True))  # paddle模式
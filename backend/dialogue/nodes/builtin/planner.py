@@ -0,0 +1,91 @@
+"""
+内置识别能力的执行计划
+
+构建对话流程时根据流程中引用的识别能力确定需要用到的抽取函数，只预加载这些抽取函数依赖的模型。
+抽取函数在每个消息上最多执行一次，结果记录在消息对象上，多个识别能力共用同一个抽取函数时不会重复执行。
+"""
+from backend.dialogue.nodes.builtin import (builtin_entities, builtin_intent,
+                                            model_loaders)
+from backend.dialogue.nodes.builtin.hard_code import (hard_code_entities,
+                                                      hard_code_intent)
+
+__all__ = ["AbilityPlanner", "get_extractors", "run_extractor", "extract_ability", "process_builtin_intent"]
+
+
+def get_extractors(ability):
+    """获取识别能力对应的抽取函数，内置能力在前，定制能力在后."""
+    extractors = []
+    for mapping in (builtin_entities, hard_code_entities):
+        if ability in mapping:
+            extractors.append(mapping[ability])
+    return extractors
+
+
+def run_extractor(msg, extractor):
+    """在消息上执行抽取函数，同一个消息只执行一次.
+
+    Args:
+        msg (backend.nlu.Message): 用户消息
+        extractor (callable): 抽取函数，返回需要对话流程处理的内容的迭代器
+
+    Returns:
+        list: 抽取函数第一次执行时返回的内容
+    """
+    if extractor not in msg.builtin_results:
+        msg.builtin_results[extractor] = list(extractor(msg))
+    return msg.builtin_results[extractor]
+
+
+def extract_ability(msg, ability):
+    """抽取某个识别能力的实体，返回抽取函数需要对话流程处理的内容."""
+    for extractor in get_extractors(ability):
+        yield from run_extractor(msg, extractor)
+
+
+def process_builtin_intent(msg, intent):
+    """执行内置意图识别，同一个消息同一个识别器只执行一次.
+
+    Args:
+        msg (backend.nlu.Message): 用户消息
+        intent (str): 内置意图，builtin_intent或hard_code_intent中的key
+
+    Returns:
+        str: 最后一个识别器的识别结果
+    """
+    result = None
+    for mapping in (builtin_intent, hard_code_intent):
+        if intent not in mapping:
+            continue
+        recognizer = mapping[intent]
+        if recognizer not in msg.builtin_results:
+            before = dict(msg.intent_ranking)
+            result = recognizer.on_process_msg(msg)
+            ranking = {key: value for key, value in msg.intent_ranking.items() if before.get(key) != value}
+            msg.builtin_results[recognizer] = (result, ranking)
+        else:
+            # 识别器写入的意图打分可能被之后的识别覆盖，这里重新写入
+            result, ranking = msg.builtin_results[recognizer]
+            msg.intent_ranking.update(ranking)
+    return result
+
+
+class AbilityPlanner(object):
+    """对话流程用到的内置识别能力.
+
+    Attributes:
+        abilities (list): 对话流程中引用的、有内置抽取函数的识别能力
+        extractors (list): 这些识别能力需要的抽取函数，已经去重
+    """
+
+    def __init__(self, abilities):
+        self.abilities = [ability for ability in dict.fromkeys(abilities) if get_extractors(ability)]
+        extractors = []
+        for ability in self.abilities:
+            extractors.extend(get_extractors(ability))
+        self.extractors = list(dict.fromkeys(extractors))
+
+    def load_models(self):
+        """预加载抽取函数依赖的模型，避免第一次对话时加载."""
+        for extractor in self.extractors:
+            if extractor in model_loaders:
+                model_loaders[extractor]()
@@ -1,10 +1,21 @@
 import os
-import spacy
+
 from config import global_config
 
-__all__ = ["builtin_spacy_ner"]
+__all__ = ["builtin_spacy_ner", "load_model"]
+
+# spacy模型在第一次使用时加载，没有使用相关识别能力的机器人不需要加载
+nlp = None
+
+
+def load_model():
+    """加载spacy模型，重复调用只会加载一次."""
+    global nlp
+    if nlp is None:
+        import spacy
 
-nlp = spacy.load(os.path.join(global_config["source_root"], "assets/zh_core_web_sm"))
+        nlp = spacy.load(os.path.join(global_config["source_root"], "assets/zh_core_web_sm"))
+    return nlp
 
 ability_mapping = {
     "PERSON": "@sys.person",  # 我叫<韩冰>
@@ -27,7 +38,7 @@ ability_mapping = {
 
 
 def ner(text):
-    doc = nlp(text)
+    doc = load_model()(text)
     entites = {}
     for ent in doc.ents:
         if ent.label_ not in ability_mapping:
@@ -5,14 +5,14 @@ import re
 import warnings
 from collections import OrderedDict
 
+from backend.dialogue.cursor import STEP_ENTER
 from backend.dialogue.nodes.base import (
     _BaseNode,
     optional_value_checker,
     simple_type_checker,
 )
-from config import global_config
+from backend.faq.api import faq_engine_request, faq_intent_classify
 from utils.exceptions import DialogueStaticCheckException
-from utils.funcs import async_post_rpc
 
 from ..dynamic import (
     FIX_QUESTIONS,
@@ -22,10 +22,15 @@ from ..dynamic import (
     SUB_QUESTION_PERSPECTIVE,
 )
 
-FAQ_ENGINE_ADDR = global_config["faq_engine_addr"]
-
 __all__ = ["DynamicNode"]
 
+# 提出下一个问题，当前问题的子问题都问完之后，继续提出下一个主问题
+STEP_NEXT_QUESTION = 2
+# 已经提出了问题，根据用户的回答识别意图，选择子问题
+STEP_ANSWERED = 3
+# 所有问题都已经提出，根据用户的回答选择下一个节点
+STEP_FORWARD = 4
+
 
 class DynamicNode(_BaseNode):
     NODE_NAME = "动态机器人说节点"
@@ -49,8 +54,6 @@ class DynamicNode(_BaseNode):
         "intent": "",
         "slots": "",
     }
-    ask_url = "http://{}/robot_manager/single/ask".format(FAQ_ENGINE_ADDR)
-    intent_url = "http://{}/robot_manager/single/intent_classify".format(FAQ_ENGINE_ADDR)
 
     def node_specific_check(self):
         if self.config["random_mode"] == 2 and (not self.config.get("rule") or not self.config.get("choice")):
@@ -76,7 +79,7 @@ class DynamicNode(_BaseNode):
             "use_model": False,
             "rcm_threshold": -100,  # 设置一个非常小的值，保证匹配到的都作为推荐问题
         }
-        response_data = await async_post_rpc(self.ask_url, request_data)
+        response_data = await faq_engine_request("ask", request_data)
         response_data = response_data["data"]
         # 根据模式轮询提问
         msg = context._latest_msg()
@@ -103,16 +106,12 @@ class DynamicNode(_BaseNode):
 
         # 意图语义分类识别意图
         if not selected:
-            request_data = {
-                "question": msg.text,
-                "intent_group": {item["intent_id"]: item["examples"] for item in items},
-            }
-            response_data = await async_post_rpc(self.intent_url, request_data)
-            response_data = response_data["data"]
-
-            if len(response_data["topn_score"]) > 0:  # 防止没有匹配到任何意图
-                tmp_selected = max(items, key=lambda item: max(response_data["topn_score"].get(item["intent_id"], [0])))
-                if max(response_data["topn_score"][tmp_selected["intent_id"]]) >= 0.5:
+            intent_group = {item["intent_id"]: item["examples"] for item in items}
+            topn_score = await faq_intent_classify(msg.text, intent_group)
+
+            if len(topn_score) > 0:  # 防止没有匹配到任何意图
+                tmp_selected = max(items, key=lambda item: max(topn_score.get(item["intent_id"], [0])))
+                if max(topn_score[tmp_selected["intent_id"]]) >= 0.5:
                     selected = tmp_selected
 
         # TODO 目前只支持意图相关的识别能力
@@ -136,7 +135,16 @@ class DynamicNode(_BaseNode):
         else:
             return None, None
 
-    async def call(self, context, next_qid=None, selected_intent_id=None):
+    async def _ask_questions(self, context, next_qid=None, selected_intent_id=None):
+        """从问题库中请求问题
+
+        Args:
+            next_qid (str or list): 子问题id，为None时请求节点配置的主问题
+            selected_intent_id (str): 用户回答父问题的意图，只保留由该意图触发的子问题
+
+        Returns:
+            list: 问题列表
+        """
         # 获取全局参数
         tags = context.params.get("global_tags", [])
         if "global_qestion_id" not in context.params:
@@ -168,34 +176,44 @@ class DynamicNode(_BaseNode):
             "use_model": False,
             "rcm_threshold": -100,  # 设置一个非常小的值，保证匹配到的都作为推荐问题
         }
-        response_data = await async_post_rpc(self.ask_url, request_data)
+        response_data = await faq_engine_request("ask", request_data)
         response_data = response_data["data"]
         if "recommendAnswers" not in response_data or not response_data["recommendAnswers"]:
             if random_mode == 2:
                 raise ValueError(f"问题库{lib_id}中，没有匹配到指定类别{should_perspective}的问题。")
             else:
                 raise ValueError(f"问题库{lib_id}中，没有匹配到指定id为{should_perspective}的问题。")
-        # 根据模式轮询提问
         items = [json.loads(item) for item in response_data["recommendAnswers"]]
         if selected_intent_id:
             items = list(filter(lambda item: item.get("parent_intent_id") == selected_intent_id, items))
-            if len(items) == 0:  # 对应意图没有触发任何子问题，则直接返回
-                return
-
-        if self.config["random_mode"] == 1 or next_qid:
-            yield items[0]["content"]
-            qids, selected_intent_id = await self._forward_intent(context, items[0])
-            if qids:
-                async for item in self.call(context, qids, selected_intent_id):
-                    yield item
-        else:
-            for item in random.sample(items, k=self.config["choice"]):
-                yield item["content"]
-                qids, selected_intent_id = await self._forward_intent(context, item)
-                if qids:
-                    async for item in self.call(context, qids, selected_intent_id):
-                        yield item
+        return items
+
+    async def call(self, context, cursor):
+        if cursor.step == STEP_ENTER:
+            items = await self._ask_questions(context)
+            # 根据模式轮询提问，待提问的主问题记录在游标中
+            if self.config["random_mode"] == 1:
+                cursor.locals["pending"] = items[:1]
+            else:
+                cursor.locals["pending"] = random.sample(items, k=self.config["choice"])
+            cursor.step = STEP_NEXT_QUESTION
 
-        if not next_qid:
-            async for item in self.forward(context):
-                yield item
+        while cursor.step != STEP_FORWARD:
+            if cursor.step == STEP_ANSWERED:
+                qids, selected_intent_id = await self._forward_intent(context, cursor.locals.pop("current"))
+                cursor.step = STEP_NEXT_QUESTION
+                if qids:
+                    # 对应意图没有触发任何子问题时，继续下一个主问题
+                    items = await self._ask_questions(context, qids, selected_intent_id)
+                    if items:
+                        cursor.locals["current"] = items[0]
+                        cursor.step = STEP_ANSWERED
+                        return items[0]["content"]
+
+            if cursor.locals["pending"]:
+                cursor.locals["current"] = cursor.locals["pending"].pop(0)
+                cursor.step = STEP_ANSWERED
+                return cursor.locals["current"]["content"]
+            cursor.step = STEP_FORWARD
+
+        return await self.forward(context, cursor)
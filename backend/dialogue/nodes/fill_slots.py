@@ -3,13 +3,16 @@
 """
 import random
 
+from backend.dialogue.cursor import STEP_ENTER
 from backend.dialogue.nodes.base import _BaseNode
-from backend.dialogue.nodes.builtin import builtin_entities
-from backend.dialogue.nodes.builtin.hard_code import hard_code_entities
+from backend.dialogue.nodes.builtin.planner import extract_ability
 from utils.exceptions import DialogueStaticCheckException
 
 __all__ = ["FillSlotsNode"]
 
+# 已经追问了槽位，用用户的回答继续填槽
+STEP_REASK = 2
+
 
 def fill_slot_node_slots_checker(node, slots):
     if not isinstance(slots, list):
@@ -55,11 +58,16 @@ class FillSlotsNode(_BaseNode):
         "info": []
     }
 
-    async def call(self, context):
+    async def call(self, context, cursor):
         slots = self.config["slots"]
         num_slots = len(slots)
-        cur = 0
-        repeat_times = 0
+        if cursor.step == STEP_ENTER:
+            cur = 0
+            repeat_times = 0
+        else:
+            # 追问之后收到了用户的回答
+            cur = cursor.locals["cur"]
+            repeat_times = cursor.locals["repeat_times"] + 1
         while cur < num_slots:
 
             slot = slots[cur]
@@ -69,20 +77,15 @@ class FillSlotsNode(_BaseNode):
             ability = context.get_ability_by_slot(slot_name)
             msg = context._latest_msg()
 
-            # 内置节点识别
-            if ability in builtin_entities:
-                for item in builtin_entities[ability](msg):
-                    yield item
-
-            # hard coding 识别
-            if ability in hard_code_entities:
-                for item in hard_code_entities[ability](msg):
-                    yield item
+            # 内置节点识别以及hard coding识别，同一个消息只识别一次
+            for item in extract_ability(msg, ability):
+                return item
 
             # 意图强制跳转，放在内置实体识别之后，为了保证@recent_intent可以识别
             # forward操作中可能会覆盖原始的intent
-            async for item in  self.forward(context, use_default=False):
-                yield item
+            next_node = await self.forward(context, cursor, use_default=False)
+            if next_node is not None:
+                return next_node
 
             abilities = msg.get_abilities()
             warning = slot.get("warning", False)
@@ -111,7 +114,9 @@ class FillSlotsNode(_BaseNode):
                     repeat_times = 0
                 else:
                     msg.understanding = "2"
-                    yield random.choice(slot["reask_words"])
+                    cursor.step = STEP_REASK
+                    cursor.locals.update(cur=cur, repeat_times=repeat_times)
+                    return random.choice(slot["reask_words"])
                 repeat_times += 1
 
         if self.default_child:
@@ -122,4 +127,4 @@ class FillSlotsNode(_BaseNode):
                 "source_node_name": self.node_name,
                 "target_node_name": self.default_child.node_name
             })
-        yield self.default_child
+        return self.default_child
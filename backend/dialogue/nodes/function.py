@@ -15,7 +15,7 @@ class FunctionNode(_BaseNode):
     )
     # TODO checker implement here
 
-    async def call(self, context):
+    async def call(self, context, cursor):
         language = self.config["language"]
         if language == "python":
             # TODO python implement
@@ -75,7 +75,7 @@ class JudgeNode(_BaseNode):
         "condition_group": None
     }
 
-    async def call(self, context):
+    async def call(self, context, cursor):
         """
         判断接下来应该走哪个分支
 
@@ -108,8 +108,7 @@ class JudgeNode(_BaseNode):
                     "target_node_name": getattr(self.branch_child[branch_id], "node_name", None),
                     "branch_name": branch["branch_name"],
                 })
-                yield self.branch_child[branch_id]
-                return
+                return self.branch_child[branch_id]
 
         # 如果所有分支都不符合，则走默认分支
         if self.default_child:
@@ -120,4 +119,4 @@ class JudgeNode(_BaseNode):
                 "source_node_name": self.node_name,
                 "target_node_name": self.default_child.node_name
             })
-        yield self.default_child
+        return self.default_child
@@ -57,15 +57,20 @@ class RPCNode(_BaseNode):
         "slots": {},
     }
 
-    async def call(self, context):
-        for _ in range(2):
-            url = self.config["url"]
-            headers = self.config.get("headers", None)
+    async def call(self, context, cursor):
+        url = self.config["url"]
+        headers = self.config.get("headers", None)
+        method = self.config["method"].upper()
+        # 接口要求澄清时，回复用户之后再请求一次，最多请求两次
+        attempts = cursor.locals.get("attempts", 0)
+        params = cursor.locals.get("params")
+        data = cursor.locals.get("data")
+        while attempts < 2:
+            attempts += 1
             params = {
                 key: context.decode_ask_words(value)
                 for key, value in self.config["params"].items()
             }
-            method = self.config["method"].upper()
             if method == "POST":
                 data = await async_post_rpc(
                     url, params, data_type="params", headers=headers
@@ -85,7 +90,8 @@ class RPCNode(_BaseNode):
             # 这里是一个布丁，欧工想让掉用faq时rpc节点可以进行澄清、循环
             # 这里写死一个参数，如果rpc节点返回该参数就进行循环
             if data.get("__repeat", False):
-                yield data["answer"]
+                cursor.locals.update(attempts=attempts, params=params, data=data)
+                return data["answer"]
             else:
                 break
 
@@ -126,4 +132,4 @@ class RPCNode(_BaseNode):
                     "target_node_name": self.default_child.node_name,
                 }
             )
-        yield self.default_child
+        return self.default_child
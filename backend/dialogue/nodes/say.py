@@ -3,6 +3,7 @@
 """
 import random
 
+from backend.dialogue.cursor import STEP_ENTER
 from backend.dialogue.nodes.base import (_BaseNode, callback_cycle_checker,
                                          simple_type_checker)
 from backend.dialogue.nodes.judge import _check_condition
@@ -10,6 +11,9 @@ from utils.exceptions import DialogueStaticCheckException
 
 __all__ = ["RobotSayNode"]
 
+# 已经回复了用户，根据用户的回答选择下一个节点
+STEP_FORWARD = 2
+
 
 def say_node_conditional_checker(node, branchs):
     if not isinstance(branchs, list):
@@ -72,7 +76,22 @@ class RobotSayNode(_BaseNode):
                 node_id=self.node_name,
             )
 
-    async def call(self, context):
+    async def call(self, context, cursor):
+        if cursor.step == STEP_ENTER:
+            cursor.step = STEP_FORWARD
+            answer = self._answer(context)
+            if answer is not None:
+                return answer
+
+        if bool(self.option_child):
+            return self.options(context, cursor)
+        else:
+            return await self.forward(
+                context, cursor, life_cycle=self.config.get("life_cycle", 0)
+            )
+
+    def _answer(self, context):
+        """生成回复用户的话术，没有符合条件的话术时返回None."""
         # TODO 这里目前暂时这么判断，回复节点如果没有子节点则判断本轮对话结束
         if not self.default_child and not self.intent_child and not self.option_child:
             context.is_end = True
@@ -85,7 +104,6 @@ class RobotSayNode(_BaseNode):
         msg = context._latest_msg()
         msg.options = options
 
-        has_answer = False  # 机器人是否已经回答
         if "branchs" in self.config:
             # 否则进入条件判断，根据不通条件生成不通的回复话术
             for branch in self.config["branchs"]:
@@ -93,19 +111,9 @@ class RobotSayNode(_BaseNode):
                     continue
                 conditions = branch["conditions"]
                 if self._judge_branch(context, conditions):
-                    yield random.choice(branch["content"])
-                    has_answer = True
-                    break
+                    return random.choice(branch["content"])
 
-        if "content" in self.config and not has_answer:
+        if "content" in self.config:
             # 如果配置的回复话术为固定的一个字符串
-            yield random.choice(self.config["content"])
-
-        if bool(self.option_child):
-            for item in self.options(context):
-                yield item
-        else:
-            async for item in self.forward(
-                context, life_cycle=self.config.get("life_cycle", 0)
-            ):
-                yield item
+            return random.choice(self.config["content"])
+        return None
@@ -1,11 +1,15 @@
 """
 开始节点
 """
+from backend.dialogue.cursor import STEP_ENTER
 from backend.dialogue.nodes.base import TriggerNode
 from utils.exceptions import DialogueStaticCheckException
 
 __all__ = ["StartNode"]
 
+# 识别下一个节点的意图，没有识别到时每轮对话重新识别
+STEP_FORWARD = 2
+
 
 def _check_condition(node, condition):
     if "type" not in condition:
@@ -64,16 +68,17 @@ class StartNode(TriggerNode):
         "condition_group": None
     }
 
-    async def call(self, context):
-        context.update_traceback_datas({
-            "graph_name": context.agent.get_graph_meta_by_id(context.current_graph_id, "name"),
-            "version": context.agent.get_graph_meta_by_id(context.current_graph_id, "version"),
-            "global": context.params,
-            "condition_group": self.config["condition_group"]
-        })
-        context.set_is_start()
-        async for item in self.forward(context):
-            yield item
+    async def call(self, context, cursor):
+        if cursor.step == STEP_ENTER:
+            context.update_traceback_datas({
+                "graph_name": context.agent.get_graph_meta_by_id(context.current_graph_id, "name"),
+                "version": context.agent.get_graph_meta_by_id(context.current_graph_id, "version"),
+                "global": context.params,
+                "condition_group": self.config["condition_group"]
+            })
+            context.set_is_start()
+            cursor.step = STEP_FORWARD
+        return await self.forward(context, cursor)
 
     def trigger(self, context):
         conditions = self.config["condition_group"]
@@ -1,6 +1,7 @@
 """
 流程跳转节点
 """
+from backend.dialogue.cursor import STEP_ENTER
 from backend.dialogue.nodes.base import (
     _BaseNode,
     simple_type_checker,
@@ -9,6 +10,9 @@ from backend.dialogue.nodes.base import (
 
 __all__ = ["SwitchNode"]
 
+# 已经回复了跳转话术，下一轮对话进行跳转
+STEP_JUMP = 2
+
 
 class SwitchNode(_BaseNode):
     NODE_NAME = "流程跳转节点"
@@ -28,22 +32,24 @@ class SwitchNode(_BaseNode):
         "reply": ""
     }
 
-    async def call(self, context):
-        msg = context._latest_msg()
-        # 用户挂断
-        if self.config["jump_type"] == "3":
-            context.is_end = True
-            context.dialog_status = "20"
-        # 主动转人工
-        elif self.config["jump_type"] == "2":
-            context.is_end = True
-            # 这里判断逻辑是这样的，如果是由意图理解进入到转人工，understanding一定为“0”此时可以判断是主动转人工状态10
-            # 反之则是系统转仍工状态码11
-            context.dialog_status = "10" if msg.understanding == "0" else "11"
-        
-        if "jump_reply" in self.config:
-            context.update_traceback_data("reply", self.config["jump_reply"])
-            yield self.config["jump_reply"]
+    async def call(self, context, cursor):
+        if cursor.step == STEP_ENTER:
+            msg = context._latest_msg()
+            # 用户挂断
+            if self.config["jump_type"] == "3":
+                context.is_end = True
+                context.dialog_status = "20"
+            # 主动转人工
+            elif self.config["jump_type"] == "2":
+                context.is_end = True
+                # 这里判断逻辑是这样的，如果是由意图理解进入到转人工，understanding一定为“0”此时可以判断是主动转人工状态10
+                # 反之则是系统转仍工状态码11
+                context.dialog_status = "10" if msg.understanding == "0" else "11"
+
+            if "jump_reply" in self.config:
+                context.update_traceback_data("reply", self.config["jump_reply"])
+                cursor.step = STEP_JUMP
+                return self.config["jump_reply"]
 
         if self.config["jump_type"] == "3":
             graph_name = "用户挂断"
@@ -57,6 +63,6 @@ class SwitchNode(_BaseNode):
         })
 
         if self.config["jump_type"] in ["2", "3"]:
-            yield None
+            return None
         else:
-            yield context.switch_graph(self.config["graph_id"], self.config["node_name"])
+            return context.switch_graph(self.config["graph_id"], self.config["node_name"])
@@ -15,8 +15,7 @@ class UserInputNode(_BaseNode):
 
     traceback_template = {"type": "userSay", "node_name": ""}
 
-    async def call(self, context):
-        async for item in self.forward(
-            context, life_cycle=self.config.get("life_cycle", 0)
-        ):
-            return item
+    async def call(self, context, cursor):
+        return await self.forward(
+            context, cursor, life_cycle=self.config.get("life_cycle", 0)
+        )
@@ -0,0 +1,392 @@
+"""会话存储.
+
+会话存储需要实现 SessionStore 定义的接口，由配置 session_store 选择使用哪种存储：
+
+- memory: MemorySessionStore，会话保存在当前进程中，只能部署单个服务进程，重启后会话丢失。
+- redis: RedisSessionStore，会话状态序列化后保存在Redis（或者兼容Redis协议的存储）中，任意一个服务进程都可以继续对话，
+  重启服务也不会丢失会话。
+
+MemorySessionStore 中的会话按照最后活跃的时间排列在一个有序字典中，每次收到消息时把会话移动到末尾，因此最早过期的会话总是在开头。
+清理时从开头依次弹出已经过期的会话，遇到第一个没有过期的会话就停止，每个会话的过期和清理都是O(1)的。
+过期时间从会话最后一次收到消息开始计算，持续进行的长对话不会被清理。
+
+RedisSessionStore 保存的值为16位十六进制的版本号加上zlib压缩的json，保存时通过脚本比较版本号，
+版本号与读取时不一致说明会话已经被其他服务进程修改，抛出 SessionConflictException，过期时间由Redis管理。
+"""
+import fnmatch
+import itertools
+import json
+import time
+import zlib
+from collections import OrderedDict
+
+from config import global_config
+from utils.exceptions import SessionConflictException
+
+__all__ = [
+    "SessionStore",
+    "MemorySessionStore",
+    "RedisSessionStore",
+    "LocalRedisClient",
+    "create_session_store",
+    "encode_state",
+    "decode_state",
+]
+
+SESSION_STORE = global_config["session_store"]
+SESSION_REDIS_URL = global_config["session_redis_url"]
+SESSION_KEY_PREFIX = global_config["session_key_prefix"]
+
+_VERSION_WIDTH = 16
+# 清空会话时每次删除的key个数
+_DELETE_BATCH = 500
+# 统计会话内存时最多计算多少个会话，每个会话的计算需要遍历所有字段
+MEMORY_SAMPLE_SIZE = 20
+
+# 版本号一致时保存新的状态并设置过期时间，返回1；不一致时返回0
+CAS_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+local version = 0
+if current then
+    version = tonumber(string.sub(current, 1, 16), 16)
+end
+if version ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+return 1
+"""
+
+
+def encode_state(version, state):
+    """将会话状态编码为保存在Redis中的值.
+
+    Args:
+        version (int): 会话状态的版本号
+        state (dict): StateTracker.dump_state 的返回值
+
+    Returns:
+        bytes: 版本号 + zlib压缩的json
+    """
+    content = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"%0*x" % (_VERSION_WIDTH, version) + zlib.compress(content)
+
+
+def decode_state(value):
+    """encode_state的逆操作.
+
+    Returns:
+        tuple: (版本号, 会话状态)
+    """
+    version = int(value[:_VERSION_WIDTH], 16)
+    state = json.loads(zlib.decompress(value[_VERSION_WIDTH:]).decode("utf-8"))
+    return version, state
+
+
+class SessionStore(object):
+    """会话存储接口."""
+
+    async def load(self, sender_id):
+        """读取会话，会话不存在或者已经过期时返回None.
+
+        Returns:
+            backend.dialogue.context.StateTracker: 会话状态
+        """
+        raise NotImplementedError
+
+    async def save(self, state_tracker):
+        """保存处理完消息之后的会话状态，并重新开始计算过期时间.
+
+        Raises:
+            SessionConflictException: 会话在读取之后被其他服务进程修改
+        """
+        raise NotImplementedError
+
+    async def clear(self):
+        """删除所有会话，对话流程或者语义理解模型更新时调用，返回时所有服务进程都不能再读取到旧的会话."""
+        raise NotImplementedError
+
+    def sweep(self):
+        """清理过期的会话.
+
+        Returns:
+            int: 本次清理的会话个数
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        """会话的统计信息."""
+        raise NotImplementedError
+
+    def memory_stats(self):
+        """当前进程中的会话对象占用内存的统计信息，参见StateTracker.memory_size.
+
+        只计算最近活跃的MEMORY_SAMPLE_SIZE个会话，按照平均值估算所有会话的内存，避免在接口中遍历所有会话。
+
+        Returns:
+            dict: memory_bytes为所有会话的估算内存字节数之和，max_session_bytes为抽样的会话中最大的内存字节数
+        """
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """保存在当前进程中，按照最后活跃时间过期的会话存储.
+
+    过期的会话由 sweep 定期清理，在清理之前被访问到的过期会话也会被立即删除。
+
+    Attributes:
+        expired_time (float): 会话在最后一次活跃之后经过多少秒过期
+        evicted (int): 累计因为过期而删除的会话个数
+    """
+
+    def __init__(self, expired_time):
+        self.expired_time = expired_time
+        self.evicted = 0
+        # key为会话id，value为 (StateTracker, 最后活跃时间)
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, sender_id):
+        return self.get(sender_id) is not None
+
+    def __getitem__(self, sender_id):
+        state_tracker = self.get(sender_id)
+        if state_tracker is None:
+            raise KeyError(sender_id)
+        return state_tracker
+
+    def __setitem__(self, sender_id, state_tracker):
+        self._sessions[sender_id] = (state_tracker, time.monotonic())
+        self._sessions.move_to_end(sender_id)
+
+    def get(self, sender_id, default=None):
+        """获取会话，会话不存在或者已经过期时返回default."""
+        item = self._sessions.get(sender_id)
+        if item is None:
+            return default
+        if time.monotonic() - item[1] > self.expired_time:
+            del self._sessions[sender_id]
+            self.evicted += 1
+            return default
+        return item[0]
+
+    def discard(self, sender_id):
+        """删除会话，会话不存在时什么都不做."""
+        self._sessions.pop(sender_id, None)
+
+    def touch(self, sender_id):
+        """会话收到了新的消息，重新开始计算过期时间."""
+        state_tracker, _ = self._sessions[sender_id]
+        self[sender_id] = state_tracker
+
+    async def load(self, sender_id):
+        state_tracker = self.get(sender_id)
+        if state_tracker is not None:
+            self.touch(sender_id)
+        return state_tracker
+
+    async def save(self, state_tracker):
+        self[state_tracker.user_id] = state_tracker
+
+    async def clear(self):
+        """删除所有会话，不计入过期删除的个数."""
+        self._sessions.clear()
+
+    def sweep(self):
+        deadline = time.monotonic() - self.expired_time
+        count = 0
+        while self._sessions:
+            sender_id, (_, last_active) = next(iter(self._sessions.items()))
+            if last_active >= deadline:
+                break
+            del self._sessions[sender_id]
+            count += 1
+        self.evicted += count
+        return count
+
+    def stats(self):
+        """会话的统计信息.
+
+        Returns:
+            dict: sessions为当前会话个数，evicted为累计过期删除的会话个数
+        """
+        return {"sessions": len(self._sessions), "evicted": self.evicted}
+
+    def memory_stats(self):
+        sample = itertools.islice(reversed(self._sessions.values()), MEMORY_SAMPLE_SIZE)
+        sizes = [state_tracker.memory_size() for state_tracker, _ in sample]
+        if not sizes:
+            return {"memory_bytes": 0, "max_session_bytes": 0}
+        return {
+            "memory_bytes": sum(sizes) * len(self._sessions) // len(sizes),
+            "max_session_bytes": max(sizes),
+        }
+
+
+class RedisSessionStore(SessionStore):
+    """保存在Redis中的会话存储.
+
+    最近访问过的会话对象同时缓存在当前进程中，读取到的版本号与缓存的会话对象一致时直接使用缓存，
+    不一致时（会话由其他服务进程处理过）从序列化的状态恢复会话对象。
+
+    Attributes:
+        client: redis.asyncio.Redis 或者 LocalRedisClient
+        key_prefix (str): 会话在Redis中的key前缀
+        expired_time (float): 会话在最后一次活跃之后经过多少秒过期
+        restore (callable): restore(state) 从序列化的状态恢复 StateTracker
+        conflicts (int): 累计发生版本冲突的次数
+    """
+
+    def __init__(self, robot_code, client, key_prefix, expired_time, restore):
+        self.robot_code = robot_code
+        self.client = client
+        self.key_prefix = key_prefix
+        self.expired_time = expired_time
+        self.restore = restore
+        self.conflicts = 0
+        self._cache = MemorySessionStore(expired_time)
+        self._compare_and_set = client.register_script(CAS_SCRIPT)
+
+    def _key(self, sender_id):
+        return self.key_prefix + sender_id
+
+    async def load(self, sender_id):
+        value = await self.client.get(self._key(sender_id))
+        if value is None:
+            self._cache.discard(sender_id)
+            return None
+        version, state = decode_state(value)
+        state_tracker = self._cache.get(sender_id)
+        if state_tracker is None or state_tracker.version != version:
+            state_tracker = self.restore(state)
+            state_tracker.version = version
+        self._cache[sender_id] = state_tracker
+        return state_tracker
+
+    async def save(self, state_tracker):
+        sender_id = state_tracker.user_id
+        version = state_tracker.version + 1
+        value = encode_state(version, state_tracker.dump_state())
+        saved = await self._compare_and_set(
+            keys=[self._key(sender_id)],
+            args=[state_tracker.version, value, int(self.expired_time * 1000)],
+        )
+        if not saved:
+            self.conflicts += 1
+            self._cache.discard(sender_id)
+            raise SessionConflictException(self.robot_code, sender_id)
+        state_tracker.version = version
+        self._cache[sender_id] = state_tracker
+
+    async def clear(self):
+        """删除所有会话，Redis中的会话删除之后才返回."""
+        await self._cache.clear()
+        keys = []
+        async for key in self.client.scan_iter(match=self.key_prefix + "*"):
+            keys.append(key)
+            if len(keys) >= _DELETE_BATCH:
+                await self.client.delete(*keys)
+                keys = []
+        if keys:
+            await self.client.delete(*keys)
+
+    def sweep(self):
+        """Redis中的会话由Redis负责过期，这里只清理本地缓存的会话对象."""
+        return self._cache.sweep()
+
+    def stats(self):
+        """会话的统计信息.
+
+        Returns:
+            dict: sessions为本地缓存的会话个数，evicted为累计过期删除的本地缓存个数，conflicts为累计版本冲突次数
+        """
+        return dict(self._cache.stats(), conflicts=self.conflicts)
+
+    def memory_stats(self):
+        return self._cache.memory_stats()
+
+
+class LocalRedisClient(object):
+    """进程内的Redis替身，只实现会话存储用到的命令，用于测试和没有Redis的开发环境."""
+
+    def __init__(self):
+        # key为Redis的key，value为 (值, 过期时间)
+        self._data = {}
+
+    def _get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and time.monotonic() >= item[1]:
+            del self._data[key]
+            return None
+        return item[0]
+
+    def _set(self, key, value, px=None):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        expire_at = time.monotonic() + px / 1000 if px else None
+        self._data[key] = (value, expire_at)
+
+    async def get(self, key):
+        return self._get(key)
+
+    async def set(self, key, value, px=None):
+        self._set(key, value, px)
+        return True
+
+    async def delete(self, *keys):
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def scan_iter(self, match=None):
+        for key in list(self._data):
+            if self._get(key) is not None and (match is None or fnmatch.fnmatchcase(key, match)):
+                yield key
+
+    def register_script(self, script):
+        if script != CAS_SCRIPT:
+            raise NotImplementedError("LocalRedisClient只支持会话存储的脚本")
+
+        async def compare_and_set(keys, args):
+            current = self._get(keys[0])
+            version = int(current[:_VERSION_WIDTH], 16) if current else 0
+            if version != int(args[0]):
+                return 0
+            self._set(keys[0], args[1], int(args[2]))
+            return 1
+
+        return compare_and_set
+
+
+_redis_client = None
+
+
+def _get_redis_client():
+    global _redis_client
+    if _redis_client is None:
+        # redis是可选依赖，只有使用redis会话存储时才需要安装
+        import redis.asyncio
+
+        _redis_client = redis.asyncio.from_url(SESSION_REDIS_URL)
+    return _redis_client
+
+
+def create_session_store(robot_code, expired_time, restore):
+    """按照配置创建机器人的会话存储.
+
+    Args:
+        robot_code (str): 机器人id
+        expired_time (float): 会话在最后一次活跃之后经过多少秒过期
+        restore (callable): restore(state) 从序列化的状态恢复 StateTracker
+
+    Returns:
+        SessionStore: 会话存储
+    """
+    if SESSION_STORE == "memory":
+        return MemorySessionStore(expired_time)
+    if SESSION_STORE == "redis":
+        key_prefix = "{}{}:".format(SESSION_KEY_PREFIX, robot_code)
+        return RedisSessionStore(robot_code, _get_redis_client(), key_prefix, expired_time, restore)
+    raise ValueError("不支持的会话存储类型: {}".format(SESSION_STORE))
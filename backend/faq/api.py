@@ -1,27 +1,77 @@
 """此文件包含 faq 引擎请求帮助函数."""
-import copy
+import asyncio
+import functools
+import itertools
 import json
 import random
+from collections import OrderedDict
 
+from backend.faq.cache import AnswerCache
 from config import global_config
-from utils.define import (FAQ_DEFAULT_PERSPECTIVE, FAQ_TYPE_MULTIANSWER,
-                          FAQ_TYPE_NONUSWER, UNK, get_faq_master_robot_id, get_faq_test_robot_id)
-from utils.funcs import async_post_rpc
+from utils.define import (FAQ_DEFAULT_PERSPECTIVE, FAQ_INTENT_GROUP_NOT_FOUND,
+                          FAQ_TYPE_MULTIANSWER, FAQ_TYPE_NONUSWER, UNK,
+                          get_faq_master_robot_id, get_faq_test_robot_id)
+from utils.exceptions import RpcException
+from utils.funcs import async_post_rpc, hash_string
 
 FAQ_ENGINE_ADDR = global_config["faq_engine_addr"]
 MASTER_ADDR = global_config["master_addr"]
 MAX_SIMILAR_QUESTIONS = 10  # 最大支持导入的相似问题个数
+FAQ_CACHE_SIZE = int(global_config["faq_cache_size"])
+FAQ_CACHE_TTL = float(global_config["faq_cache_ttl"])
+FAQ_BULK_CHUNK_SIZE = int(global_config["faq_bulk_chunk_size"])
+FAQ_BULK_CONCURRENCY = int(global_config["faq_bulk_concurrency"])
+FAQ_ENGINE_EMBEDDED = global_config["faq_engine_embedded"]
+# 最多记录多少个意图组的注册结果，对话流程修改后会产生新的意图组
+MAX_REGISTERED_INTENT_GROUPS = 1024
 
 __all__ = [
     "faq_update",
+    "faq_bulk_update",
     "faq_delete",
     "faq_delete_all",
     "faq_ask",
     "faq_push",
+    "faq_invalidate_cache",
     "faq_chitchat_update",
     "faq_chitchat_ask",
+    "get_intent_group_id",
+    "faq_register_intent_group",
+    "faq_intent_classify",
+    "faq_cache_info",
+    "faq_engine_request",
 ]
 
+# 意图组在faq引擎中的注册结果，key为意图组id，value为是否注册成功，按照最近使用的顺序排列
+_registered_intent_groups = OrderedDict()
+# faq问答和闲聊问答结果的缓存
+answer_cache = AnswerCache(FAQ_CACHE_SIZE, FAQ_CACHE_TTL)
+
+if FAQ_ENGINE_EMBEDDED:
+    from backend.faq.local import LocalFaqEngine
+
+    # 进程内的faq引擎，不再请求faq_engine_addr
+    embedded_engine = LocalFaqEngine(global_config["faq_engine_storage_folder"])
+else:
+    embedded_engine = None
+
+
+async def faq_engine_request(api, request_data, **kwargs):
+    """调用faq引擎的接口，配置了faq_engine_embedded时直接调用进程内的引擎.
+
+    Args:
+        api (str): 接口名称，即url中 /robot_manager/single/ 之后的部分，如ask、add_items
+        request_data (dict): 请求参数
+        **kwargs: async_post_rpc的其他参数，如coalesce、hedge，调用进程内的引擎时忽略
+
+    Returns:
+        dict: faq引擎返回的数据
+    """
+    if embedded_engine is not None:
+        return embedded_engine.handle(api, request_data)
+    url = "http://{}/robot_manager/single/{}".format(FAQ_ENGINE_ADDR, api)
+    return await async_post_rpc(url, request_data, **kwargs)
+
 
 def master_test_wrapper(func):
     async def wrapper(robot_id, *args, **kwargs):
@@ -34,11 +84,80 @@ def master_test_wrapper(func):
     return wrapper
 
 
+def invalidate_cache_wrapper(func):
+    """修改机器人语料的接口调用完成后，使该机器人的问答缓存失效."""
+
+    @functools.wraps(func)
+    async def wrapper(robot_id, *args, **kwargs):
+        try:
+            return await func(robot_id, *args, **kwargs)
+        finally:
+            answer_cache.invalidate(robot_id)
+
+    return wrapper
+
+
+def faq_cache_info():
+    """faq问答缓存的统计信息，参见backend.faq.cache.AnswerCache.cache_info."""
+    return answer_cache.cache_info()
+
+
+async def _ask(robot_id, question, params):
+    """向faq引擎提问，返回faq引擎返回的data字段，相同的问题在缓存有效期内只请求一次.
+
+    faq引擎请求失败、超时或者熔断时按照没有答案处理，避免faq引擎故障导致对话失败。
+    """
+    key = answer_cache.make_key(robot_id, question, params)
+    data = answer_cache.get(key)
+    if data is None:
+        request_data = {"robot_code": robot_id, "question": question}
+        request_data.update(params)
+        try:
+            response_data = await faq_engine_request("ask", request_data, coalesce=True, hedge=True)
+        except RpcException as error:
+            error.log_err()
+            return {"answer_type": FAQ_TYPE_NONUSWER, "answer": ""}
+        data = response_data["data"]
+        answer_cache.set(key, data)
+    return data
+
+
 def _build_sim_id(origin_id: str, index: int) -> str:
     return origin_id + "_similar_{}".format(index)
 
 
+def _faq_document(item):
+    perspective = item.get("perspective", "")  # 闲聊环节没有视角这个字段，忽略
+    return {
+        "answer": json.dumps(item, ensure_ascii=False),
+        "perspective": perspective if perspective else FAQ_DEFAULT_PERSPECTIVE,
+        "question": item["title"],
+        "id": item["faq_id"],
+        "answer_id": item["faq_id"],
+    }
+
+
+def _chitchat_document(item):
+    return {
+        "answer": json.dumps(item, ensure_ascii=False),
+        "perspective": FAQ_DEFAULT_PERSPECTIVE,
+        "question": item["theme"],
+        "id": item["chatfest_id"],
+        "answer_id": item["chatfest_id"],
+    }
+
+
+def _iter_documents(items, build_document):
+    """逐条生成faq引擎的文档，相似问题的文档只替换问题和id，答案等字段与原问题的文档共享."""
+    for item in items:
+        doc = build_document(item)
+        yield doc
+        for i, sim_q in enumerate(item.get("similar_questions", [])[:MAX_SIMILAR_QUESTIONS]):
+            yield dict(doc, question=sim_q, id=_build_sim_id(doc["id"], i))
+
+
 @master_test_wrapper
+@invalidate_cache_wrapper
 async def faq_chitchat_update(robot_id, data):
     """
     添加或者更新闲聊数据.
@@ -60,31 +179,13 @@ async def faq_chitchat_update(robot_id, data):
         ...    }
         ... ]
     """
-    url = "http://{}/robot_manager/single/add_items".format(FAQ_ENGINE_ADDR)
-
-    documents = []
-    for item in data:
-        doc = {
-            "answer": json.dumps(item, ensure_ascii=False),
-            "perspective": FAQ_DEFAULT_PERSPECTIVE,
-            "question": item["theme"],
-            "id": item["chatfest_id"],
-            "answer_id": item["chatfest_id"],
-        }
-        documents.append(doc)
-        for i, sim_q in enumerate(item.get("similar_questions", [])):
-            if i >= MAX_SIMILAR_QUESTIONS:
-                break
-            curdoc = copy.deepcopy(doc)
-            curdoc["question"] = sim_q
-            curdoc["id"] = _build_sim_id(curdoc["id"], i)
-            documents.append(curdoc)
-
+    documents = list(_iter_documents(data, _chitchat_document))
     request_data = {"documents": documents, "robot_code": robot_id}
-    return await async_post_rpc(url, request_data)
+    return await faq_engine_request("add_items", request_data)
 
 
 @master_test_wrapper
+@invalidate_cache_wrapper
 async def faq_update(robot_id, data):
     """添加或者更新faq语料数据.
 
@@ -126,32 +227,96 @@ async def faq_update(robot_id, data):
         >>> faq_update(robot_id, data)
         {'status_code': 0}
     """
-    url = "http://{}/robot_manager/single/add_items".format(FAQ_ENGINE_ADDR)
-
-    documents = []
-    for item in data:
-        perspective = item.get("perspective", "")  # 闲聊环节没有视角这个字段，忽略
-        doc = {
-            "answer": json.dumps(item, ensure_ascii=False),
-            "perspective": perspective if perspective else FAQ_DEFAULT_PERSPECTIVE,
-            "question": item["title"],
-            "id": item["faq_id"],
-            "answer_id": item["faq_id"],
-        }
-        documents.append(doc)
-        for i, sim_q in enumerate(item.get("similar_questions", [])):
-            if i >= MAX_SIMILAR_QUESTIONS:
-                break
-            curdoc = copy.deepcopy(doc)
-            curdoc["question"] = sim_q
-            curdoc["id"] = _build_sim_id(curdoc["id"], i)
-            documents.append(curdoc)
-
+    documents = list(_iter_documents(data, _faq_document))
     request_data = {"documents": documents, "robot_code": robot_id}
-    return await async_post_rpc(url, request_data)
+    return await faq_engine_request("add_items", request_data)
+
+
+@master_test_wrapper
+@invalidate_cache_wrapper
+async def faq_bulk_update(
+    robot_id,
+    items,
+    chitchat=False,
+    chunk_size=FAQ_BULK_CHUNK_SIZE,
+    concurrency=FAQ_BULK_CONCURRENCY,
+    start=0,
+    progress=None,
+):
+    """分块并发导入大量faq或者闲聊语料.
+
+    items按照chunk_size条一块依次读取，最多同时进行concurrency个请求，内存中最多只保留concurrency块数据。
+    某一块导入失败不影响其他块，失败的块在返回结果中列出，可以通过start参数从失败的位置重新导入，
+    已经导入的数据会被覆盖更新。
+
+    Args:
+        robot_id (str): 机器人的唯一标识
+        items (iterable): 问题数据，格式与faq_update（或者faq_chitchat_update）的data相同，可以是生成器
+        chitchat (bool): 是否为闲聊数据
+        chunk_size (int): 每个请求包含的问题条数
+        concurrency (int): 同时进行的请求个数
+        start (int): 跳过items中前start条数据
+        progress (callable, optional): 每一块完成后调用 progress(已完成的条数, 已读取的条数)
+
+    Returns:
+        dict: status_code为0表示全部导入成功，1表示有导入失败的块；total为读取的条数（不包括跳过的数据），
+              succeeded为导入成功的条数；failed为失败的块，每个元素为 {"start": 开始位置, "end": 结束位置, "error": 错误信息}；
+              resume_from为重新导入时的start参数，全部成功时为None
+    """
+    build_document = _chitchat_document if chitchat else _faq_document
+    semaphore = asyncio.Semaphore(concurrency)
+    report = {"total": 0, "succeeded": 0, "failed": []}
+    finished = 0
+
+    async def upload(chunk_start, chunk):
+        nonlocal finished
+        try:
+            documents = list(_iter_documents(chunk, build_document))
+            request_data = {"documents": documents, "robot_code": robot_id}
+            response_data = await faq_engine_request("add_items", request_data)
+        except RpcException as error:
+            message = error.err_msg()
+        except KeyError as error:
+            message = "缺少字段{}".format(error)
+        except Exception as error:
+            # 接口熔断、进程内引擎出错等，只记录失败的块，不影响其他块和已经统计的结果
+            message = "{}: {}".format(type(error).__name__, error)
+        else:
+            message = None
+            if response_data.get("status_code", 0) != 0:
+                message = response_data.get("msg") or json.dumps(response_data, ensure_ascii=False)
+        finally:
+            semaphore.release()
+        if message is None:
+            report["succeeded"] += len(chunk)
+        else:
+            report["failed"].append({"start": chunk_start, "end": chunk_start + len(chunk), "error": message})
+        finished += len(chunk)
+        if progress is not None:
+            progress(finished, report["total"])
+
+    tasks = []
+    iterator = itertools.islice(items, start, None)
+    chunk_start = start
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            break
+        report["total"] += len(chunk)
+        # 等待有空闲的并发数之后再读取下一块数据
+        await semaphore.acquire()
+        tasks.append(asyncio.ensure_future(upload(chunk_start, chunk)))
+        chunk_start += len(chunk)
+    await asyncio.gather(*tasks)
+
+    report["failed"].sort(key=lambda item: item["start"])
+    report["status_code"] = 1 if report["failed"] else 0
+    report["resume_from"] = report["failed"][0]["start"] if report["failed"] else None
+    return report
 
 
 @master_test_wrapper
+@invalidate_cache_wrapper
 async def faq_delete(robot_id, data):
     """删除faq引擎中的语料数据.
 
@@ -166,7 +331,6 @@ async def faq_delete(robot_id, data):
         {'status_code': 0}
     """
     # TODO 这里后续要考虑如何删除similar questions
-    url = "http://{}/robot_manager/single/delete_items".format(FAQ_ENGINE_ADDR)
     q_ids = data["faq_ids"]
     if isinstance(q_ids, str):
         q_ids = [q_ids]
@@ -179,10 +343,11 @@ async def faq_delete(robot_id, data):
     q_ids.extend(all_ids)
 
     request_data = {"q_ids": q_ids, "robot_code": robot_id}
-    return await async_post_rpc(url, request_data)
+    return await faq_engine_request("delete_items", request_data)
 
 
 @master_test_wrapper
+@invalidate_cache_wrapper
 async def faq_delete_all(robot_id):
     """删除特定机器人的所有语料.
 
@@ -194,9 +359,8 @@ async def faq_delete_all(robot_id):
         >>> faq_delete_all(robot_id)
         {'status_code': 0}
     """
-    url = "http://{}/robot_manager/single/delete_robot".format(FAQ_ENGINE_ADDR)
     request_data = {"robot_code": robot_id}
-    return await async_post_rpc(url, request_data)
+    return await faq_engine_request("delete_robot", request_data)
 
 
 async def faq_push(robot_id):
@@ -204,9 +368,22 @@ async def faq_push(robot_id):
     if not MASTER_ADDR:
         return {"status_code": 0}
     target_robot_id = get_faq_master_robot_id(robot_id)
-    url = "http://{}/robot_manager/single/copy".format(FAQ_ENGINE_ADDR)
     request_data = {"robot_code": robot_id, "target_robot_code": target_robot_id}
-    return await async_post_rpc(url, request_data)
+    try:
+        return await faq_engine_request("copy", request_data)
+    finally:
+        answer_cache.invalidate(robot_id)
+        answer_cache.invalidate(target_robot_id)
+
+
+@master_test_wrapper
+async def faq_invalidate_cache(robot_id):
+    """使机器人在本节点的faq问答缓存失效.
+
+    faq_push在faq引擎中直接复制语料，正式环境没有经过faq_update等接口，需要在推送之后由正式环境调用。
+    """
+    answer_cache.invalidate(robot_id)
+    return {"status_code": 0}
 
 
 @master_test_wrapper
@@ -224,10 +401,7 @@ async def faq_chitchat_ask(robot_id, question):
         >>> faq_chitchat_ask(question)
         {'status_code': 0, 'data': {'answer': '5400元', 'faq_id': 'id1', 'title': '苹果手机多少钱'}}
     """
-    url = "http://{}/robot_manager/single/ask".format(FAQ_ENGINE_ADDR)
-    request_data = {"question": question, "robot_code": robot_id}
-    response_data = await async_post_rpc(url, request_data)
-    response_data = response_data["data"]
+    response_data = await _ask(robot_id, question, {})
 
     if response_data["answer_type"] == FAQ_TYPE_NONUSWER:
         return UNK
@@ -264,15 +438,7 @@ async def faq_ask(
         >>> isinstance(answer, dict)
         True
     """
-    url = "http://{}/robot_manager/single/ask".format(FAQ_ENGINE_ADDR)
-    request_data = {
-        "robot_code": robot_id,
-        "question": question,
-    }
-    request_data.update(faq_params)
-    response_data = await async_post_rpc(url, request_data)
-
-    response_data = response_data["data"]
+    response_data = await _ask(robot_id, question, faq_params)
 
     if response_data["answer_type"] == FAQ_TYPE_NONUSWER:
         answer_data = {
@@ -323,3 +489,88 @@ async def faq_ask(
     answer_data["sms_content"] = response_data.get("sms_content", "")
     answer_data["understanding"] = "3" if answer_data.get("faq_id", UNK) == UNK else "0"
     return answer_data
+
+
+def get_intent_group_id(intent_group):
+    """根据意图组的内容生成稳定的意图组id，内容相同的意图组id相同.
+
+    Args:
+        intent_group (dict): key为意图id，value为该意图的例句列表
+
+    Returns:
+        str: 意图组id
+    """
+    content = json.dumps(intent_group, ensure_ascii=False, sort_keys=True)
+    return hash_string(content.encode("utf-8"))
+
+
+async def faq_register_intent_group(group_id, intent_group):
+    """在faq引擎中注册意图组，之后的意图分类请求只需要传递意图组id.
+
+    注册结果会被记录，注册失败的意图组之后使用旧的协议进行意图分类，不再重复注册。
+
+    Args:
+        group_id (str): 意图组id，参见get_intent_group_id
+        intent_group (dict): key为意图id，value为该意图的例句列表
+
+    Returns:
+        bool: 是否注册成功，faq引擎不支持注册意图组或者返回错误时为False
+    """
+    request_data = {"group_id": group_id, "intent_group": intent_group}
+    try:
+        response_data = await faq_engine_request("register_intent_group", request_data)
+        registered = response_data.get("status_code") == 0
+    except RpcException:
+        registered = False
+    _registered_intent_groups[group_id] = registered
+    _registered_intent_groups.move_to_end(group_id)
+    if len(_registered_intent_groups) > MAX_REGISTERED_INTENT_GROUPS:
+        _registered_intent_groups.popitem(last=False)
+    return registered
+
+
+async def _classify_by_intent_group(question, intent_group, candidates):
+    """使用旧的协议进行意图分类，每次请求都发送完整的意图组."""
+    if candidates is not None:
+        intent_group = {intent: intent_group[intent] for intent in candidates if intent in intent_group}
+    request_data = {"question": question, "intent_group": intent_group}
+    response_data = await faq_engine_request("intent_classify", request_data, coalesce=True, hedge=True)
+    return response_data["data"]["topn_score"]
+
+
+async def faq_intent_classify(question, intent_group, group_id=None, candidates=None):
+    """意图分类，意图组只在第一次使用时注册，之后的请求只发送问题和意图组id.
+
+    faq引擎不支持注册意图组，或者注册失败时，使用旧的协议发送完整的意图组。
+
+    Args:
+        question (str): 用户说的话
+        intent_group (dict): key为意图id，value为该意图的例句列表，只在注册意图组时发送
+        group_id (str, optional): 意图组id，如果为None则根据intent_group计算
+        candidates (list, optional): 候选意图id，为None时意图组中所有意图都是候选意图
+
+    Returns:
+        dict: key为意图id，value为该意图例句中最高的几个相似度值
+    """
+    if group_id is None:
+        group_id = get_intent_group_id(intent_group)
+    registered = _registered_intent_groups.get(group_id)
+    if registered is None:
+        registered = await faq_register_intent_group(group_id, intent_group)
+    else:
+        _registered_intent_groups.move_to_end(group_id)
+    if not registered:
+        return await _classify_by_intent_group(question, intent_group, candidates)
+
+    request_data = {"question": question, "group_id": group_id}
+    if candidates is not None:
+        request_data["candidates"] = list(candidates)
+    response_data = await faq_engine_request("intent_classify", request_data, coalesce=True, hedge=True)
+
+    # faq引擎重启后注册的意图组会丢失，重新注册后再请求一次
+    if response_data.get("status_code") == FAQ_INTENT_GROUP_NOT_FOUND:
+        if not await faq_register_intent_group(group_id, intent_group):
+            return await _classify_by_intent_group(question, intent_group, candidates)
+        response_data = await faq_engine_request("intent_classify", request_data, coalesce=True, hedge=True)
+
+    return response_data["data"]["topn_score"]
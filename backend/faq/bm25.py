@@ -0,0 +1,131 @@
+"""基于字符ngram的BM25倒排索引，用于本地faq引擎的问题检索.
+
+每个文档按照问题的字符unigram和bigram建立倒排表，支持增量添加和删除文档。
+查询时只遍历用户问题中出现的ngram的倒排表，得分除以"与用户问题完全相同的文档"的得分，归一化为0到1之间的置信度，
+从而可以使用与faq引擎相同的答案阈值和推荐阈值。
+"""
+import math
+
+from backend.faq.cache import normalize_question
+
+__all__ = ["BM25Index", "to_terms"]
+
+
+def to_terms(text):
+    """将文本转换为字符unigram和bigram的词频.
+
+    Args:
+        text (str): 文本
+
+    Returns:
+        dict: key为ngram，value为出现次数
+    """
+    text = normalize_question(text).replace(" ", "")
+    counts = {}
+    for n in (1, 2):
+        for i in range(len(text) - n + 1):
+            term = text[i: i + n]
+            counts[term] = counts.get(term, 0) + 1
+    return counts
+
+
+class BM25Index(object):
+    """可以增量更新的BM25倒排索引.
+
+    Attributes:
+        documents (dict): key为文档id，value为文档
+        postings (dict): key为ngram，value为 {文档id: 词频}
+        lengths (dict): key为文档id，value为文档的ngram个数
+        k1 (float): BM25的词频饱和参数
+        b (float): BM25的文档长度归一化参数
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents = {}
+        self.postings = {}
+        self.lengths = {}
+        self._total_length = 0
+
+    def add(self, doc):
+        """添加文档，id相同的文档会被替换.
+
+        Args:
+            doc (dict): faq引擎的文档，包含id和question字段
+        """
+        doc_id = doc["id"]
+        self.remove(doc_id)
+        terms = to_terms(doc["question"])
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+        self.documents[doc_id] = doc
+        self.lengths[doc_id] = sum(terms.values())
+        self._total_length += self.lengths[doc_id]
+
+    def remove(self, doc_id):
+        """删除文档，文档不存在时什么都不做."""
+        doc = self.documents.pop(doc_id, None)
+        if doc is None:
+            return
+        for term in to_terms(doc["question"]):
+            postings = self.postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+        self._total_length -= self.lengths.pop(doc_id)
+
+    def copy(self):
+        """复制索引，文档本身在两个索引之间共享，文档添加后不会被修改."""
+        index = BM25Index(self.k1, self.b)
+        index.documents = dict(self.documents)
+        index.postings = {term: dict(postings) for term, postings in self.postings.items()}
+        index.lengths = dict(self.lengths)
+        index._total_length = self._total_length
+        return index
+
+    def _term_score(self, idf, count, length, avg_length):
+        norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+        return idf * count * (self.k1 + 1) / (count + norm)
+
+    def search(self, text, accept=None, include_unmatched=False):
+        """检索与用户问题相似的文档.
+
+        Args:
+            text (str): 用户问题
+            accept (callable, optional): accept(doc) 为False的文档不参与检索
+            include_unmatched (bool): 是否返回与用户问题没有相同ngram的文档，这些文档的置信度为0
+
+        Returns:
+            list: (文档id, 置信度) 的列表，按照置信度从大到小排列
+        """
+        if not self.documents:
+            return []
+        num_docs = len(self.documents)
+        avg_length = max(self._total_length / num_docs, 1)
+        query = to_terms(text)
+        query_length = sum(query.values())
+
+        scores = {}
+        perfect_score = 0
+        for term, query_count in query.items():
+            postings = self.postings.get(term, {})
+            df = len(postings)
+            idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            # 与用户问题完全相同的文档的得分，用于归一化
+            perfect_score += self._term_score(idf, query_count, query_length, avg_length)
+            for doc_id, count in postings.items():
+                # 词频不超过用户问题中的词频，保证完全相同的文档得分最高
+                score = self._term_score(idf, min(count, query_count), self.lengths[doc_id], avg_length)
+                scores[doc_id] = scores.get(doc_id, 0) + score
+
+        if include_unmatched:
+            scores = {doc_id: scores.get(doc_id, 0) for doc_id in self.documents}
+        results = []
+        for doc_id, score in scores.items():
+            if accept is not None and not accept(self.documents[doc_id]):
+                continue
+            confidence = min(score / perfect_score, 1.0) if perfect_score > 0 else 0.0
+            results.append((doc_id, confidence))
+        results.sort(key=lambda item: -item[1])
+        return results
@@ -0,0 +1,95 @@
+"""faq引擎问答结果的进程内缓存.
+
+缓存faq引擎返回的原始数据，key为 (机器人id, 归一化后的问题, 请求参数)，按照过期时间和缓存条数淘汰。
+机器人的语料发生变化时通过 invalidate 使该机器人的缓存全部失效：每个机器人有一个版本号，版本号是key的一部分，
+失效时版本号加一，旧的缓存不会再被命中，由LRU自然淘汰。在语料更新完成之前发出的请求使用的是旧版本号，
+其结果也不会在更新之后被命中。
+"""
+import copy
+import json
+import re
+import time
+from collections import OrderedDict
+
+__all__ = ["AnswerCache", "normalize_question"]
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    """问题归一化，去掉首尾和连续的空白字符，英文字母转换为小写."""
+    return _WHITESPACE.sub(" ", question).strip().lower()
+
+
+class AnswerCache(object):
+    """带有过期时间的LRU缓存.
+
+    Attributes:
+        maxsize (int): 缓存上限，0为不缓存
+        ttl (float): 缓存的有效秒数
+        hits (int): 命中次数
+        misses (int): 未命中次数
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._versions = {}
+
+    def make_key(self, robot_id, question, params=None):
+        """生成缓存的key.
+
+        Args:
+            robot_id (str): faq引擎中的机器人id
+            question (str): 问题
+            params (dict, optional): 影响答案的其他请求参数，如视角、推荐问题个数
+
+        Returns:
+            tuple: 缓存的key，需要在请求faq引擎之前生成
+        """
+        params = json.dumps(params or {}, ensure_ascii=False, sort_keys=True)
+        return robot_id, self._versions.get(robot_id, 0), normalize_question(question), params
+
+    def get(self, key):
+        """获取缓存的数据，返回的是副本，没有命中时返回None."""
+        item = self._cache.get(key)
+        if item is not None:
+            expire_time, data = item
+            if expire_time > time.monotonic():
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(data)
+            del self._cache[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, data):
+        """缓存数据，如果key对应的机器人在生成key之后失效过，不进行缓存."""
+        if self.maxsize <= 0 or key[1] != self._versions.get(key[0], 0):
+            return
+        self._cache[key] = (time.monotonic() + self.ttl, copy.deepcopy(data))
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, robot_id):
+        """使机器人的所有缓存失效."""
+        self._versions[robot_id] = self._versions.get(robot_id, 0) + 1
+
+    def cache_info(self):
+        """缓存的统计信息.
+
+        Returns:
+            dict: hits为命中次数，misses为未命中次数，hit_rate为命中率，size为当前缓存条数，maxsize为缓存上限
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0,
+            "size": len(self._cache),
+            "maxsize": self.maxsize,
+        }
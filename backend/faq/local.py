@@ -0,0 +1,240 @@
+"""本地faq引擎，实现faq引擎 /robot_manager/single/ 下的语料管理、问答和意图分类接口协议.
+
+每个机器人的语料使用字符ngram的BM25倒排索引（参见backend.faq.bm25）进行检索。
+既可以在进程内通过 LocalFaqEngine.handle 直接调用（配置 faq_engine_embedded），
+也可以通过 make_app 启动为一个http服务，将配置中的 faq_engine_addr 指向该服务即可，用于离线测试和压测。
+
+    python -m backend.faq.local --port 8080 --storage mount/faq_engine
+"""
+import argparse
+import glob
+import json
+import os
+from os.path import basename, exists, join
+
+import tornado.ioloop
+import tornado.web
+
+from backend.faq.bm25 import BM25Index
+from backend.nlu.classifier import IntentClassifier
+from utils.define import (FAQ_DEFAULT_PERSPECTIVE, FAQ_INTENT_GROUP_NOT_FOUND,
+                          FAQ_TYPE_MULTIANSWER, FAQ_TYPE_NONUSWER,
+                          FAQ_TYPE_SINGLEANSWER)
+
+__all__ = ["LocalFaqEngine", "make_app"]
+
+DEFAULT_ANS_THRESHOLD = 0.8  # 置信度不低于该值的问题直接回答
+DEFAULT_RCM_THRESHOLD = 0.4  # 置信度不低于该值的问题作为推荐问题
+DEFAULT_RECOMMEND_NUM = 5
+MULTI_ANSWER_MARGIN = 0.05  # 多个答案的置信度与最高的置信度相差小于该值时需要用户澄清
+
+
+class LocalFaqEngine(object):
+    """本地faq引擎.
+
+    Attributes:
+        intent_groups (dict): key为意图组id，value为由该意图组构建的IntentClassifier
+        indexes (dict): key为机器人id，value为该机器人语料的BM25Index
+        storage_folder (str): 语料的保存目录，为None时只保存在内存中
+    """
+
+    def __init__(self, storage_folder=None):
+        self.intent_groups = {}
+        self.indexes = {}
+        self.storage_folder = storage_folder
+        if storage_folder:
+            self._load_all()
+
+    def _get_storage_path(self, robot_code):
+        return join(self.storage_folder, "{}.json".format(robot_code))
+
+    def _load_all(self):
+        for path in glob.glob(join(self.storage_folder, "*.json")):
+            index = BM25Index()
+            with open(path, "r") as f:
+                for doc in json.load(f):
+                    index.add(doc)
+            self.indexes[basename(path)[: -len(".json")]] = index
+
+    def _save(self, robot_code):
+        """保存机器人的全部语料，先写入临时文件再重命名."""
+        if not self.storage_folder:
+            return
+        path = self._get_storage_path(robot_code)
+        if robot_code not in self.indexes:
+            if exists(path):
+                os.remove(path)
+            return
+        os.makedirs(self.storage_folder, exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(list(self.indexes[robot_code].documents.values()), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def handle(self, api, request_data):
+        """处理请求.
+
+        Args:
+            api (str): 接口名称，即url中 /robot_manager/single/ 之后的部分
+            request_data (dict): 请求参数
+
+        Returns:
+            dict: 与faq引擎格式相同的返回数据
+        """
+        handler = getattr(self, api, None)
+        if api.startswith("_") or handler is None:
+            return {"status_code": 1, "msg": "不支持的接口{}".format(api)}
+        return handler(request_data)
+
+    def add_items(self, request_data):
+        """添加或者更新语料."""
+        robot_code = request_data["robot_code"]
+        index = self.indexes.setdefault(robot_code, BM25Index())
+        for doc in request_data["documents"]:
+            index.add(dict(doc))
+        self._save(robot_code)
+        return {"status_code": 0}
+
+    def delete_items(self, request_data):
+        """删除语料，不存在的id会被忽略."""
+        robot_code = request_data["robot_code"]
+        index = self.indexes.get(robot_code)
+        if index is not None:
+            for doc_id in request_data["q_ids"]:
+                index.remove(doc_id)
+            self._save(robot_code)
+        return {"status_code": 0}
+
+    def delete_robot(self, request_data):
+        """删除机器人的所有语料."""
+        robot_code = request_data["robot_code"]
+        self.indexes.pop(robot_code, None)
+        self._save(robot_code)
+        return {"status_code": 0}
+
+    def copy(self, request_data):
+        """将机器人的语料复制到另一个机器人，覆盖目标机器人原有的语料."""
+        target_robot_code = request_data["target_robot_code"]
+        index = self.indexes.get(request_data["robot_code"])
+        if index is None:
+            self.indexes.pop(target_robot_code, None)
+        else:
+            self.indexes[target_robot_code] = index.copy()
+        self._save(target_robot_code)
+        return {"status_code": 0}
+
+    def ask(self, request_data):
+        """问答.
+
+        perspective中的视角（空格分隔）文档必须全部具有，should_perspective中的视角文档至少具有一个。
+        相似问题与原问题的answer_id相同，每个答案只保留置信度最高的问题。
+        置信度不低于ans_threshold的问题作为答案，多个答案的置信度接近时返回多个答案；
+        其余置信度不低于rcm_threshold的问题作为推荐问题，最多recommend_num个，-1为不限制。
+        """
+        perspective = request_data.get("perspective", FAQ_DEFAULT_PERSPECTIVE).split()
+        should_perspective = request_data.get("should_perspective", "").split()
+        ans_threshold = request_data.get("ans_threshold", DEFAULT_ANS_THRESHOLD)
+        rcm_threshold = request_data.get("rcm_threshold", DEFAULT_RCM_THRESHOLD)
+        recommend_num = request_data.get("recommend_num", DEFAULT_RECOMMEND_NUM)
+
+        def accept(doc):
+            doc_perspective = doc.get("perspective", FAQ_DEFAULT_PERSPECTIVE).split()
+            return all(item in doc_perspective for item in perspective) and (
+                not should_perspective or any(item in doc_perspective for item in should_perspective)
+            )
+
+        index = self.indexes.get(request_data["robot_code"])
+        results = []
+        if index is not None:
+            answer_ids = set()
+            for doc_id, confidence in index.search(
+                request_data["question"], accept, include_unmatched=rcm_threshold <= 0
+            ):
+                doc = index.documents[doc_id]
+                answer_id = doc.get("answer_id", doc_id)
+                if answer_id not in answer_ids:
+                    answer_ids.add(answer_id)
+                    results.append((doc, confidence))
+
+        answers = [
+            (doc, confidence)
+            for doc, confidence in results
+            if confidence >= ans_threshold and confidence > results[0][1] - MULTI_ANSWER_MARGIN
+        ]
+        recommends = [(doc, confidence) for doc, confidence in results[len(answers):] if confidence >= rcm_threshold]
+        if recommend_num >= 0:
+            recommends = recommends[:recommend_num]
+
+        data = {
+            "recommendQuestions": [doc["question"] for doc, _ in recommends],
+            "recommendScores": [confidence for _, confidence in recommends],
+            "recommendAnswers": [doc["answer"] for doc, _ in recommends],
+            "hotQuestions": [],
+        }
+        if not answers:
+            data.update(answer_type=FAQ_TYPE_NONUSWER, answer="", confidence=0)
+        elif len(answers) == 1:
+            doc, confidence = answers[0]
+            data.update(answer_type=FAQ_TYPE_SINGLEANSWER, answer=doc["answer"], confidence=confidence)
+        else:
+            data.update(
+                answer_type=FAQ_TYPE_MULTIANSWER,
+                answer=[doc["answer"] for doc, _ in answers],
+                confidence=[confidence for _, confidence in answers],
+                match_questions=[doc["question"] for doc, _ in answers],
+            )
+        return {"status_code": 0, "data": data}
+
+    def register_intent_group(self, request_data):
+        """注册意图组."""
+        self.intent_groups[request_data["group_id"]] = IntentClassifier(request_data["intent_group"])
+        return {"status_code": 0}
+
+    def intent_classify(self, request_data):
+        """意图分类，兼容直接传递intent_group的旧协议."""
+        if "intent_group" in request_data:
+            classifier = IntentClassifier(request_data["intent_group"])
+            candidates = request_data["intent_group"]
+        else:
+            classifier = self.intent_groups.get(request_data["group_id"])
+            if classifier is None:
+                return {
+                    "status_code": FAQ_INTENT_GROUP_NOT_FOUND,
+                    "msg": "意图组{}没有注册".format(request_data["group_id"]),
+                }
+            candidates = request_data.get("candidates", classifier.intents)
+        topn_score = classifier.classify(request_data["question"], candidates)
+        return {"status_code": 0, "data": {"topn_score": topn_score}}
+
+
+class _LocalFaqHandler(tornado.web.RequestHandler):
+    def initialize(self, engine):
+        self.engine = engine
+
+    def post(self, api):
+        request_data = json.loads(self.request.body)
+        self.write(json.dumps(self.engine.handle(api, request_data), ensure_ascii=False))
+
+
+def make_app(engine=None):
+    """创建本地faq引擎的http服务.
+
+    Args:
+        engine (LocalFaqEngine, optional): 处理请求的引擎，默认新建一个
+
+    Returns:
+        tornado.web.Application: http服务
+    """
+    engine = engine or LocalFaqEngine()
+    return tornado.web.Application(
+        [(r"/robot_manager/single/(\w+)", _LocalFaqHandler, {"engine": engine})]
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地faq引擎")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--storage", default=None, help="语料的保存目录，不指定时只保存在内存中")
+    args = parser.parse_args()
+    make_app(LocalFaqEngine(args.storage)).listen(args.port)
+    tornado.ioloop.IOLoop.current().start()
@@ -0,0 +1,153 @@
+"""后台任务管理.
+
+耗时较长并且包含阻塞调用（如pymysql、requests）的操作在线程池中执行，避免阻塞tornado的事件循环。
+提交任务后立即返回任务id，通过任务id查询任务状态、耗时和结果。
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.exceptions import EXCEPTION_LOGGER, JobNotFoundException, XiaoYuBaseException
+from utils.funcs import generate_uuid
+
+__all__ = ["Job", "JobManager"]
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class Job(object):
+    """后台任务.
+
+    Attributes:
+        job_id (str): 任务id
+        name (str): 任务名称
+        key (str): 去重的key，key相同的任务同时只会执行一个
+        status (str): pending 等待执行，running 正在执行，succeeded 执行成功，failed 执行失败
+        submit_time (float): 提交时间
+        start_time (float): 开始执行时间
+        end_time (float): 结束时间
+        result (any): 执行成功时的返回值
+        error (str): 执行失败时的错误信息
+    """
+
+    def __init__(self, name, key):
+        self.job_id = generate_uuid()
+        self.name = name
+        self.key = key
+        self.status = JOB_PENDING
+        self.submit_time = time.time()
+        self.start_time = None
+        self.end_time = None
+        self.result = None
+        self.error = None
+
+    def run(self, func, args):
+        """在线程池中执行任务."""
+        self.start_time = time.time()
+        self.status = JOB_RUNNING
+        try:
+            self.result = func(*args)
+            self.status = JOB_SUCCEEDED
+        except XiaoYuBaseException as e:
+            self.error = e.err_msg()
+            self.status = JOB_FAILED
+            e.log_err()
+        except Exception as e:
+            self.error = repr(e)
+            self.status = JOB_FAILED
+            EXCEPTION_LOGGER.exception("后台任务%s执行失败", self.name)
+        finally:
+            self.end_time = time.time()
+
+    def to_dict(self):
+        """任务状态.
+
+        Returns:
+            dict: 任务id、名称、状态、结果、错误信息，以及提交、开始、结束的时间和排队、执行的秒数
+        """
+
+        def format_time(timestamp):
+            if timestamp is None:
+                return None
+            return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+        now = time.time()
+        return {
+            "job_id": self.job_id,
+            "name": self.name,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "submit_time": format_time(self.submit_time),
+            "start_time": format_time(self.start_time),
+            "end_time": format_time(self.end_time),
+            "queue_seconds": round((self.start_time or now) - self.submit_time, 3),
+            "run_seconds": round((self.end_time or now) - self.start_time, 3) if self.start_time else 0,
+        }
+
+
+class JobManager(object):
+    """后台任务管理器.
+
+    Attributes:
+        executor (ThreadPoolExecutor): 执行任务的线程池
+        jobs (OrderedDict): key为任务id，value为Job，按照提交顺序排列
+        max_finished (int): 最多保留的已结束任务个数，超出后清理最早的任务
+    """
+
+    def __init__(self, max_workers=2, max_finished=100):
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="xiaoyu_job")
+        self.jobs = OrderedDict()
+        self.max_finished = max_finished
+        self._active = {}
+
+    def submit(self, name, key, func, *args):
+        """提交任务，如果key相同的任务还没有结束，直接返回该任务.
+
+        需要在事件循环中调用，任务结束后的清理在事件循环的线程中进行.
+
+        Args:
+            name (str): 任务名称
+            key (str): 去重的key
+            func (callable): 在线程池中执行的函数
+            *args: func的参数
+
+        Returns:
+            Job: 提交的任务
+        """
+        if key in self._active:
+            return self.jobs[self._active[key]]
+
+        job = Job(name, key)
+        self.jobs[job.job_id] = job
+        self._active[key] = job.job_id
+        future = asyncio.get_event_loop().run_in_executor(self.executor, job.run, func, args)
+        future.add_done_callback(lambda _: self._finish(job))
+        return job
+
+    def _finish(self, job):
+        if self._active.get(job.key) == job.job_id:
+            del self._active[job.key]
+        finished = [
+            job_id for job_id, item in self.jobs.items() if item.status in (JOB_SUCCEEDED, JOB_FAILED)
+        ]
+        for job_id in finished[: max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def active_jobs(self):
+        """正在等待或者执行的任务个数."""
+        return len(self._active)
+
+    def get(self, job_id):
+        """获取任务.
+
+        Raises:
+            JobNotFoundException: 任务不存在或者已经被清理
+        """
+        if job_id not in self.jobs:
+            raise JobNotFoundException(job_id)
+        return self.jobs[job_id]
@@ -1,31 +1,46 @@
 """机器人资源、对话管理."""
+import asyncio
+
 import opencc
 
+import backend.bundle as bundle
 import backend.dialogue as dialogue
 import backend.faq as faq
 import backend.nlu as nlu
+from backend.jobs import JobManager
 from config import global_config
 from utils.define import (MODEL_TYPE_DIALOGUE, MODEL_TYPE_NLU, UNK,
                           get_chitchat_faq_id)
 from utils.exceptions import (DialogueStaticCheckException, ModelTypeException,
-                              NoAvaliableModelException)
+                              NoAvaliableModelException, RpcException)
 from utils.funcs import async_get_rpc, async_post_rpc, get_time_stamp
+from utils.http_client import http_client, latency_budget
 
 DELAY_LODDING_ROBOT = global_config["_delay_loading_robot"]
 MASTER_ADDR = global_config["master_addr"]
 SENTIMENT_SERVER_URL = global_config.get("sentiment_server_url", "")
+SENTIMENT_TIMEOUT = float(global_config["sentiment_timeout"])
+SENTIMENT_BATCH_CONCURRENCY = int(global_config["sentiment_batch_concurrency"])
+SESSION_LATENCY_BUDGET = float(global_config["session_latency_budget"])
+JOB_WORKERS = int(global_config["job_workers"])
+JOB_MAX_FINISHED = int(global_config["job_max_finished"])
 
 __all__ = [
     "session_reply",
     "delete",
     "push",
+    "bundle_manifest",
+    "apply_bundle",
+    "invalidate_faq_cache",
     "checkout",
     "graph_train",
     "nlu_train",
     "nlu_train_sync",
     "faq_train",
     "analyze",
+    "analyze_batch",
     "cluster",
+    "cluster_status",
     "delete_graph",
     "sensitive_words",
     "sensitive_words_train",
@@ -33,11 +48,15 @@ __all__ = [
     "dynamic_intent_delete",
     "dynamic_qa_train",
     "dynamic_qa_delete",
+    "metrics",
+    "clear_expired_sessions",
 ]
 
 
 OPENCC_CONVERTER = opencc.OpenCC("t2s.json")
 
+job_manager = JobManager(JOB_WORKERS, JOB_MAX_FINISHED)
+
 
 async def _faq_session_reply(robot_code, session_id, user_says, faq_params={}):
     """当不存在多轮对话配置时，直接调用faq的api."""
@@ -96,41 +115,53 @@ async def session_reply(
         dict: 具体参见context.StateTracker.get_latest_xiaoyu_pack
     """
     user_code
-    if robot_code not in agents:
-        # TODO 这里应当跟多轮对话的逻辑合并
-        return_dict = await _faq_session_reply(
-            robot_code, session_id, user_says, faq_params
-        )
-    else:
-        agent = agents[robot_code]
-        await agent.handle_message(
-            user_says, sender_id=session_id, params=params, flow_id=flow_id
-        )
-        return_dict = agent.get_latest_xiaoyu_pack(session_id, traceback=traceback)
-
-    return_dict["mood"] = await sentiment_analyze(user_says)
+    # 本轮对话中所有对外请求（包括下面创建的异步任务）共享同一个耗时预算
+    with latency_budget(SESSION_LATENCY_BUDGET):
+        # 情感分析与对话处理互不依赖，同时进行
+        mood_task = asyncio.ensure_future(sentiment_analyze(user_says))
+        try:
+            if robot_code not in agents:
+                # TODO 这里应当跟多轮对话的逻辑合并
+                return_dict = await _faq_session_reply(
+                    robot_code, session_id, user_says, faq_params
+                )
+            else:
+                agent = agents[robot_code]
+                return_dict = await agent.reply(
+                    user_says, sender_id=session_id, params=params, traceback=traceback, flow_id=flow_id
+                )
+        except BaseException:
+            mood_task.cancel()
+            raise
+
+        return_dict["mood"] = await mood_task
     return return_dict
 
 
+async def _wait_with_deadline(coro, timeout, default=-1):
+    """等待异步调用的结果，超过timeout秒没有返回时取消调用并返回default，调用失败时也返回default."""
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except (asyncio.TimeoutError, RpcException):
+        return default
+
+
+async def _get_sentiment(text, key):
+    url = "http://{}/xiaoyu/rpc/sentiment".format(SENTIMENT_SERVER_URL)
+    sentiment = await async_get_rpc(url, {"text": text}, coalesce=True)
+    return sentiment[key]
+
+
 async def sentiment_analyze(text):
+    """情感分析，没有配置情感分析接口、调用失败或者超过SENTIMENT_TIMEOUT秒没有返回时返回-1."""
     if SENTIMENT_SERVER_URL:
-        url = "http://{}/xiaoyu/rpc/sentiment".format(SENTIMENT_SERVER_URL)
-        sentiment = await async_get_rpc(url, {"text": text})
-        return sentiment["score"]
+        return await _wait_with_deadline(_get_sentiment(text, "score"), SENTIMENT_TIMEOUT)
     else:
         return -1
 
 
-async def analyze(robot_code, text):
-    """nlu分析接口.
-
-    Args:
-        robot_code (str): 机器人唯一标识
-        text (str): 待分析的文本
-
-    Returns:
-        dict: 具体参见nlu.
-    """
+def _get_analyze_interpreter(robot_code):
+    """获取分析接口使用的语义理解器."""
     # 由于analyze接口对应的机器人往往只有语义理解模型，新训练的机器人往往没有被加载
     # 这里加载一下，如果此次加载没有加载到，再抛出异常
     if robot_code not in robots_interpreters:
@@ -139,10 +170,11 @@ async def analyze(robot_code, text):
             robots_interpreters[robot_code] = nlu.get_interpreter(robot_code, version)
         except Exception:
             raise NoAvaliableModelException(robot_code, "latest", MODEL_TYPE_NLU)
-    interperter = robots_interpreters.get(robot_code)
+    return robots_interpreters.get(robot_code)
 
-    # TODO 分析接口目前走的是ngram匹配，这里后续需要改成语义向量分析
-    msg = await interperter.parse(text, use_model=False, parse_internal_ner=True)
+
+def _analyze_result(msg):
+    """将语义理解结果转换为分析接口的返回格式."""
     result_dict = msg.to_dict()
 
     # 按照欧的要求，将命名实体的返回格式做修正
@@ -155,16 +187,124 @@ async def analyze(robot_code, text):
             for key, values in result_dict["entities"].items()
             for value in values
         ]
+    return result_dict
 
+
+async def _analyze_sentiment(text):
     # 远程rpc情感分析, TODO 与nlu模块结合
+    return await _wait_with_deadline(_get_sentiment(text, "confidence"), SENTIMENT_TIMEOUT)
+
+
+async def _analyze_sentiments(texts):
+    """批量情感分析，最多同时进行SENTIMENT_BATCH_CONCURRENCY个请求，避免大批量的分析压垮情感分析服务或者触发熔断."""
+    semaphore = asyncio.Semaphore(SENTIMENT_BATCH_CONCURRENCY)
+
+    async def analyze_sentiment(text):
+        async with semaphore:
+            return await _analyze_sentiment(text)
+
+    return await asyncio.gather(*(analyze_sentiment(text) for text in texts))
+
+
+async def analyze(robot_code, text):
+    """nlu分析接口.
+
+    Args:
+        robot_code (str): 机器人唯一标识
+        text (str): 待分析的文本
+
+    Returns:
+        dict: 具体参见nlu.
+    """
+    interperter = _get_analyze_interpreter(robot_code)
+
+    # TODO 分析接口目前走的是ngram匹配，这里后续需要改成语义向量分析
+    parse = interperter.parse(text, use_model=False, parse_internal_ner=True)
+    if SENTIMENT_SERVER_URL:
+        msg, sentiment = await asyncio.gather(parse, _analyze_sentiment(text))
+    else:
+        msg = await parse
+    result_dict = _analyze_result(msg)
+
     if SENTIMENT_SERVER_URL:
-        url = "http://{}/xiaoyu/rpc/sentiment".format(SENTIMENT_SERVER_URL)
-        sentiment = await async_get_rpc(url, {"text": text})
-        result_dict["sentiment"] = sentiment["confidence"]
+        result_dict["sentiment"] = sentiment
 
     return result_dict
 
 
+async def analyze_batch(robot_code, texts):
+    """nlu批量分析接口，相同的文本只分析一次.
+
+    Args:
+        robot_code (str): 机器人唯一标识
+        texts (list): 待分析的文本列表
+
+    Returns:
+        list: 与texts一一对应的分析结果，每个元素参见analyze
+    """
+    interperter = _get_analyze_interpreter(robot_code)
+    parse = interperter.parse_batch(texts, use_model=False, parse_internal_ner=True)
+    unique_texts = list(dict.fromkeys(texts))
+    if SENTIMENT_SERVER_URL:
+        msgs, sentiments = await asyncio.gather(parse, _analyze_sentiments(unique_texts))
+    else:
+        msgs = await parse
+
+    results = {}
+    for msg in msgs:
+        if msg.text not in results:
+            results[msg.text] = _analyze_result(msg)
+
+    if SENTIMENT_SERVER_URL:
+        for text, sentiment in zip(unique_texts, sentiments):
+            results[text]["sentiment"] = sentiment
+
+    return [dict(results[text]) for text in texts]
+
+
+def metrics():
+    """服务运行指标.
+
+    Returns:
+        dict: nlu_parse_cache为各个机器人语义理解器的解析结果缓存统计，
+              dialogue为对话使用的语义理解器，analyze为分析接口使用的语义理解器，
+              统计格式参见nlu.CustormInterpreter.cache_info；
+              faq_answer_cache为faq问答结果缓存的统计，格式与nlu_parse_cache相同；
+              http_pool为对外rpc调用的连接池统计，参见utils.http_client.HttpClient.pool_stats；
+              rpc_endpoints为每个对外接口的熔断状态和耗时分位数，参见utils.http_client.HttpClient.endpoint_stats；
+              active_jobs为正在等待或者执行的后台任务个数；
+              sessions为各个机器人的会话统计，参见dialogue.session.SessionStore.stats
+    """
+    return {
+        "nlu_parse_cache": {
+            "dialogue": {
+                robot_code: agent.interpreter.cache_info() for robot_code, agent in agents.items()
+            },
+            "analyze": {
+                robot_code: interpreter.cache_info()
+                for robot_code, interpreter in robots_interpreters.items()
+            },
+        },
+        "faq_answer_cache": faq.faq_cache_info(),
+        "http_pool": http_client.pool_stats(),
+        "rpc_endpoints": http_client.endpoint_stats(),
+        "active_jobs": job_manager.active_jobs(),
+        "sessions": {
+            robot_code: dict(agent.user_store.stats(), **agent.user_store.memory_stats())
+            for robot_code, agent in agents.items()
+        },
+    }
+
+
+def clear_expired_sessions():
+    """清理所有机器人的过期会话，由服务的定时任务调用.
+
+    Returns:
+        int: 清理的会话个数
+    """
+    return sum(agent.clear_expired_sessions() for agent in list(agents.values()))
+
+
 def delete(robot_code):
     """删除整个机器人.
 
@@ -187,7 +327,7 @@ def delete(robot_code):
     return {"status_code": 0}
 
 
-def delete_graph(robot_code, graph_id):
+async def delete_graph(robot_code, graph_id):
     """删除某个机器人的某个对话流程配置.
 
     Args:
@@ -200,52 +340,150 @@ def delete_graph(robot_code, graph_id):
     # TODO 正式环境中如何进行同步
     # 删除对话流程配置
     dialogue.delete_graph(robot_code, graph_id)
+    bundle.clear_manifest(robot_code)
     # 删除内存中的对话流程配置
     if robot_code in agents:
-        agents[robot_code].delete_dialogue_graph(graph_id)
+        await agents[robot_code].delete_dialogue_graph(graph_id)
     return {"status_code": 0}
 
 
+async def _post_master(data):
+    """调用正式环境的模型包接口，正式环境返回错误时抛出RpcException."""
+    url = "http://{}/xiaoyu/bundle".format(MASTER_ADDR)
+    response = await async_post_rpc(url, data)
+    if response["code"] != "200":
+        raise RpcException(url, {"robot_id": data["robot_id"], "method": data["method"]}, response["msg"])
+    return response["data"]
+
+
 async def push(robot_code, version):
     """将某个版本的模型推送到正式环境.
 
+    对话流程配置和nlu训练数据打包为一个模型包，只发送与正式环境不同的部分，由正式环境校验后一次性应用，参见backend.bundle。
+
     Args:
         robot_code (str): 机器人唯一标识
         version (str): 对应模型或配置的版本
+
+    Returns:
+        dict: parts_total为模型包中的part个数，parts_sent为实际发送的part个数
     """
     # 如果没有指定master_addr则什么都不做
     if not MASTER_ADDR:
         return {"status_code": 0}
-    # 推送对话流程配置
-    dialogue_graphs = dialogue.get_graph_data(robot_code, version)
-    for graph_data in dialogue_graphs.values():
-        data = {
-            "robot_id": robot_code,
-            "method": "train",
-            "version": version,
-            "data": graph_data,
-        }
-        await async_post_rpc("http://{}/xiaoyu/multi/graph".format(MASTER_ADDR), data)
-
-    # 推送nlu模型
-    nlu_data = nlu.get_nlu_raw_data(robot_code, version)
-    if nlu_data:
-        data = {
-            "robot_id": robot_code,
-            "method": "train",
-            "version": version,
-            "data": nlu_data,
-            "_convert": False,
-        }
-        await async_post_rpc("http://{}/xiaoyu/multi/nlu".format(MASTER_ADDR), data)
-
-    # 推送faq
+    full_bundle = bundle.make_bundle(
+        dialogue.get_graph_data(robot_code, version), nlu.get_nlu_raw_data(robot_code, version)
+    )
+    remote = await _post_master({"robot_id": robot_code, "method": "manifest"})
+    delta = bundle.diff_bundle(full_bundle, remote["manifest"])
+    parts_sent = 0
+    if delta is not None:
+        data = {"robot_id": robot_code, "method": "apply", "version": version}
+        result = await _post_master(dict(data, data=bundle.encode_bundle(delta)))
+        if not result["applied"]:
+            # 获取manifest之后正式环境的配置发生了变化，补充发送缺少的部分
+            delta["parts"].update({name: full_bundle["parts"][name] for name in result["missing"]})
+            result = await _post_master(dict(data, data=bundle.encode_bundle(delta)))
+            if not result["applied"]:
+                raise RpcException(
+                    "http://{}/xiaoyu/bundle".format(MASTER_ADDR), data, "正式环境缺少{}".format(result["missing"])
+                )
+        parts_sent = len(delta["parts"])
+
+    # 推送faq，语料在faq引擎中直接复制，需要通知正式环境使问答缓存失效
     await faq.faq_push(robot_code)
-    return {"status_code": 0}
+    await _post_master({"robot_id": robot_code, "method": "invalidate_faq_cache"})
+    return {"status_code": 0, "parts_total": len(full_bundle["parts"]), "parts_sent": parts_sent}
 
 
-def _load_latest(robot_code, graph_id=None):
-    """加载最新的模型."""
+def bundle_manifest(robot_code):
+    """获取最后一次应用的模型包的manifest，用于推送时比较差异.
+
+    Args:
+        robot_code (str): 机器人唯一标识
+
+    Returns:
+        dict: manifest为 part名称 -> hash值
+    """
+    return {"status_code": 0, "manifest": bundle.load_manifest(robot_code)}
+
+
+async def apply_bundle(robot_code, version, data):
+    """正式环境应用推送过来的模型包.
+
+    先校验模型包并在内存中构建新的对话流程，任何一步失败都不会修改已有的数据；全部校验通过后再写入文件并替换内存中的机器人。
+    对话流程配置先写入临时目录再整体替换，参见dialogue.replace_graphs，manifest在所有文件写入之后才保存。
+    manifest中没有发送、并且与本地的hash值不一致的part会在missing中返回，此时不应用模型包。
+
+    Args:
+        robot_code (str): 机器人唯一标识
+        version (str): 推送的版本
+        data (str): 经过encode_bundle编码的模型包
+
+    Returns:
+        dict: applied为是否应用成功，missing为缺少的part，graphs_updated和graphs_deleted为更新和删除的对话流程id，
+              nlu_updated为nlu训练数据是否更新，更新后需要重新训练
+    """
+    received = bundle.decode_bundle(data)
+    manifest = received["manifest"]
+    parts = received["parts"]
+    local_manifest = bundle.load_manifest(robot_code)
+    missing = [
+        name for name, value in manifest.items() if name not in parts and local_manifest.get(name) != value
+    ]
+    if missing:
+        return {"status_code": 0, "applied": False, "missing": missing, "nlu_updated": False}
+
+    graphs = dialogue.get_graph_data(robot_code)
+    updated = {
+        bundle.graph_id_of(name): graph_data for name, graph_data in parts.items() if bundle.is_graph_part(name)
+    }
+    deleted = [graph_id for graph_id in graphs if bundle.graph_part(graph_id) not in manifest]
+    nlu_data = parts.get(bundle.NLU_PART)
+
+    # 先构建新的Agent，对话流程配置有误时在这里抛出异常
+    agent = None
+    if updated or deleted:
+        for graph_id in deleted:
+            del graphs[graph_id]
+        for graph_data in updated.values():
+            graph_data["version"] = version
+        graphs.update(updated)
+        agent = dialogue.Agent(robot_code, _get_latest_interpreter(robot_code), graphs)
+
+    if nlu_data:
+        # nlu训练数据保存在新版本的目录中，训练完成之前不会被使用
+        nlu.update_training_data(robot_code, version, nlu_data, False)
+    if agent is not None:
+        dialogue.replace_graphs(robot_code, version, graphs, updated)
+    bundle.save_manifest(robot_code, manifest)
+    if agent is not None:
+        # 外部会话存储中的会话属于旧的对话流程
+        await agent.user_store.clear()
+        agents[robot_code] = agent
+    return {
+        "status_code": 0,
+        "applied": True,
+        "missing": [],
+        "graphs_updated": list(updated),
+        "graphs_deleted": deleted,
+        "nlu_updated": bool(nlu_data),
+    }
+
+
+async def invalidate_faq_cache(robot_code):
+    """正式环境在测试环境推送faq之后使该机器人的faq问答缓存失效.
+
+    Args:
+        robot_code (str): 机器人唯一标识
+    """
+    return await faq.faq_invalidate_cache(robot_code)
+
+
+def _get_latest_interpreter(robot_code):
+    """获取机器人正在使用的语义理解器."""
+    if robot_code in agents:
+        return agents[robot_code].interpreter
     try:
         version = nlu.get_using_model(robot_code)
         interpreter = nlu.get_interpreter(robot_code, version)
@@ -253,6 +491,12 @@ def _load_latest(robot_code, graph_id=None):
             robots_interpreters[robot_code] = interpreter
     except (AssertionError, NoAvaliableModelException, FileNotFoundError):
         interpreter = nlu.get_empty_interpreter(robot_code)
+    return interpreter
+
+
+def _load_latest(robot_code, graph_id=None):
+    """加载最新的模型."""
+    interpreter = _get_latest_interpreter(robot_code)
     graphs = dialogue.get_graph_data(robot_code)
     if graph_id:
         # 如果指定了机器人id则只加载指定id的对话流程
@@ -262,7 +506,7 @@ def _load_latest(robot_code, graph_id=None):
     agents[robot_code] = dialogue.Agent(robot_code, interpreter, graphs)
 
 
-def checkout(robot_code, model_type, version):
+async def checkout(robot_code, model_type, version):
     """将模型或配置回退到某个版本.
 
     Args:
@@ -275,11 +519,11 @@ def checkout(robot_code, model_type, version):
         _load_latest(robot_code)
     if model_type == MODEL_TYPE_NLU:
         interpreter = nlu.get_interpreter(robot_code, version)
-        agents[robot_code].update_interpreter(interpreter=interpreter)
+        await agents[robot_code].update_interpreter(interpreter=interpreter)
     elif model_type == MODEL_TYPE_DIALOGUE:
         graph = dialogue.checkout(robot_code, version)
         for graph_data in graph.values():
-            agents[robot_code].update_dialogue_graph(graph_data)
+            await agents[robot_code].update_dialogue_graph(graph_data)
     else:
         raise ModelTypeException(model_type)
     return None
@@ -297,10 +541,11 @@ def nlu_train(robot_code, version, data, _convert=True):
                 default is False
     """
     nlu.update_training_data(robot_code, version, data, _convert)
+    bundle.clear_manifest(robot_code)
     return {"status_code": 0}
 
 
-def graph_train(robot_code, version, data):
+async def graph_train(robot_code, version, data):
     """更新对话流程配置。更新配置后直接生效.
 
     Args:
@@ -310,24 +555,45 @@ def graph_train(robot_code, version, data):
     """
     # 更新数据
     dialogue.update_dialogue_graph(robot_code, version, data)
+    bundle.clear_manifest(robot_code)
 
     # 更新机器人中的数据
     if robot_code in agents:
-        agents[robot_code].update_dialogue_graph(data)
+        await agents[robot_code].update_dialogue_graph(data)
     else:
         assert "id" in data, "对话流程配置中应当包含id字段"
         _load_latest(robot_code, data["id"])
+        await agents[robot_code].user_store.clear()
     return {"status_code": 0}
 
 
 def cluster(robot_code):
     """未识别问题的归集与整理.
 
+    归集过程中有数据库读写和同步的rpc调用，在后台线程中执行，接口立即返回任务id。
+    同一个机器人的归集任务没有结束时，再次请求返回正在进行的任务。
+
     Args:
         robot_code (str): 机器人唯一标识
+
+    Returns:
+        dict: job_id为任务id，用于查询任务状态，status为任务状态
     """
-    nlu.run_cluster(robot_code)
-    return {"status_code": 0}
+    job = job_manager.submit("cluster", "cluster:{}".format(robot_code), nlu.run_cluster, robot_code)
+    return {"status_code": 0, "job_id": job.job_id, "status": job.status}
+
+
+def cluster_status(job_id):
+    """查询未识别问题归集任务的状态.
+
+    Args:
+        job_id (str): cluster接口返回的任务id
+
+    Returns:
+        dict: 任务状态、耗时和结果，参见backend.jobs.Job.to_dict
+    """
+    job = job_manager.get(job_id)
+    return dict(job.to_dict(), status_code=0)
 
 
 def sensitive_words_train(robot_code, words, label):
@@ -344,16 +610,23 @@ async def sensitive_words(robot_code, text, labels, strict=True):
     text = OPENCC_CONVERTER.convert(text)
     searchers = sensitive_words_searchers[robot_code]
 
+    # 先发出情感分析请求，在等待返回的同时进行敏感词搜索
+    sentiment_task = asyncio.ensure_future(sentiment_analyze(text))
+    await asyncio.sleep(0)
     sensitive_words = []
     masked_text = text
-    for label in labels:
-        if label not in searchers:
-            raise RuntimeError("机器人{}中没有找到标签为{}的敏感词搜索器".format(robot_code, label))
-        searcher = searchers[label]
-        words, masked_text = searcher.FindAll(masked_text, strict=strict)
-        sensitive_words.extend(words)
-
-    sentiment = await sentiment_analyze(text)
+    try:
+        for label in labels:
+            if label not in searchers:
+                raise RuntimeError("机器人{}中没有找到标签为{}的敏感词搜索器".format(robot_code, label))
+            searcher = searchers[label]
+            words, masked_text = searcher.FindAll(masked_text, strict=strict)
+            sensitive_words.extend(words)
+    except BaseException:
+        sentiment_task.cancel()
+        raise
+
+    sentiment = await sentiment_task
 
     return {
         "text": text,
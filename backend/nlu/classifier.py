@@ -0,0 +1,164 @@
+"""本地意图分类器，用于替代faq引擎的意图分类接口.
+
+对所有意图的例句构建字符ngram的TF-IDF矩阵，以倒排（CSC）的形式存储，
+查询时只累加用户说的话中出现的ngram对应的列，再在候选意图的例句范围内取余弦相似度最高的几个值。
+导出和恢复的方式与 backend.nlu.matcher 中的匹配器相同。
+"""
+import math
+
+import numpy as np
+
+from backend.nlu.matcher import MAX_GRAM_LENGTH, SortedArrayMap, gram_key
+
+__all__ = ["IntentClassifier"]
+
+
+class IntentClassifier(object):
+    """基于字符ngram TF-IDF余弦相似度的意图分类器.
+
+    Attributes:
+        intents (dict): key为意图id，value为该意图例句的范围 [start, end)
+        vocab (SortedArrayMap): key为ngram的编码（参见backend.nlu.matcher.gram_key），value为该ngram在倒排表中的序号
+        idf (np.ndarray): 每个ngram的idf值
+        topn (int): 每个意图返回的最高相似度个数
+    """
+
+    def __init__(self, intent_examples, ngram_range=(1, 2), topn=3):
+        """初始化.
+
+        Args:
+            intent_examples (dict): key为意图id，value为该意图的例句列表
+            ngram_range (tuple): ngram的最小和最大长度，最大长度不能超过MAX_GRAM_LENGTH
+            topn (int): 每个意图返回的最高相似度个数
+        """
+        if ngram_range[1] > MAX_GRAM_LENGTH:
+            raise ValueError("ngram的长度不能超过{}".format(MAX_GRAM_LENGTH))
+        self.ngram_range = tuple(ngram_range)
+        self.topn = topn
+        self.intents = {}
+
+        # 同一个意图的例句在矩阵中是连续的
+        rows = []
+        for intent_id, examples in intent_examples.items():
+            start = len(rows)
+            rows.extend(self._count(example) for example in dict.fromkeys(examples))
+            self.intents[intent_id] = [start, len(rows)]
+
+        vocab = {}
+        document_freqs = []
+        for counts in rows:
+            for gram in counts:
+                if gram not in vocab:
+                    vocab[gram] = len(vocab)
+                    document_freqs.append(0)
+                document_freqs[vocab[gram]] += 1
+        num_examples = len(rows)
+        self.idf = np.array(
+            [math.log((1 + num_examples) / (1 + df)) + 1 for df in document_freqs], dtype=np.float32
+        )
+
+        # 每个例句的向量做L2归一化后按ngram存为倒排表: 第i个ngram为 [offsets[i], offsets[i + 1])
+        postings = [[] for _ in range(len(vocab))]
+        for example_index, counts in enumerate(rows):
+            weights = {vocab[gram]: self._tf(count) for gram, count in counts.items()}
+            norm = math.sqrt(sum((weight * self.idf[col]) ** 2 for col, weight in weights.items()))
+            if norm == 0:
+                continue
+            for col, weight in weights.items():
+                postings[col].append((example_index, weight * self.idf[col] / norm))
+
+        offsets = [0]
+        examples = []
+        values = []
+        for items in postings:
+            for example_index, value in items:
+                examples.append(example_index)
+                values.append(value)
+            offsets.append(len(examples))
+        self.offsets = np.array(offsets, dtype=np.uint32)
+        self.posting_examples = np.array(examples, dtype=np.uint32)
+        self.posting_values = np.array(values, dtype=np.float32)
+        self.num_examples = num_examples
+        self.vocab = SortedArrayMap.from_dict({gram_key(gram): col for gram, col in vocab.items()})
+
+    @staticmethod
+    def _tf(count):
+        return 1 + math.log(count)
+
+    def _count(self, text):
+        counts = {}
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(text) - n + 1):
+                gram = text[i: i + n]
+                counts[gram] = counts.get(gram, 0) + 1
+        return counts
+
+    def classify(self, text, candidates):
+        """计算用户说的话与候选意图的相似度.
+
+        Args:
+            text (str): 用户说的话
+            candidates (list): 候选意图id，没有例句的意图会被忽略
+
+        Returns:
+            dict: key为意图id，value为该意图例句中最高的topn个余弦相似度，从大到小排列，
+                  与faq引擎意图分类接口返回的topn_score格式一致
+        """
+        query = {}
+        for gram, count in self._count(text).items():
+            col = self.vocab.get(gram_key(gram))
+            if col is not None:
+                query[col] = self._tf(count) * self.idf[col]
+
+        scores = np.zeros(self.num_examples, dtype=np.float32)
+        if query:
+            norm = math.sqrt(sum(weight * weight for weight in query.values()))
+            for col, weight in query.items():
+                start, end = self.offsets[col], self.offsets[col + 1]
+                scores[self.posting_examples[start:end]] += self.posting_values[start:end] * (weight / norm)
+
+        topn_score = {}
+        for intent_id in candidates:
+            if intent_id not in self.intents:
+                continue
+            start, end = self.intents[intent_id]
+            if start == end:
+                continue
+            intent_scores = np.sort(scores[start:end])[::-1][: self.topn]
+            topn_score[intent_id] = [float(score) for score in intent_scores]
+        return topn_score
+
+    def dump(self):
+        """导出分类器，参见backend.nlu.matcher."""
+        meta = {
+            "ngram_range": list(self.ngram_range),
+            "topn": self.topn,
+            "intents": self.intents,
+            "num_examples": self.num_examples,
+        }
+        arrays = self.vocab.dump("vocab")
+        arrays.update(
+            {
+                "idf": ("f", self.idf.tolist()),
+                "offsets": ("I", self.offsets.tolist()),
+                "posting_examples": ("I", self.posting_examples.tolist()),
+                "posting_values": ("f", self.posting_values.tolist()),
+            }
+        )
+        return meta, arrays
+
+    @classmethod
+    def load(cls, meta, arrays):
+        """从导出的数据恢复分类器，arrays中的数据不会被复制."""
+        classifier = cls.__new__(cls)
+        classifier.ngram_range = tuple(meta["ngram_range"])
+        classifier.topn = meta["topn"]
+        classifier.intents = meta["intents"]
+        classifier.vocab = SortedArrayMap.load(arrays, "vocab")
+        classifier.num_examples = meta["num_examples"]
+        classifier.idf = np.asarray(arrays["idf"], dtype=np.float32)
+        classifier.offsets = np.asarray(arrays["offsets"], dtype=np.uint32)
+        classifier.posting_examples = np.asarray(arrays["posting_examples"], dtype=np.uint32)
+        classifier.posting_values = np.asarray(arrays["posting_values"], dtype=np.float32)
+        return classifier
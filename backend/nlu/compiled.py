@@ -0,0 +1,133 @@
+"""语义理解器编译文件的读写.
+
+编译文件保存在训练数据 raw_training_data.json 的同级目录下，文件名中包含训练数据内容的hash值，
+训练数据变化后会重新编译。文件布局如下:
+
+    | MAGIC (8字节) | header长度 (uint64) | header (utf-8 json) | 对齐 | array 0 | array 1 | ... |
+
+header 中记录了每个 array 的 typecode、偏移和长度，读取时通过 mmap 直接映射为 memoryview，
+不需要重新构建索引。array 使用本机的字节序，编译文件只在生成它的机器上使用。
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+from array import array
+from os.path import basename, dirname, join
+
+from utils.funcs import hash_string
+
+__all__ = ["get_compiled_path", "save_compiled", "load_compiled"]
+
+MAGIC = b"XYNLU005"
+_HEADER_LENGTH = struct.Struct("<Q")
+_ALIGNMENT = 8
+_COMPILED_PATTERN = "compiled_*.bin"
+
+
+def get_compiled_path(nlu_data_path, content):
+    """获取训练数据对应的编译文件路径.
+
+    Args:
+        nlu_data_path (str): 训练数据文件路径
+        content (bytes): 训练数据文件的内容
+
+    Returns:
+        str: 编译文件的路径
+    """
+    return join(dirname(nlu_data_path), "compiled_{}.bin".format(hash_string(content)))
+
+
+def _align(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def save_compiled(path, meta, arrays):
+    """写入编译文件，先写入临时文件再重命名，并删除同目录下过期的编译文件.
+
+    Args:
+        path (str): 编译文件路径
+        meta (dict): 可以json序列化的数据
+        arrays (dict): name -> (typecode, 整数序列)
+    """
+    buffers = []
+    layout = {}
+    offset = 0
+    for name, (typecode, values) in arrays.items():
+        data = array(typecode, values).tobytes()
+        offset = _align(offset)
+        layout[name] = [typecode, offset, len(values)]
+        buffers.append((offset, data))
+        offset += len(data)
+
+    header = json.dumps({"meta": meta, "arrays": layout}, ensure_ascii=False).encode("utf-8")
+    data_start = _align(len(MAGIC) + _HEADER_LENGTH.size + len(header))
+
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        for offset, data in buffers:
+            f.seek(data_start + offset)
+            f.write(data)
+    os.replace(tmp_path, path)
+
+    for stale in glob.glob(join(dirname(path), _COMPILED_PATTERN)):
+        if basename(stale) != basename(path):
+            os.remove(stale)
+
+
+def _read_compiled(view, views):
+    """解析编译文件，文件不完整或者格式不匹配时抛出异常，创建的memoryview依次加入views."""
+    if bytes(view[: len(MAGIC)]) != MAGIC:
+        raise ValueError("编译文件格式不匹配")
+    header_start = len(MAGIC) + _HEADER_LENGTH.size
+    (header_length,) = _HEADER_LENGTH.unpack(view[len(MAGIC): header_start])
+    header = json.loads(bytes(view[header_start: header_start + header_length]).decode("utf-8"))
+    data_start = _align(header_start + header_length)
+
+    arrays = {}
+    for name, (typecode, offset, length) in header["arrays"].items():
+        itemsize = array(typecode).itemsize
+        start = data_start + offset
+        data = view[start: start + itemsize * length]
+        views.append(data)
+        if len(data) != itemsize * length:
+            raise ValueError("编译文件不完整")
+        arrays[name] = data.cast(typecode)
+        views.append(arrays[name])
+    return header["meta"], arrays
+
+
+def load_compiled(path):
+    """通过mmap读取编译文件.
+
+    Args:
+        path (str): 编译文件路径
+
+    Returns:
+        dict: 写入时的meta数据，如果文件不存在、不完整或者格式不匹配，返回None
+        dict: name -> memoryview，生命周期与mmap相同
+    """
+    if not os.path.exists(path):
+        return None, None
+    with open(path, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件不能mmap
+            return None, None
+
+    view = memoryview(buffer)
+    views = []
+    try:
+        return _read_compiled(view, views)
+    except (ValueError, TypeError, KeyError, struct.error):
+        # 写入过程中进程退出或者磁盘已满时文件可能不完整，由调用方重新编译
+        for item in reversed(views):
+            item.release()
+        view.release()
+        buffer.close()
+        return None, None
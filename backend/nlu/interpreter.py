@@ -1,20 +1,26 @@
 """语义理解单元，Interpreter."""
+import asyncio
 import json
 import os
 import re
-from collections import defaultdict
-
-import ngram
-import dimsim
+import sys
+from collections import OrderedDict, defaultdict
 
 from backend.dialogue.nodes.builtin import ne_extract_funcs
+from backend.dialogue.nodes.builtin.planner import run_extractor
 from backend.faq import faq_ask
-from backend.faq.api import faq_chitchat_ask
+from backend.faq.api import faq_chitchat_ask, faq_intent_classify, get_intent_group_id
+from backend.nlu.classifier import IntentClassifier
+from backend.nlu.compiled import (get_compiled_path, load_compiled,
+                                  save_compiled)
+from backend.nlu.matcher import (IntentRuleMatcher, KeywordMatcher,
+                                 NgramIndex)
+from backend.nlu.phonetic import PhoneticIndex
 from backend.nlu.train import (create_lock, get_nlu_data_path,
                                get_using_model, release_lock)
 from config import global_config, source_root
 from utils.define import NLU_MODEL_USING, UNK, get_chitchat_faq_id
-from utils.funcs import async_post_rpc
+from utils.funcs import async_post_rpc, deep_getsizeof
 
 __all__ = [
     "Message",
@@ -24,8 +30,50 @@ __all__ = [
     "get_empty_interpreter",
 ]
 
-FAQ_ENGINE_ADDR = global_config["faq_engine_addr"]
 CHITCHAT_SERVER_ADDR = global_config["chitchat_server_addr"]
+# 是否使用本地意图分类器，为False时使用faq引擎的意图分类接口
+LOCAL_INTENT_CLASSIFY = global_config["local_intent_classify"]
+# 批量解析时每解析多少条文本让出一次事件循环
+BATCH_YIELD_INTERVAL = 256
+# 每个语义理解器缓存的解析结果条数，0为不缓存
+PARSE_CACHE_SIZE = int(global_config["nlu_parse_cache_size"])
+
+
+class _LazyContainer(object):
+    """第一次访问时才创建的容器字段.
+
+    大多数消息的正则、关键词、选项等容器字段在整个对话中都不会被使用，数据保存在以下划线开头的同名slot中，
+    没有创建时为None，类的内部通过slot判断容器是否为空，避免为了读取而创建容器。
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def __set_name__(self, owner, name):
+        self.slot = "_" + name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if value is None:
+            value = self.factory()
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, value)
+
+
+def _new_list_dict():
+    return defaultdict(list)
+
+
+def _copy_list_dict(data):
+    """复制value为list的字典，空字典返回None."""
+    if not data:
+        return None
+    return defaultdict(list, {key: list(values) for key, values in data.items()})
 
 
 class Message(object):
@@ -38,6 +86,8 @@ class Message(object):
         entities (dict): key为ner识别到的实体，key为实体类型（对应识别能力类型)
                          value为实体值，value是一个list表示可以识别到多个
         text (str): 用户回复的原始内容
+        key_words (dict): key为关键词识别能力名称，value为list，
+                          每个元素为{"value": 关键词, "start": 开始位置, "end": 结束位置}
         understanding (bool): 机器人是否理解当前会话，主要针对faq是否匹配到正确答案
         intent_id2name (dict): 意图id到意图名称的映射
         intent_id2examples (dict): 意图id到对应训练数据的映射
@@ -45,8 +95,65 @@ class Message(object):
         callback_words (str): 机器人在运行过程中为当前会话设置拉回话术，使得用户回到正常的对话流程中。通常此callback_word会与闲聊或者faq进行拼接。
         chitchat_words (str): 闲聊接口的返回结果
         is_start (bool): 记录当前会话是否经过开始节点，用于前端进行统计
+        intent_classifier (IntentClassifier): 本地意图分类器，为None时使用faq引擎的意图分类接口
+        intent_group_id (str): intent_id2examples在faq引擎中注册的意图组id
+        builtin_results (dict): 内置识别能力在当前消息上的执行结果，key为抽取函数或者识别器，参见builtin.planner
+        phonetic_index (PhoneticIndex): 意图例句的发音索引，为None时不进行发音相似度匹配
+        faq_task (asyncio.Task): 预取faq的任务，参见prefetch_faq
+
+    Note:
+        每轮对话都会创建新的消息对象，消息使用__slots__，entities、regx、key_words、options、
+        traceback_data、builtin_results在第一次访问时才创建，参见_LazyContainer。
     """
 
+    __slots__ = (
+        "robot_code",
+        "intent",
+        "intent_confidence",
+        "intent_ranking",
+        "text",
+        "faq_result",
+        "understanding",
+        "callback_words",
+        "chitchat_words",
+        "is_start",
+        "faq_task",
+        "intent_id2name",
+        "intent_id2examples",
+        "intent_id2code",
+        "intent_classifier",
+        "intent_group_id",
+        "phonetic_index",
+        "_entities",
+        "_regx",
+        "_key_words",
+        "_options",
+        "_traceback_data",
+        "_builtin_results",
+    )
+
+    entities = _LazyContainer(_new_list_dict)
+    regx = _LazyContainer(_new_list_dict)
+    key_words = _LazyContainer(_new_list_dict)
+    options = _LazyContainer(list)
+    traceback_data = _LazyContainer(list)
+    builtin_results = _LazyContainer(dict)
+
+    # 消息自己的数据，其余的字段引用语义理解器的数据
+    OWN_FIELDS = (
+        "text",
+        "intent_ranking",
+        "_entities",
+        "_regx",
+        "_key_words",
+        "faq_result",
+        "_options",
+        "_traceback_data",
+        "callback_words",
+        "chitchat_words",
+        "_builtin_results",
+    )
+
     def __init__(
         self,
         raw_message,
@@ -54,36 +161,92 @@ class Message(object):
         intent_id2name={},
         intent_id2examples={},
         intent_id2code={},
+        intent_classifier=None,
+        intent_group_id=None,
+        phonetic_index=None,
     ):
         """初始化."""
         self.robot_code = robot_code
+        self.intent = UNK
+        self.intent_confidence = 0
         # 处理raw_message中没有intent字段的情况
         if not raw_message["intent"]:
             self.intent_ranking = {UNK: 0}
         else:
             # 这里强制转换str类型是因为rasa的一个坑，某些情况下会返回 numpy._str类型，导致json无法序列化
             self.intent_ranking = {
-                item["name"]: float(item["confidence"])
+                sys.intern(str(item["name"])): float(item["confidence"])
                 for item in raw_message["intent_ranking"]
             }
 
-        self.entities = defaultdict(list)
+        self._entities = None
         for item in raw_message["entities"]:
-            self.entities[item["entity"]].append(item["value"])
+            self.entities[sys.intern(item["entity"])].append(item["value"])
         self.text = raw_message["text"]
-        self.regx = defaultdict(list)
-        self.key_words = defaultdict(list)
+        self._regx = None
+        self._key_words = None
         self.faq_result = None
-        self.options = []
-        self.traceback_data = []
+        self._options = None
+        self._traceback_data = None
         self.intent_id2code = intent_id2code
         self.intent_id2name = intent_id2name
         self.intent_id2examples = intent_id2examples
+        self.intent_classifier = intent_classifier
+        self.intent_group_id = intent_group_id
+        self.phonetic_index = phonetic_index
         # 标识当前对话是否被理解，如果对话过程中没有被特别设置，该参数默认为True，0为己理解，1为未理解意图，2为未抽到词槽，3为匹配到faq知识库问题
         self.understanding = "0"
         self.callback_words = ""
         self.chitchat_words = ""
         self.is_start = False
+        self._builtin_results = None
+        self.faq_task = None
+
+    def copy(self):
+        """复制语义理解的结果，返回的消息对象与当前对象不共享可变的数据."""
+        msg = Message.__new__(Message)
+        for name in self.__slots__:
+            setattr(msg, name, getattr(self, name))
+        msg.intent_ranking = dict(self.intent_ranking)
+        msg._entities = _copy_list_dict(self._entities)
+        msg._regx = _copy_list_dict(self._regx)
+        msg._key_words = _copy_list_dict(self._key_words)
+        msg._options = list(self._options) if self._options else None
+        msg._traceback_data = list(self._traceback_data) if self._traceback_data else None
+        msg._builtin_results = dict(self._builtin_results) if self._builtin_results else None
+        msg.faq_task = None
+        return msg
+
+    def dump_state(self):
+        """导出生成对话返回数据需要的字段，用于保存会话状态，参见StateTracker.dump_state."""
+        return {
+            "text": self.text,
+            "intent": self.intent,
+            "intent_confidence": self.intent_confidence,
+            "entities": self._entities or {},
+            "options": self._options or [],
+            "understanding": self.understanding,
+            "callback_words": self.callback_words,
+            "chitchat_words": self.chitchat_words,
+            "is_start": self.is_start,
+            "faq_result": self.faq_result,
+            # 继续执行的节点会向最近一个节点的调试信息中添加数据
+            "traceback_data": self._traceback_data[-1:] if self._traceback_data else [],
+        }
+
+    def load_state(self, state):
+        """dump_state的逆操作，在空消息上恢复字段."""
+        for key, value in state.items():
+            setattr(self, key, value)
+        self.entities = defaultdict(list, self.entities)
+
+    def memory_size(self):
+        """估算消息占用的内存字节数，不包括与语义理解器共享的意图映射、分类器和索引."""
+        seen = set()
+        size = sys.getsizeof(self)
+        for field in self.OWN_FIELDS:
+            size += deep_getsizeof(getattr(self, field), seen)
+        return size
 
     def set_callback_words(self, words):
         """设置对话拉回话术，默认为空字符串."""
@@ -110,8 +273,6 @@ class Message(object):
         """
         if isinstance(value, str):
             value = [value]
-        if key not in self.entities:
-            self.entities[key] = []
         self.entities[key].extend(value)
 
     def update_intent(self):
@@ -133,19 +294,21 @@ class Message(object):
         Args:
             candidates(list) : 候选意图，识别的意图只在候选意图中进行选择。如果指定candidate为None，则默认所有意图为候选
         """
-        post_data = {
-            "question": self.text,
-            "intent_group": {
-                # 这里判断 intent 是否在 intent_id2example 中是防止给的候选意图中训练数据里没有
-                intent: self.intent_id2examples[intent] for intent in candidates if intent in self.intent_id2examples
-            },
+        intent_group = {
+            # 这里判断 intent 是否在 intent_id2example 中是防止给的候选意图中训练数据里没有
+            intent: self.intent_id2examples[intent] for intent in candidates if intent in self.intent_id2examples
         }
-        url = f"http://{FAQ_ENGINE_ADDR}/robot_manager/single/intent_classify"
-        scores = await async_post_rpc(url, post_data)
+        if LOCAL_INTENT_CLASSIFY and self.intent_classifier is not None:
+            topn_score = self.intent_classifier.classify(self.text, intent_group)
+        else:
+            # 注册的意图组为语义理解器的所有意图，通过candidates限定候选意图
+            topn_score = await faq_intent_classify(
+                self.text, self.intent_id2examples, group_id=self.intent_group_id, candidates=intent_group
+            )
 
         # 这里取意图向量匹配的相似度值，和其他规则匹配相似度值的最大值
         intents_candidates = {
-            intent: max(scores) for intent, scores in scores["data"]["topn_score"].items()
+            intent: max(scores) for intent, scores in topn_score.items()
         }
 
         # 规则意图识别
@@ -154,16 +317,10 @@ class Message(object):
                 intents_candidates[intent] = self.intent_ranking.get(intent, 0)
 
         # 对于ASR的识别结果，或者错误输入的结果，这里对用户话术的发音进行相似度匹配
-        for intent_id, examples in post_data["intent_group"].items():
-            for example in filter(lambda x: len(x) == len(self.text), examples):
-                try:
-                    if dimsim.get_distance(example, self.text) < 30 and len(self.text) >= 2:
-                        # TODO 这里应该动态设置成识别到意图的阈值
-                        intents_candidates[intent_id] = max(intents_candidates.get(intent_id, 0), 0.5)
-                except Exception:
-                    # 文字中存在英文或其他不是纯中文的符号，会出现这种情况
-                    continue
-
+        if len(self.text) >= 2 and self.phonetic_index is not None:
+            for intent_id in self.phonetic_index.match(self.text, intent_group):
+                # TODO 这里应该动态设置成识别到意图的阈值
+                intents_candidates[intent_id] = max(intents_candidates.get(intent_id, 0), 0.5)
 
         if len(intents_candidates) == 0:
             self.intent = UNK
@@ -200,8 +357,40 @@ class Message(object):
         # TODO 这里阈值可以写成配置
         return self.faq_result["confidence"] > 0.6
 
+    def prefetch_faq(self, with_chitchat=True):
+        """在处理对话流程的同时提前请求faq，结果在perform_faq中使用.
+
+        Args:
+            with_chitchat (bool): faq没有答案时是否继续请求闲聊
+        """
+        self.faq_task = asyncio.ensure_future(self._fetch_faq(with_chitchat))
+
+    async def _fetch_faq(self, with_chitchat):
+        faq_result = await faq_ask(self.robot_code, self.text)
+        chitchat_words = ""
+        if with_chitchat and faq_result["faq_id"] == UNK:
+            chitchat_words = await self.perform_chitchat()
+        return faq_result, chitchat_words
+
+    def cancel_faq_prefetch(self):
+        """取消没有在perform_faq中使用的预取任务."""
+        task, self.faq_task = self.faq_task, None
+        if task is None:
+            return
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            # 获取一次异常，避免asyncio打印异常没有被获取的警告
+            task.exception()
+
     async def perform_faq(self):
-        """异步请求faq服务器，获取faq数据."""
+        """异步请求faq服务器，获取faq数据，如果已经预取则等待预取的结果."""
+        if self.faq_task is not None:
+            task, self.faq_task = self.faq_task, None
+            faq_result, chitchat_words = await task
+            self.faq_result = self.faq_result or faq_result
+            self.chitchat_words = self.chitchat_words or chitchat_words
+
         if not self.faq_result:
             self.faq_result = await faq_ask(self.robot_code, self.text)
 
@@ -268,14 +457,14 @@ class Message(object):
         """
         当前消息traceback数据是否为空
         """
-        return len(self.traceback_data) == 0
+        return not self._traceback_data
 
     def get_xiaoyu_format_traceback_data(self):
         """
         将追踪的调试信息转换成小语后台需要的格式
         """
         xiaoyu_format_data = []
-        for item in self.traceback_data:
+        for item in self._traceback_data or ():
             xiaoyu_format_data.append(
                 {"type": item["type"], "info": json.dumps(item, ensure_ascii=False)}
             )
@@ -338,12 +527,29 @@ class CustormInterpreter(object):
         version (str): nlu模型的版本
         robot_code (str): 模型所属机器人的id
         intent (str): 意图和其对应的训练数据
-        intent_matcher (str): 基于ngram的意图匹配器
-        regx (dict): key为识别能力名称，value为对应的正则表达式
+        intent_matcher (NgramIndex): 所有意图共用的ngram倒排索引
+        regex_features (dict): key为识别能力名称，value为正则表达式字符串列表
+        regx (dict): key为识别能力名称，value为对应的正则表达式，从编译文件恢复时在第一次解析时才编译
         key_words (dict): key为识别能力的名称，value为list，list中的每个元素为关键词
-        intent_rules (list): 识别意图的正则表达式
+        key_words_matcher (KeywordMatcher): 由key_words编译得到的关键词匹配器
+        intent_rules (dict): 识别意图的正则表达式，不包含作为规则的例句
+        intent_rule_matcher (IntentRuleMatcher): 由intent_rules和意图例句编译得到的意图规则匹配器
+        intent_classifier (IntentClassifier): 由意图训练数据构建的本地意图分类器
+        intent_group_id (str): 所有意图在faq引擎中注册的意图组id
+        phonetic_index (PhoneticIndex): 意图例句的发音索引
+        cache_hits (int): 解析结果缓存的命中次数
+        cache_misses (int): 解析结果缓存的未命中次数
     """
 
+    # 需要编译的匹配器，编译文件中各个匹配器的数据以属性名作为前缀
+    _matchers = (
+        "intent_matcher",
+        "key_words_matcher",
+        "intent_rule_matcher",
+        "intent_classifier",
+        "phonetic_index",
+    )
+
     def __init__(self, robot_code, version, _nlu_data_path=None):
         self.version = version
         self.robot_code = robot_code
@@ -351,8 +557,30 @@ class CustormInterpreter(object):
             nlu_data_path = get_nlu_data_path(robot_code, version)
         else:
             nlu_data_path = _nlu_data_path
-        with open(nlu_data_path, "r") as f:
-            raw_training_data = json.load(f)
+        with open(nlu_data_path, "rb") as f:
+            content = f.read()
+
+        # 不使用模型时解析结果只与文本有关，key为(text, parse_internal_ner)
+        self._parse_cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # 训练数据没有变化时，直接映射之前的编译文件，不再重新构建匹配器
+        compiled_path = get_compiled_path(nlu_data_path, content)
+        meta, arrays = load_compiled(compiled_path)
+        if meta is not None:
+            self._load(meta, arrays)
+        else:
+            self._compile(json.loads(content))
+            try:
+                save_compiled(compiled_path, *self._dump())
+            except OSError:
+                # 模型目录不可写时，只使用内存中的编译结果
+                pass
+        self._intern_keys()
+
+    def _compile(self, raw_training_data):
+        """由训练数据构建语义理解所需的匹配器."""
         regx = raw_training_data["regex_features"]
         examples = raw_training_data["rasa_nlu_data"]["common_examples"]
         intent = {}
@@ -362,32 +590,95 @@ class CustormInterpreter(object):
             else:
                 intent[example["intent"]].append(example["text"])
         self.intent = intent
-        self.intent_matcher = {
-            intent_id: ngram.NGram(examples, N=2, threshold=0.2)
-            for intent_id, examples in self.intent.items()
-        }
+        self.intent_matcher = NgramIndex(self.intent, N=2, threshold=0.2)
+        self.intent_classifier = IntentClassifier(self.intent)
+        self.intent_group_id = get_intent_group_id(self.intent)
+        self.phonetic_index = PhoneticIndex(self.intent)
 
-        self.regx = {
+        self.regex_features = regx
+        self._regx = {
             key: [re.compile(item) for item in value] for key, value in regx.items()
         }
         self.key_words = raw_training_data["key_words"]
+        self.key_words_matcher = KeywordMatcher(self.key_words)
         self.intent_rules = raw_training_data["intent_rules"]
         # 如果训练数据中字符数大于等于二，也将其直接加入到规则匹配
-        for example in examples:
-            if len(example["text"]) < 2:
-                continue
-            item = {
-                "regx": re.escape(example["text"]),
-                "strict": False,
-            }
-            if example["intent"] not in self.intent_rules:
-                self.intent_rules[example["intent"]] = [item]
-            else:
-                self.intent_rules[example["intent"]].append(item)
+        self.intent_rule_matcher = IntentRuleMatcher(self.intent_rules, self.intent)
 
         self.intent_id2name = raw_training_data.get("intent_id2name", {})
         self.intent_id2code = raw_training_data.get("intent_id2code", {})
 
+    def _dump(self):
+        """导出编译结果，参见backend.nlu.compiled."""
+        meta = {
+            "intent": self.intent,
+            "intent_group_id": self.intent_group_id,
+            "regex_features": self.regex_features,
+            "key_words": self.key_words,
+            "intent_rules": self.intent_rules,
+            "intent_id2name": self.intent_id2name,
+            "intent_id2code": self.intent_id2code,
+        }
+        arrays = {}
+        for name in self._matchers:
+            matcher_meta, matcher_arrays = getattr(self, name).dump()
+            meta[name] = matcher_meta
+            arrays.update({name + "." + key: value for key, value in matcher_arrays.items()})
+        return meta, arrays
+
+    def _load(self, meta, arrays):
+        """从编译文件中恢复语义理解器."""
+        self.intent = meta["intent"]
+        self.intent_group_id = meta["intent_group_id"]
+        self.regex_features = meta["regex_features"]
+        # 编译文件中的正则表达式都已经编译成功过，在第一次解析时才编译
+        self._regx = None
+        self.key_words = meta["key_words"]
+        self.intent_rules = meta["intent_rules"]
+        self.intent_id2name = meta["intent_id2name"]
+        self.intent_id2code = meta["intent_id2code"]
+
+        def matcher_arrays(name):
+            prefix = name + "."
+            return {key[len(prefix):]: value for key, value in arrays.items() if key.startswith(prefix)}
+
+        self.intent_matcher = NgramIndex.load(meta["intent_matcher"], matcher_arrays("intent_matcher"))
+        self.key_words_matcher = KeywordMatcher.load(meta["key_words_matcher"], matcher_arrays("key_words_matcher"))
+        self.intent_rule_matcher = IntentRuleMatcher.load(
+            meta["intent_rule_matcher"], matcher_arrays("intent_rule_matcher"), self.intent_rules
+        )
+        self.intent_classifier = IntentClassifier.load(
+            meta["intent_classifier"], matcher_arrays("intent_classifier")
+        )
+        self.phonetic_index = PhoneticIndex.load(meta["phonetic_index"], matcher_arrays("phonetic_index"))
+
+    def _intern_keys(self):
+        """驻留意图id和识别能力名称.
+
+        从json中读取的同一个意图id在各个匹配器中是不同的字符串对象，驻留之后所有消息的intent_ranking和entities
+        共享同一个key对象，字典查找时可以直接比较对象地址。
+        """
+        self.intent = {sys.intern(key): value for key, value in self.intent.items()}
+        self.intent_id2name = {sys.intern(key): value for key, value in self.intent_id2name.items()}
+        self.intent_id2code = {sys.intern(key): value for key, value in self.intent_id2code.items()}
+        if self._regx is not None:
+            self._regx = {sys.intern(key): value for key, value in self._regx.items()}
+        for keys in (
+            self.intent_matcher.intents,
+            self.intent_rule_matcher.intents,
+            self.phonetic_index.intents,
+            self.key_words_matcher.keys,
+        ):
+            keys[:] = [sys.intern(key) for key in keys]
+
+    @property
+    def regx(self):
+        if self._regx is None:
+            self._regx = {
+                sys.intern(key): [re.compile(item) for item in value] for key, value in self.regex_features.items()
+            }
+        return self._regx
+
     def get_examples_by_intent(self, intent_id):
         """
         根据意图id获取对应的训练数据
@@ -405,6 +696,9 @@ class CustormInterpreter(object):
             intent_id2name=self.intent_id2name,
             intent_id2examples=self.intent,
             intent_id2code=self.intent_id2code,
+            intent_classifier=self.intent_classifier,
+            intent_group_id=self.intent_group_id,
+            phonetic_index=self.phonetic_index,
         )
 
     async def parse(self, text, use_model=False, parse_internal_ner=False):
@@ -419,34 +713,96 @@ class CustormInterpreter(object):
             通常多轮对话过程中，这两个参数都设置为False，在对话流程控制中，会进行响应的匹配解析。
             如果是纯语义理解接口，则都设置为True
         """
-        msg = self.get_empty_msg(text)
-        # ngram解析意图
-        intent_ranking = {}
-        for intent_id, matcher in self.intent_matcher.items():
-            match_result = matcher.search(text)
-            if match_result:
-                confidence = 0
-                for item in sorted(match_result, key=lambda x: -x[1]):
-                    confidence += (1 - confidence) * item[1]
-                intent_ranking[intent_id] = confidence
-
-        msg.intent_ranking = intent_ranking
+        # 远程意图识别的结果会随faq引擎变化，只缓存不使用模型的解析结果
+        if use_model:
+            msg = self._parse_intent_ranking(text)
+            await msg.update_intent_by_candidate(self.intent.keys())
+            self._parse_rules(msg, parse_internal_ner)
+            return msg
+
+        # key使用原始文本：消息中保存了原始文本，关键词的位置、正则和关键词的匹配都区分大小写和空白字符，
+        # 与faq问答缓存不同，不能对文本做归一化
+        key = (text, parse_internal_ner)
+        cached = self._parse_cache.get(key)
+        if cached is not None:
+            self._parse_cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached.copy()
+
+        self.cache_misses += 1
+        msg = self._parse_intent_ranking(text)
+        self._parse_rules(msg, parse_internal_ner)
+        if PARSE_CACHE_SIZE > 0:
+            self._parse_cache[key] = msg.copy()
+            if len(self._parse_cache) > PARSE_CACHE_SIZE:
+                self._parse_cache.popitem(last=False)
+        return msg
+
+    def cache_info(self):
+        """解析结果缓存的统计信息.
+
+        Returns:
+            dict: hits为命中次数，misses为未命中次数，hit_rate为命中率，size为当前缓存条数，maxsize为缓存上限
+        """
+        total = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": self.cache_hits / total if total else 0,
+            "size": len(self._parse_cache),
+            "maxsize": PARSE_CACHE_SIZE,
+        }
+
+    def clear_cache(self):
+        """清空解析结果缓存."""
+        self._parse_cache.clear()
+
+    async def parse_batch(self, texts, use_model=False, parse_internal_ner=False):
+        """
+        批量语义解析，结果与逐条调用parse相同
+
+        相同的文本只解析一次，返回同一个Message对象。ngram、规则和实体的匹配在本进程内顺序执行，
+        use_model为True时，远程意图识别请求并发发送。批量解析不读写解析结果缓存，避免离线数据挤占在线对话的缓存。
+
+        Args:
+            texts (list): 待解析的文本列表
+            use_model (bool): 参见parse
+            parse_internal_ner (bool): 参见parse
+
+        Returns:
+            list: 与texts一一对应的Message对象
+        """
+        unique_msgs = {}
+        for text in texts:
+            if text not in unique_msgs:
+                unique_msgs[text] = self._parse_intent_ranking(text)
 
         if use_model:
-            await msg.update_intent_by_candidate(self.intent_matcher.keys())
+            candidates = self.intent.keys()
+            await asyncio.gather(
+                *(msg.update_intent_by_candidate(candidates) for msg in unique_msgs.values())
+            )
+
+        for i, msg in enumerate(unique_msgs.values(), 1):
+            self._parse_rules(msg, parse_internal_ner)
+            # 批量解析是CPU密集的，定期让出事件循环，避免阻塞其他请求
+            if i % BATCH_YIELD_INTERVAL == 0:
+                await asyncio.sleep(0)
+
+        return [unique_msgs[text] for text in texts]
 
+    def _parse_intent_ranking(self, text):
+        """创建消息并通过ngram解析意图."""
+        msg = self.get_empty_msg(text)
+        msg.intent_ranking = self.intent_matcher.search(text)
+        return msg
+
+    def _parse_rules(self, msg, parse_internal_ner):
+        """解析意图规则和实体，参见parse."""
+        text = msg.text
         # 解析意图规则
-        for intent_id, rules in self.intent_rules.items():
-            for rule in rules:
-                try:
-                    match_result = re.search(rule["regx"], text)
-                except Exception:
-                    raise RuntimeError(
-                        "意图{}正则表达式{}不合法，请检查意图训练数据。".format(intent_id, rule["regx"])
-                    )
-                if match_result:
-                    msg.add_intent_ranking(intent_id, 1)
-                    break
+        for intent_id in self.intent_rule_matcher.match(text):
+            msg.add_intent_ranking(intent_id, 1)
         msg.update_intent()
 
         # ner
@@ -458,17 +814,16 @@ class CustormInterpreter(object):
                     msg.add_entities(k, regx_values)
 
         # 同义词解析ner
-        for k, v in self.key_words.items():
-            words = list(filter(lambda x: x in msg.text, v))
-            if len(words) > 0:
-                msg.add_entities(k, words)
+        key_words, spans = self.key_words_matcher.search(text)
+        for k, words in key_words.items():
+            msg.add_entities(k, words)
+        if spans:
+            msg.key_words.update(spans)
 
         # 解析系统内置实体
         if parse_internal_ner:
             for builtin_ne in ne_extract_funcs:
-                for item in builtin_ne(msg):
-                    pass
-        return msg
+                run_extractor(msg, builtin_ne)
 
 
 def get_interpreter(robot_code, version):
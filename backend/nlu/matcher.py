@@ -0,0 +1,676 @@
+"""语义理解中用到的多模式匹配器，在加载模型时构建，解析消息时一次扫描得到所有匹配结果.
+
+每个匹配器都可以通过 dump 导出为 (meta, arrays)，meta 为可以json序列化的数据，
+arrays 为 name -> (typecode, 整数序列)，通过 load 从 meta 和 arrays 恢复匹配器，
+arrays 中的序列可以是 list，也可以是从编译文件中 mmap 得到的 memoryview，参见 backend.nlu.compiled。
+恢复时不重建字典，状态转移表和ngram词表都以有序数组的形式导出，查询时二分查找。
+"""
+import re
+from bisect import bisect_left, bisect_right
+
+__all__ = ["AhoCorasick", "IntentRuleMatcher", "NgramIndex", "KeywordMatcher", "SortedArrayMap", "gram_key"]
+
+# 正则表达式中的元字符，不包含这些字符的规则可以作为普通字符串进行匹配
+_REGX_META = re.compile(r"[.^$*+?{}\[\]|()\\]")
+_REGX_ESCAPED = re.compile(r"\\(.)", re.S)
+
+# unicode 码点最大不超过 0x10FFFF，状态转移表的key为 (state << 21) | ord(char)
+_CHAR_BITS = 21
+# ngram编码为64位整数时的最大长度
+MAX_GRAM_LENGTH = 64 // _CHAR_BITS
+
+
+def regx_to_literal(pattern):
+    """判断正则表达式是否只匹配固定的字符串.
+
+    Args:
+        pattern (str): 正则表达式
+
+    Returns:
+        str: 如果该正则表达式等价于一个非空的普通字符串，返回该字符串，否则返回None
+    """
+    if not pattern:
+        return None
+    if not _REGX_META.search(pattern):
+        return pattern
+    text = _REGX_ESCAPED.sub(r"\1", pattern)
+    # 训练数据中的例句是通过re.escape加入到规则中的
+    if re.escape(text) == pattern:
+        return text
+    return None
+
+
+def gram_key(gram):
+    """将长度不超过MAX_GRAM_LENGTH的ngram编码为整数，每个字符占21位.
+
+    字符按照 ord(char) + 1 编码，不同长度的ngram的编码不会相同。
+
+    Args:
+        gram (str): ngram
+
+    Returns:
+        int: ngram的编码
+    """
+    key = 0
+    for char in gram:
+        key = (key << _CHAR_BITS) | (ord(char) + 1)
+    return key
+
+
+class SortedArrayMap(object):
+    """整数到整数的只读映射，key按照从小到大的顺序存储，查找时二分查找.
+
+    keys 和 values 可以是 list，也可以是从编译文件中 mmap 得到的 memoryview，恢复时不需要重建字典。
+    """
+
+    def __init__(self, keys, values):
+        """初始化.
+
+        Args:
+            keys (list): 从小到大排列的key
+            values (list): 与keys一一对应的value
+        """
+        self.keys = keys
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, mapping):
+        """由字典构建映射."""
+        items = sorted(mapping.items())
+        return cls([key for key, _ in items], [value for _, value in items])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, key, default=None):
+        """查找key对应的value，不存在时返回default."""
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.values[i]
+        return default
+
+    def dump(self, prefix):
+        """导出为arrays，参见模块说明."""
+        return {prefix + "_keys": ("Q", list(self.keys)), prefix + "_values": ("I", list(self.values))}
+
+    @classmethod
+    def load(cls, arrays, prefix):
+        """从导出的arrays恢复映射."""
+        return cls(arrays[prefix + "_keys"], arrays[prefix + "_values"])
+
+
+class _GotoTable(SortedArrayMap):
+    """Aho-Corasick自动机的状态转移表，同一个状态的转移在有序数组中是连续的，参见AhoCorasick.iter.
+
+    状态i的转移为 keys[offsets[i]: offsets[i + 1]]。
+    """
+
+    def __init__(self, keys, values, offsets):
+        super().__init__(keys, values)
+        self.offsets = offsets
+
+    @classmethod
+    def from_dict(cls, mapping, num_states):
+        table = SortedArrayMap.from_dict(mapping)
+        offsets = [0] * (num_states + 1)
+        for key in table.keys:
+            offsets[(key >> _CHAR_BITS) + 1] += 1
+        for state in range(num_states):
+            offsets[state + 1] += offsets[state]
+        return cls(table.keys, table.values, offsets)
+
+    def dump(self, prefix):
+        arrays = super().dump(prefix)
+        arrays[prefix + "_offsets"] = ("I", list(self.offsets))
+        return arrays
+
+    @classmethod
+    def load(cls, arrays, prefix):
+        return cls(arrays[prefix + "_keys"], arrays[prefix + "_values"], arrays[prefix + "_offsets"])
+
+
+def _prefixed(prefix, arrays):
+    return {prefix + name: value for name, value in arrays.items()}
+
+
+def _unprefixed(prefix, arrays):
+    return {name[len(prefix):]: value for name, value in arrays.items() if name.startswith(prefix)}
+
+
+class AhoCorasick(object):
+    """字符级别的Aho-Corasick多模式匹配自动机.
+
+    Attributes:
+        words (list): 自动机中的模式串，下标即为模式串的id，从导出的数据恢复的自动机不保留模式串，为None
+        lengths (list): 每个模式串的长度，匹配到的模式串可以由 text[end - lengths[index]: end] 得到
+    """
+
+    def __init__(self):
+        self.words = []
+        self.lengths = []
+        self._word2index = {}
+        self._goto = {}
+        self._fail = [0]
+        self._outputs = [()]
+        # 每个状态的输出以CSR的形式存储: 状态i的输出为 _out_ids[_out_offsets[i]: _out_offsets[i + 1]]
+        self._out_offsets = [0, 0]
+        self._out_ids = []
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add_word(self, word):
+        """向自动机中添加模式串，添加完所有模式串后需要调用build方法.
+
+        Args:
+            word (str): 模式串，不能为空字符串
+
+        Returns:
+            int: 模式串的id，重复添加的模式串返回相同的id
+        """
+        if word in self._word2index:
+            return self._word2index[word]
+        index = len(self.words)
+        self.words.append(word)
+        self.lengths.append(len(word))
+        self._word2index[word] = index
+
+        state = 0
+        for char in word:
+            key = (state << _CHAR_BITS) | ord(char)
+            if key not in self._goto:
+                self._goto[key] = len(self._fail)
+                self._fail.append(0)
+                self._outputs.append(())
+            state = self._goto[key]
+        self._outputs[state] = (index,)
+        return index
+
+    def build(self):
+        """计算失败指针，并将失败链上的输出合并到每个状态."""
+        children = [[] for _ in self._fail]
+        mask = (1 << _CHAR_BITS) - 1
+        for key, target in self._goto.items():
+            children[key >> _CHAR_BITS].append((key & mask, target))
+
+        queue = [target for _, target in children[0]]
+        for state in queue:
+            self._fail[state] = 0
+        for state in queue:
+            for code, target in children[state]:
+                fail = self._fail[state]
+                while fail and ((fail << _CHAR_BITS) | code) not in self._goto:
+                    fail = self._fail[fail]
+                fail = self._goto.get((fail << _CHAR_BITS) | code, 0)
+                self._fail[target] = fail
+                if self._outputs[fail]:
+                    self._outputs[target] = self._outputs[target] + self._outputs[fail]
+                queue.append(target)
+
+        self._out_offsets = [0]
+        self._out_ids = []
+        for outputs in self._outputs:
+            self._out_ids.extend(outputs)
+            self._out_offsets.append(len(self._out_ids))
+        self._goto = _GotoTable.from_dict(self._goto, len(self._fail))
+
+    def iter(self, text):
+        """扫描一遍文本，返回所有匹配到的模式串.
+
+        Args:
+            text (str): 待匹配的文本
+
+        Yields:
+            tuple: (end, index)，end为匹配结束位置（不包含），index为模式串的id
+        """
+        # 只在当前状态的转移范围内二分查找
+        goto_keys = self._goto.keys
+        goto_values = self._goto.values
+        goto_offsets = self._goto.offsets
+        fail = self._fail
+        out_offsets = self._out_offsets
+        out_ids = self._out_ids
+        state = 0
+        for end, char in enumerate(text, 1):
+            code = ord(char)
+            while True:
+                key = (state << _CHAR_BITS) | code
+                hi = goto_offsets[state + 1]
+                i = bisect_left(goto_keys, key, goto_offsets[state], hi)
+                if i < hi and goto_keys[i] == key:
+                    state = goto_values[i]
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            for i in range(out_offsets[state], out_offsets[state + 1]):
+                yield end, out_ids[i]
+
+    def dump(self):
+        """导出自动机，参见模块说明. 模式串本身不导出，状态转移表按照key排序后导出."""
+        meta = {}
+        arrays = self._goto.dump("goto")
+        arrays.update(
+            {
+                "lengths": ("I", self.lengths),
+                "fail": ("I", self._fail),
+                "out_offsets": ("I", self._out_offsets),
+                "out_ids": ("I", self._out_ids),
+            }
+        )
+        return meta, arrays
+
+    @classmethod
+    def load(cls, meta, arrays):
+        """从导出的数据恢复自动机，恢复后的自动机不能再添加模式串."""
+        automaton = cls.__new__(cls)
+        automaton.words = None
+        automaton.lengths = arrays["lengths"]
+        automaton._word2index = None
+        automaton._goto = _GotoTable.load(arrays, "goto")
+        automaton._fail = arrays["fail"]
+        automaton._outputs = None
+        automaton._out_offsets = arrays["out_offsets"]
+        automaton._out_ids = arrays["out_ids"]
+        return automaton
+
+
+class IntentRuleMatcher(object):
+    """意图规则匹配器.
+
+    固定字符串的规则（包括训练数据中的例句）统一编译进一个Aho-Corasick自动机，
+    其余的规则编译为正则表达式，从导出的数据恢复时在第一次匹配时才编译。每条消息只需扫描一遍自动机，
+    再对尚未命中的意图依次尝试正则规则。
+
+    Attributes:
+        literals (AhoCorasick): 固定字符串规则的自动机
+        intents (list): 意图id列表，下标为意图序号，保证匹配结果的顺序与规则配置的顺序一致
+    """
+
+    def __init__(self, intent_rules, intent_examples=None):
+        """初始化.
+
+        Args:
+            intent_rules (dict): key为意图id，value为规则列表，每条规则为{"regx": str, "strict": bool}
+            intent_examples (dict): key为意图id，value为该意图的例句列表，字符数大于等于二的例句作为固定字符串规则，
+                                    排在该意图配置的规则之后
+        """
+        intent_examples = intent_examples or {}
+        self.intent_rules = intent_rules
+        self.literals = AhoCorasick()
+        self.intents = list(intent_rules)
+        self.intents.extend(intent_id for intent_id in intent_examples if intent_id not in intent_rules)
+        # 自动机中模式串id -> [(意图序号, 规则序号)]
+        literal_rules = []
+        # [(意图序号, 规则序号)]，按照配置顺序排列
+        self._regx_rules = []
+
+        for order, intent_id in enumerate(self.intents):
+            literals = [regx_to_literal(rule["regx"]) for rule in intent_rules.get(intent_id, [])]
+            literals.extend(example for example in intent_examples.get(intent_id, []) if len(example) >= 2)
+            for rule_order, literal in enumerate(literals):
+                if literal is None:
+                    self._regx_rules.append((order, rule_order))
+                    continue
+                index = self.literals.add_word(literal)
+                if index == len(literal_rules):
+                    literal_rules.append([])
+                literal_rules[index].append((order, rule_order))
+        self.literals.build()
+
+        # 以CSR的形式存储每个模式串对应的规则
+        self._literal_offsets = [0]
+        self._literal_intents = []
+        self._literal_rule_orders = []
+        for items in literal_rules:
+            for order, rule_order in items:
+                self._literal_intents.append(order)
+                self._literal_rule_orders.append(rule_order)
+            self._literal_offsets.append(len(self._literal_intents))
+        self._compile_regx_rules()
+
+    def _compile_regx_rules(self):
+        self._compiled = []
+        for order, rule_order in self._regx_rules:
+            intent_id = self.intents[order]
+            rule = self.intent_rules[intent_id][rule_order]
+            try:
+                compiled = re.compile(rule["regx"])
+            except Exception:
+                # 与之前的逻辑保持一致，在解析时匹配到该规则才抛出异常
+                compiled = None
+            self._compiled.append((order, intent_id, rule_order, compiled, rule))
+
+    def match(self, text):
+        """一次扫描得到所有命中的意图以及命中的规则.
+
+        Args:
+            text (str): 用户说的话
+
+        Returns:
+            dict: key为命中的意图id，value为该意图第一条命中的规则，顺序与规则配置的顺序一致，
+                  命中的是例句时规则为{"regx": re.escape(例句), "strict": False}
+        """
+        if self._compiled is None:
+            self._compile_regx_rules()
+        # 意图序号 -> 命中的规则序号
+        fired = {}
+        # 意图序号 -> 命中的固定字符串规则的 (结束位置, 模式串id)
+        spans = {}
+        offsets = self._literal_offsets
+        for end, index in self.literals.iter(text):
+            for i in range(offsets[index], offsets[index + 1]):
+                order = self._literal_intents[i]
+                rule_order = self._literal_rule_orders[i]
+                if order not in fired or rule_order < fired[order]:
+                    fired[order] = rule_order
+                    spans[order] = (end, index)
+
+        for order, intent_id, rule_order, compiled, rule in self._compiled:
+            if order in fired and fired[order] < rule_order:
+                continue
+            if compiled is None:
+                raise RuntimeError(
+                    "意图{}正则表达式{}不合法，请检查意图训练数据。".format(intent_id, rule["regx"])
+                )
+            if compiled.search(text):
+                fired[order] = rule_order
+
+        result = {}
+        for order in sorted(fired):
+            intent_id = self.intents[order]
+            rules = self.intent_rules.get(intent_id, [])
+            if fired[order] < len(rules):
+                result[intent_id] = rules[fired[order]]
+            else:
+                end, index = spans[order]
+                example = text[end - self.literals.lengths[index]: end]
+                result[intent_id] = {"regx": re.escape(example), "strict": False}
+        return result
+
+    def dump(self):
+        """导出匹配器，参见模块说明. 规则和例句本身不导出，恢复时需要传入相同的intent_rules."""
+        literals_meta, literals_arrays = self.literals.dump()
+        meta = {"intents": self.intents, "regx_rules": self._regx_rules, "literals": literals_meta}
+        arrays = _prefixed("literals.", literals_arrays)
+        arrays.update(
+            {
+                "literal_offsets": ("I", self._literal_offsets),
+                "literal_intents": ("I", self._literal_intents),
+                "literal_rule_orders": ("I", self._literal_rule_orders),
+            }
+        )
+        return meta, arrays
+
+    @classmethod
+    def load(cls, meta, arrays, intent_rules):
+        """从导出的数据恢复匹配器，正则规则在第一次匹配时才编译."""
+        matcher = cls.__new__(cls)
+        matcher.intent_rules = intent_rules
+        matcher.intents = meta["intents"]
+        matcher.literals = AhoCorasick.load(meta["literals"], _unprefixed("literals.", arrays))
+        matcher._regx_rules = [tuple(item) for item in meta["regx_rules"]]
+        matcher._literal_offsets = arrays["literal_offsets"]
+        matcher._literal_intents = arrays["literal_intents"]
+        matcher._literal_rule_orders = arrays["literal_rule_orders"]
+        matcher._compiled = None
+        return matcher
+
+
+class NgramIndex(object):
+    """所有意图共用的ngram倒排索引.
+
+    打分方式与 ngram.NGram(examples, N=2, threshold=0.2).search 保持一致，
+    每个倒排列表按照例句的ngram个数排序，查询时根据长度直接跳过不可能超过阈值的例句。
+
+    Attributes:
+        intents (list): 意图id列表，下标为意图序号
+        vocab (SortedArrayMap): key为ngram的编码（参见gram_key），value为该ngram倒排列表的序号
+        example_intent (list): 每个例句所属意图的序号，下标为例句序号
+        example_grams (list): 每个例句补齐后的ngram个数
+    """
+
+    def __init__(self, intent_examples, N=2, threshold=0.2, pad_char="$"):
+        """初始化.
+
+        Args:
+            intent_examples (dict): key为意图id，value为该意图的例句列表
+            N (int): ngram的长度，不能超过MAX_GRAM_LENGTH
+            threshold (float): 例句与用户说的话相似度的阈值
+            pad_char (str): 例句首尾补齐所用的字符
+        """
+        if N > MAX_GRAM_LENGTH:
+            raise ValueError("ngram的长度不能超过{}".format(MAX_GRAM_LENGTH))
+        self.N = N
+        self.threshold = threshold
+        self._padding = pad_char * (N - 1)
+        self.intents = []
+        self.example_intent = []
+        self.example_grams = []
+
+        postings = {}
+        for intent_index, (intent_id, examples) in enumerate(intent_examples.items()):
+            self.intents.append(intent_id)
+            # 每个意图内的例句去重，与 ngram.NGram 的集合语义一致
+            for example in dict.fromkeys(examples):
+                example_index = len(self.example_intent)
+                self.example_intent.append(intent_index)
+                grams = self.split(example)
+                self.example_grams.append(len(grams))
+                counts = {}
+                for gram in grams:
+                    counts[gram] = counts.get(gram, 0) + 1
+                for gram, count in counts.items():
+                    postings.setdefault(gram, []).append((len(grams), example_index, count))
+
+        # 倒排列表以CSR的形式存储: 第i个ngram的倒排列表为 [offsets[i], offsets[i + 1])
+        vocab = {}
+        self.offsets = [0]
+        self.posting_grams = []
+        self.posting_examples = []
+        self.posting_counts = []
+        for gram, items in postings.items():
+            vocab[gram_key(gram)] = len(vocab)
+            for num_grams, example_index, count in sorted(items):
+                self.posting_grams.append(num_grams)
+                self.posting_examples.append(example_index)
+                self.posting_counts.append(count)
+            self.offsets.append(len(self.posting_examples))
+        self.vocab = SortedArrayMap.from_dict(vocab)
+
+    def split(self, text):
+        """将文本首尾补齐后切分为ngram."""
+        padded = self._padding + text + self._padding
+        return [padded[i: i + self.N] for i in range(len(padded) - self.N + 1)]
+
+    def search(self, text):
+        """一次扫描对所有意图进行打分.
+
+        Args:
+            text (str): 用户说的话
+
+        Returns:
+            dict: key为意图id，value为该意图所有相似例句按照noisy-or合并得到的置信度，
+                  只包含至少有一个例句超过阈值的意图，顺序与意图的顺序一致
+        """
+        query_counts = {}
+        for gram in self.split(text):
+            query_counts[gram] = query_counts.get(gram, 0) + 1
+        query_grams = len(text) + self.N - 1
+
+        # 相似度 same / (query_grams + example_grams - same) 不会超过两者长度之比，
+        # 长度相差过大的例句不可能超过阈值，直接跳过
+        if self.threshold > 0:
+            min_grams = int(self.threshold * query_grams)
+            max_grams = int(query_grams / self.threshold) + 1
+        else:
+            min_grams, max_grams = 0, float("inf")
+
+        shared = {}
+        for gram, query_count in query_counts.items():
+            row = self.vocab.get(gram_key(gram))
+            if row is None:
+                continue
+            start = bisect_left(self.posting_grams, min_grams, self.offsets[row], self.offsets[row + 1])
+            end = bisect_right(self.posting_grams, max_grams, start, self.offsets[row + 1])
+            for i in range(start, end):
+                example_index = self.posting_examples[i]
+                count = self.posting_counts[i]
+                shared[example_index] = shared.get(example_index, 0) + min(count, query_count)
+
+        similarities = {}
+        for example_index, same in shared.items():
+            similarity = same / (query_grams + self.example_grams[example_index] - same)
+            if similarity >= self.threshold:
+                similarities.setdefault(self.example_intent[example_index], []).append(similarity)
+
+        intent_ranking = {}
+        for intent_index in sorted(similarities):
+            confidence = 0
+            for similarity in sorted(similarities[intent_index], reverse=True):
+                confidence += (1 - confidence) * similarity
+            intent_ranking[self.intents[intent_index]] = confidence
+        return intent_ranking
+
+    def dump(self):
+        """导出索引，参见模块说明."""
+        meta = {
+            "N": self.N,
+            "threshold": self.threshold,
+            "padding": self._padding,
+            "intents": self.intents,
+        }
+        arrays = self.vocab.dump("vocab")
+        arrays.update(
+            {
+                "example_intent": ("I", self.example_intent),
+                "example_grams": ("I", self.example_grams),
+                "offsets": ("I", self.offsets),
+                "posting_grams": ("I", self.posting_grams),
+                "posting_examples": ("I", self.posting_examples),
+                "posting_counts": ("I", self.posting_counts),
+            }
+        )
+        return meta, arrays
+
+    @classmethod
+    def load(cls, meta, arrays):
+        """从导出的数据恢复索引."""
+        index = cls.__new__(cls)
+        index.N = meta["N"]
+        index.threshold = meta["threshold"]
+        index._padding = meta["padding"]
+        index.intents = meta["intents"]
+        index.vocab = SortedArrayMap.load(arrays, "vocab")
+        for name, value in arrays.items():
+            if not name.startswith("vocab_"):
+                setattr(index, name, value)
+        return index
+
+
+class KeywordMatcher(object):
+    """关键词识别能力匹配器，所有识别能力的关键词编译进同一个Aho-Corasick自动机.
+
+    Attributes:
+        automaton (AhoCorasick): 所有关键词构成的自动机
+        keys (list): 识别能力名称列表，下标为识别能力的序号
+    """
+
+    def __init__(self, key_words):
+        """初始化.
+
+        Args:
+            key_words (dict): key为识别能力的名称，value为list，list中的每个元素为关键词
+        """
+        self.automaton = AhoCorasick()
+        self.keys = list(key_words)
+        # 自动机中模式串id -> [(识别能力序号, 关键词在配置中的序号)]
+        payloads = []
+        # 空字符串关键词在任何文本中都能匹配到，识别能力序号 -> [关键词在配置中的序号]
+        self._empty = {}
+
+        for key_index, words in enumerate(key_words.values()):
+            for order, word in enumerate(words):
+                if not word:
+                    self._empty.setdefault(key_index, []).append(order)
+                    continue
+                index = self.automaton.add_word(word)
+                if index == len(payloads):
+                    payloads.append([])
+                payloads[index].append((key_index, order))
+        self.automaton.build()
+
+        # 以CSR的形式存储每个模式串对应的识别能力，同一个识别能力的记录是连续的
+        self._payload_offsets = [0]
+        self._payload_keys = []
+        self._payload_orders = []
+        for items in payloads:
+            for key_index, order in sorted(items):
+                self._payload_keys.append(key_index)
+                self._payload_orders.append(order)
+            self._payload_offsets.append(len(self._payload_keys))
+
+    def search(self, text):
+        """一次扫描得到所有识别能力匹配到的关键词及其位置.
+
+        Args:
+            text (str): 用户说的话
+
+        Returns:
+            tuple: (entities, spans)，
+                entities (dict): key为识别能力名称，value为匹配到的关键词列表，顺序与关键词配置的顺序一致；
+                spans (dict): key为识别能力名称，value为list，每个元素为{"value": 关键词, "start": 开始位置, "end": 结束位置}，
+                    按照在文本中出现的位置排序
+        """
+        hits = {key_index: {order: "" for order in orders} for key_index, orders in self._empty.items()}
+        spans = {}
+        offsets = self._payload_offsets
+        lengths = self.automaton.lengths
+        for end, index in self.automaton.iter(text):
+            word = text[end - lengths[index]: end]
+            last_key = None
+            for i in range(offsets[index], offsets[index + 1]):
+                key_index = self._payload_keys[i]
+                hits.setdefault(key_index, {})[self._payload_orders[i]] = word
+                if key_index != last_key:
+                    last_key = key_index
+                    key = self.keys[key_index]
+                    spans.setdefault(key, []).append({"value": word, "start": end - len(word), "end": end})
+
+        entities = {}
+        for key_index in sorted(hits):
+            key_hits = hits[key_index]
+            entities[self.keys[key_index]] = [key_hits[order] for order in sorted(key_hits)]
+        for key_spans in spans.values():
+            key_spans.sort(key=lambda x: (x["start"], x["end"]))
+        return entities, spans
+
+    def dump(self):
+        """导出匹配器，参见模块说明."""
+        automaton_meta, automaton_arrays = self.automaton.dump()
+        meta = {
+            "keys": self.keys,
+            "empty": [[key_index, orders] for key_index, orders in self._empty.items()],
+            "automaton": automaton_meta,
+        }
+        arrays = _prefixed("automaton.", automaton_arrays)
+        arrays.update(
+            {
+                "payload_offsets": ("I", self._payload_offsets),
+                "payload_keys": ("I", self._payload_keys),
+                "payload_orders": ("I", self._payload_orders),
+            }
+        )
+        return meta, arrays
+
+    @classmethod
+    def load(cls, meta, arrays):
+        """从导出的数据恢复匹配器."""
+        matcher = cls.__new__(cls)
+        matcher.keys = meta["keys"]
+        matcher._empty = {key_index: orders for key_index, orders in meta["empty"]}
+        matcher.automaton = AhoCorasick.load(meta["automaton"], _unprefixed("automaton.", arrays))
+        matcher._payload_offsets = arrays["payload_offsets"]
+        matcher._payload_keys = arrays["payload_keys"]
+        matcher._payload_orders = arrays["payload_orders"]
+        return matcher
@@ -0,0 +1,186 @@
+"""意图例句的发音索引，用于对ASR识别结果或者错误输入按照发音进行意图匹配.
+
+距离的计算方式与 dimsim.get_distance 一致:
+
+    distance = sum(d_i) * sum(n_i) / (2.1 * L)
+
+其中 d_i 和 n_i 只与第i个位置上的两个音节有关（n_i 由声母、韵母、声调三个差异项组成）。加载模型时把每个例句转换为音节序号并按照长度分桶，
+查询时每个音节对的 (d, n) 只计算一次并缓存为一行向量，对同一长度的所有例句按位置向量化求和。
+无法转换为合法拼音的例句（含有英文、数字、符号等）在构建时就被标记并跳过，
+与 dimsim.get_distance 抛出异常时跳过该例句的效果相同。
+"""
+import numpy as np
+from dimsim.utils.maps import consonantMap_TwoDCode, vowelMap_TwoDCode
+from dimsim.utils.pinyin import Pinyin
+from dimsim.utils.utils import get_edit_distance_close_2d_code, to_pinyin
+
+__all__ = ["PhoneticIndex", "to_syllables"]
+
+
+def to_syllables(text):
+    """将文本转换为带声调的拼音音节.
+
+    Args:
+        text (str): 文本
+
+    Returns:
+        list: 每个字对应的音节，如果文本中存在不能转换为合法拼音的字符，返回None
+    """
+    try:
+        syllables = to_pinyin(text)
+    except IndexError:
+        # 连续的非中文字符会被pypinyin合并为一个元素
+        return None
+    if len(syllables) != len(text):
+        return None
+    for syllable in syllables:
+        # 提前判断能否解析，避免dimsim打印错误信息或者抛出异常
+        pinyin = syllable[:-1].lower()
+        if syllable[-1] not in "012345":
+            return None
+        if pinyin not in Pinyin.vowelList and not any(pinyin.startswith(c) for c in Pinyin.consonantList):
+            return None
+        py = Pinyin(syllable)
+        if py.consonant not in consonantMap_TwoDCode or py.vowel not in vowelMap_TwoDCode:
+            return None
+    return syllables
+
+
+def _syllable_distance(a, b):
+    """计算两个音节在dimsim中的距离项d，以及声母、韵母、声调三个差异项，a为例句的音节，b为用户说的话的音节."""
+    apy = Pinyin(a)
+    bpy = Pinyin(b)
+    distance = get_edit_distance_close_2d_code(apy, bpy)
+    consonant_diff = 1 if apy.consonant != bpy.consonant else 0
+    vowel_diff = 1 if str(apy.vowel) != str(bpy.vowel) else 0
+    tone_diff = 0.01 if apy.tone != bpy.tone else 0
+    return distance, consonant_diff, vowel_diff, tone_diff
+
+
+class PhoneticIndex(object):
+    """意图例句的发音索引.
+
+    Attributes:
+        intents (list): 意图id列表，下标为意图序号
+        syllables (list): 所有例句中出现的音节，下标为音节序号
+        buckets (dict): key为例句长度，value为 (例句所属意图的序号, 例句的音节序号矩阵)
+        num_skipped (int): 不能转换为拼音而被跳过的例句个数
+    """
+
+    def __init__(self, intent_examples):
+        """初始化.
+
+        Args:
+            intent_examples (dict): key为意图id，value为该意图的例句列表
+        """
+        self.intents = list(intent_examples)
+        self.syllables = []
+        self._syllable2index = {}
+        self.num_skipped = 0
+
+        buckets = {}
+        for intent_index, examples in enumerate(intent_examples.values()):
+            for example in dict.fromkeys(examples):
+                syllables = to_syllables(example)
+                if syllables is None:
+                    self.num_skipped += 1
+                    continue
+                codes = [self._add_syllable(syllable) for syllable in syllables]
+                buckets.setdefault(len(example), []).append((intent_index, codes))
+
+        self.buckets = {}
+        for length, items in buckets.items():
+            intent_indexes = np.array([intent_index for intent_index, _ in items], dtype=np.uint32)
+            codes = np.array([codes for _, codes in items], dtype=np.uint32).reshape(len(items), length)
+            self.buckets[length] = (intent_indexes, codes)
+        self._rows = {}
+
+    def _add_syllable(self, syllable):
+        if syllable not in self._syllable2index:
+            self._syllable2index[syllable] = len(self.syllables)
+            self.syllables.append(syllable)
+        return self._syllable2index[syllable]
+
+    def _row(self, syllable):
+        """用户说的话中的某个音节与所有音节的距离项和差异项，计算一次后缓存."""
+        if syllable not in self._rows:
+            pairs = [_syllable_distance(example_syllable, syllable) for example_syllable in self.syllables]
+            self._rows[syllable] = np.array(pairs, dtype=np.float64).reshape(-1, 4).T
+        return self._rows[syllable]
+
+    def distances(self, text):
+        """计算用户说的话与所有长度相同的例句的发音距离.
+
+        Args:
+            text (str): 用户说的话
+
+        Returns:
+            np.ndarray: 长度相同的例句所属意图的序号
+            np.ndarray: 对应例句与用户说的话的距离，如果没有长度相同的例句或者text不能转换为拼音，返回None
+        """
+        if len(text) not in self.buckets:
+            return None, None
+        syllables = to_syllables(text)
+        if syllables is None:
+            return None, None
+
+        intent_indexes, codes = self.buckets[len(text)]
+        distance_sum = np.zeros(len(intent_indexes), dtype=np.float64)
+        num_diff_sum = np.zeros(len(intent_indexes), dtype=np.float64)
+        # 按位置依次累加，浮点数的累加顺序与dimsim相同
+        for i, syllable in enumerate(syllables):
+            column = codes[:, i]
+            distances, consonant_diffs, vowel_diffs, tone_diffs = self._row(syllable)
+            distance_sum += distances[column]
+            num_diff_sum += consonant_diffs[column]
+            num_diff_sum += vowel_diffs[column]
+            num_diff_sum += tone_diffs[column]
+        return intent_indexes, distance_sum * (num_diff_sum / (len(text) * 2.1))
+
+    def match(self, text, candidates, threshold=30):
+        """找出候选意图中存在与用户说的话发音相近的例句的意图.
+
+        Args:
+            text (str): 用户说的话
+            candidates (list): 候选意图id
+            threshold (float): 发音距离小于此阈值的例句认为是发音相近
+
+        Returns:
+            list: 匹配到的意图id，顺序与candidates一致
+        """
+        intent_indexes, distances = self.distances(text)
+        if distances is None:
+            return []
+        matched = {self.intents[i] for i in np.unique(intent_indexes[distances < threshold])}
+        return [intent_id for intent_id in candidates if intent_id in matched]
+
+    def dump(self):
+        """导出索引，参见backend.nlu.matcher."""
+        meta = {
+            "intents": self.intents,
+            "syllables": self.syllables,
+            "num_skipped": self.num_skipped,
+            "lengths": list(self.buckets),
+        }
+        arrays = {}
+        for length, (intent_indexes, codes) in self.buckets.items():
+            arrays["{}.intents".format(length)] = ("I", intent_indexes.tolist())
+            arrays["{}.codes".format(length)] = ("I", codes.ravel().tolist())
+        return meta, arrays
+
+    @classmethod
+    def load(cls, meta, arrays):
+        """从导出的数据恢复索引，arrays中的数据不会被复制."""
+        index = cls.__new__(cls)
+        index.intents = meta["intents"]
+        index.syllables = meta["syllables"]
+        # 音节序号只在构建时使用，恢复的索引不能再添加例句
+        index._syllable2index = None
+        index.num_skipped = meta["num_skipped"]
+        index.buckets = {}
+        for length in meta["lengths"]:
+            intent_indexes = np.asarray(arrays["{}.intents".format(length)], dtype=np.uint32)
+            codes = np.asarray(arrays["{}.codes".format(length)], dtype=np.uint32).reshape(-1, length)
+            index.buckets[length] = (intent_indexes, codes)
+        index._rows = {}
+        return index
@@ -213,8 +213,11 @@ def update_training_data(robot_code, version, nlu_data=None, _convert=True):
     create_lock(robot_code, version, NLU_MODEL_TRAINING)
     if nlu_data:
         nlu_data = _nlu_data_convert(nlu_data) if _convert else nlu_data
-        with open(nlu_data_path, "w") as f:
+        # 先写入临时文件再重命名，写入失败时不会留下不完整的训练数据
+        tmp_path = "{}.{}.tmp".format(nlu_data_path, os.getpid())
+        with open(tmp_path, "w") as f:
             json.dump(nlu_data, f, ensure_ascii=False)
+        os.replace(tmp_path, nlu_data_path)
     release_lock(robot_code, version)
     return OperationResult(OperationResult.OPERATION_SUCCESS, "训练数据更新成功")
 
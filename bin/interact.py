@@ -21,9 +21,9 @@ params = json.load(open(os.path.join(cwd, "params.json")))
 # nlu version 默认使用最新的，这里不再切换
 # manager.checkout(params["robot_code"], MODEL_TYPE_NLU, params["nlu_version"])
 try:
-    manager.checkout(
+    asyncio.run(manager.checkout(
         params["robot_code"], MODEL_TYPE_DIALOGUE, params["dialogue_version"]
-    )
+    ))
 except Exception:
     print("加载指定的机器人多轮模型错误，下面的调用将直接请求faq引擎")
 
@@ -40,9 +40,8 @@ async def run():
     while True:
         user_says = input("用户说：")
         if user_says == "info":
-            print(
-                manager.agents[params["robot_code"]].user_store[sessionId]._latest_msg()
-            )
+            state_tracker = await manager.agents[params["robot_code"]].user_store.load(sessionId)
+            print(state_tracker._latest_msg())
         elif user_says == "verbose":
             pprint(data)
         else:
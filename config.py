@@ -8,6 +8,8 @@ from multiprocessing import Queue
 global_config = {
     "serve_port": 80,
     "faq_engine_addr": None,
+    "faq_engine_embedded": False,  # 是否使用进程内的本地faq引擎代替faq_engine_addr
+    "faq_engine_storage_folder": "mount/faq_engine",  # 进程内faq引擎的语料保存目录
     "model_storage_folder": "mount/models",
     "graph_storage_folder": "mount/dialogue_graph",
     "log_dir": "mount/logs",
@@ -15,12 +17,40 @@ global_config = {
     "external_xiaoyu_port": None,
     "master_addr": "",  # 如果此节点是测试节点，该参数指定主节点的位置
     "source_root": os.path.dirname(os.path.abspath(__file__)),
-    "conversation_expired_time": 10 * 60,  # 会话过期时间
+    "conversation_expired_time": 10 * 60,  # 会话过期时间，从会话最后一次收到消息开始计算
+    "session_sweep_interval": 10,  # 清理过期会话的间隔秒数
+    "session_history_depth": 20,  # 每个会话保留的节点、回复和消息的历史记录条数
+    "session_store": "memory",  # 会话存储，memory 保存在进程内，redis 保存在Redis中，可以部署多个服务进程
+    "session_redis_url": "redis://127.0.0.1:6379/0",  # session_store为redis时的Redis地址
+    "session_key_prefix": "xiaoyu:session:",  # 会话在Redis中的key前缀
     # 是否延迟加载机器人模型，内部参数，配置文件中不要设置
     "_delay_loading_robot": False,
     "sentiment_server_url": "",  # 情感分析接口地址
+    "sentiment_timeout": 0.5,  # 情感分析接口的超时秒数，超时后情感分析结果为-1
+    "sentiment_batch_concurrency": 4,  # 批量分析时同时进行的情感分析请求个数
     "project_name": "_default",  # 部署项目名，项目hardcoding的部分可以柑橘项目名称进行选择
     "chitchat_server_addr": "",  # 闲聊服务地址
+    "nlu_parse_cache_size": 1024,  # 每个语义理解器缓存的解析结果条数，0为不缓存
+    "faq_cache_size": 1024,  # faq问答结果缓存条数，0为不缓存
+    "faq_cache_ttl": 60,  # faq问答结果缓存的有效秒数
+    "faq_bulk_chunk_size": 500,  # 批量导入faq时每个请求包含的问题条数
+    "faq_bulk_concurrency": 4,  # 批量导入faq时同时进行的请求个数
+    "job_workers": 2,  # 执行后台任务（如未识别问题归集）的线程数
+    "job_max_finished": 100,  # 最多保留的已结束后台任务记录个数
+    "faq_prefetch": {},  # 每个机器人的faq预取策略，key为机器人id，value为 faq 或者 faq_chitchat
+    "faq_prefetch_default": "",  # 没有单独配置的机器人的faq预取策略，默认不预取
+    "local_intent_classify": True,  # 是否使用本地意图分类器，为False时使用faq引擎的意图分类接口
+    # 对外rpc调用的连接池配置
+    "http_pool_size": 100,  # 连接总数上限
+    "http_pool_size_per_host": 20,  # 每个host的连接数上限
+    "http_keepalive_timeout": 30,  # 空闲连接保持的秒数
+    "http_dns_cache_ttl": 300,  # dns解析结果缓存的秒数
+    "rpc_timeouts": {},  # 按接口配置超时秒数，key为 host:port 或者 host:port/path 前缀
+    "rpc_breaker_failures": 5,  # 接口连续失败多少次后熔断，0为不熔断
+    "rpc_breaker_recovery_time": 10,  # 熔断后经过多少秒尝试恢复
+    "rpc_hedge_percentile": 95,  # faq引擎等查询接口的请求耗时超过最近耗时的该分位数后发送对冲请求
+    "rpc_hedge_min_samples": 20,  # 接口的耗时样本数达到该值后才发送对冲请求
+    "session_latency_budget": 0,  # 每轮对话中对外请求的总耗时预算（秒），0为不限制
     # mysql 相关配置
     "db_host": "",
     "db_port": 3306,
@@ -2,10 +2,13 @@
 import tornado
 
 import app
+from backend import clear_expired_sessions
 from config import global_config
+from utils.http_client import http_client
 from utils.logging import config_logging
 
 SERVE_PORT = global_config["serve_port"]
+SESSION_SWEEP_INTERVAL = float(global_config["session_sweep_interval"])
 
 
 def main():
@@ -19,11 +22,15 @@ def main():
             (r"/xiaoyu/multi/nlu", app.NLUTrainHandler),
             (r"/xiaoyu/multi/graph", app.GraphHandler),
             (r"/xiaoyu/push", app.PushHandler),
+            (r"/xiaoyu/bundle", app.BundleHandler),
             (r"/xiaoyu/delete", app.DeleteHandler),
             (r"/xiaoyu/delete/graph", app.DeleteGraphHandler),
             (r"/api/v1/session/reply", app.ReplySessionHandler),
             (r"/xiaoyu/analyze", app.NLUHandler),
+            (r"/xiaoyu/analyze/batch", app.NLUBatchHandler),
             (r"/xiaoyu/cluster", app.ClusterHandler),
+            (r"/xiaoyu/cluster/status", app.ClusterStatusHandler),
+            (r"/xiaoyu/metrics", app.MetricsHandler),
             (r"/xiaoyu/sensitive_words", app.SensitiveWordsHandler),
             (r"/xiaoyu/sensitive_words/train", app.SensitiveWordsTrainHandler),
             (r"/xiaoyu/multi/qadb", app.DynamicQATrainHandler),
@@ -32,7 +39,14 @@ def main():
     )
     http_server = tornado.httpserver.HTTPServer(application)
     http_server.listen(SERVE_PORT)
-    tornado.ioloop.IOLoop.current().start()
+    io_loop = tornado.ioloop.IOLoop.current()
+    # 定时清理过期会话，不在请求处理过程中遍历会话
+    tornado.ioloop.PeriodicCallback(clear_expired_sessions, SESSION_SWEEP_INTERVAL * 1000).start()
+    try:
+        io_loop.start()
+    finally:
+        # 关闭对外rpc调用的连接池
+        io_loop.run_sync(http_client.close)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+"""语义解析的微基准测试，统计每次解析的耗时、分配的内存和创建的对象个数.
+
+使用随机生成的训练数据构建语义理解器，分别测试不命中缓存的解析（每次解析前清空缓存）和命中缓存的解析（复制缓存的消息）。
+
+    python scripts/bench_message.py --intents 200 --examples 20 --parses 20000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.nlu.interpreter import CustormInterpreter  # noqa: E402
+
+CHARS = "的一是不了人我在有他这中大来上个国到说们为子和你地出道也时年得就那要下以生会自之着去过家学对可里后小么心多天而能好都然没日于起还发成事只作当想看文无开手十用主行方又如前所本见经头面公同三已老从动两长"
+
+
+def random_text(rng, min_length=4, max_length=16):
+    return "".join(rng.choice(CHARS) for _ in range(rng.randint(min_length, max_length)))
+
+
+def build_training_data(rng, num_intents, num_examples):
+    """生成训练数据，格式与raw_training_data.json相同."""
+    examples = [
+        {"intent": "intent_{}".format(i), "text": random_text(rng)}
+        for i in range(num_intents)
+        for _ in range(num_examples)
+    ]
+    return {
+        "regex_features": {"number": ["\\d+"], "phone": ["1\\d{10}"]},
+        "key_words": {"keyword_{}".format(i): [random_text(rng, 2, 3) for _ in range(10)] for i in range(20)},
+        "intent_rules": {},
+        "rasa_nlu_data": {"common_examples": examples},
+        "intent_id2name": {"intent_{}".format(i): "意图{}".format(i) for i in range(num_intents)},
+    }
+
+
+async def measure(parse, texts):
+    """返回每次解析的平均耗时（微秒）、分配的内存字节数和创建的gc跟踪对象个数.
+
+    内存和对象个数在保留所有解析结果的情况下统计，即每条消息存活期间占用的内存，时间单独测量，不受tracemalloc影响。
+    """
+    gc.collect()
+    start = time.perf_counter()
+    for text in texts:
+        await parse(text)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    gc.disable()
+    objects_before = len(gc.get_objects())
+    tracemalloc.start()
+    msgs = [await parse(text) for text in texts]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    objects = len(gc.get_objects()) - objects_before - 1
+    gc.enable()
+    del msgs
+    return elapsed / len(texts) * 1e6, allocated / len(texts), objects / len(texts)
+
+
+async def run(interpreter, texts):
+    async def parse_uncached(text):
+        interpreter.clear_cache()
+        return await interpreter.parse(text)
+
+    await interpreter.parse(texts[0])
+    print("{:<10}{:>14}{:>16}{:>16}".format("", "us/parse", "bytes/parse", "objects/parse"))
+    for name, parse, bench_texts in (
+        ("uncached", parse_uncached, texts),
+        ("cached", interpreter.parse, [texts[0]] * len(texts)),
+    ):
+        print("{:<10}{:>14.1f}{:>16.0f}{:>16.1f}".format(name, *(await measure(parse, bench_texts))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--intents", type=int, default=200, help="意图个数")
+    parser.add_argument("--examples", type=int, default=20, help="每个意图的例句个数")
+    parser.add_argument("--parses", type=int, default=20000, help="解析次数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    data = build_training_data(rng, args.intents, args.examples)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        nlu_data_path = os.path.join(tmpdir, "raw_training_data.json")
+        with open(nlu_data_path, "w") as f:
+            json.dump(data, f, ensure_ascii=False)
+        interpreter = CustormInterpreter("bench_robot", "bench", _nlu_data_path=nlu_data_path)
+
+    examples = [example["text"] for example in data["rasa_nlu_data"]["common_examples"]]
+    texts = [rng.choice(examples) + random_text(rng, 0, 4) for _ in range(args.parses)]
+    asyncio.run(run(interpreter, texts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import json
+import os
+
+import pytest
+
+from backend.dialogue.agent import Agent
+from backend.dialogue.context import StateTracker
+from backend.nlu.interpreter import Message
+from utils.define import UNK
+
+GRAPH_PATH = os.path.join(os.path.dirname(__file__), "assets", "dialogue_graph.json")
+
+
+class EmptyClassifier(object):
+    """没有任何意图的本地意图分类器"""
+
+    def classify(self, text, intent_group):
+        return {}
+
+
+class KeywordInterpreter(object):
+    """只根据关键词抽取实体的语义理解器"""
+
+    robot_code = "pytest_robot_code"
+
+    async def parse(self, text):
+        return self.get_empty_msg(text)
+
+    def get_empty_msg(self, text=""):
+        entities = []
+        if "粤" in text:
+            entities.append({"entity": "@sys.asr_carnumber", "value": text})
+        raw_msg = {"text": text, "intent": "", "entities": entities}
+        msg = Message(raw_msg, self.robot_code, intent_classifier=EmptyClassifier())
+        msg.intent = UNK
+        return msg
+
+
+@pytest.mark.asyncio
+async def test_delete_graph_during_session(monkeypatch):
+    async def perform_faq(self):
+        self.response_recorder.append("faq")
+        return "faq"
+
+    monkeypatch.setattr(StateTracker, "perform_faq", perform_faq)
+    with open(GRAPH_PATH) as f:
+        graph = json.load(f)
+    agent = Agent("pytest_robot_code", KeywordInterpreter(), {graph["id"]: graph})
+    params = {"对话流程": "移车主流程"}
+    assert await agent.handle_message("你好", "user", params=params) != "faq"
+    state_tracker = agent.user_store.get("user")
+    assert state_tracker.current_state.graph_id == graph["id"]
+
+    await agent.delete_dialogue_graph(graph["id"])
+    assert agent.user_store.get("user") is None
+
+    # 删除时正在处理的对话在删除之后才保存会话，游标指向已经不存在的节点
+    await agent.user_store.save(state_tracker)
+    assert await agent.handle_message("粤A12345", "user") == "faq"
+    assert agent.user_store.get("user").current_state is None
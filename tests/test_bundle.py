@@ -0,0 +1,63 @@
+import pytest
+
+import backend.bundle as bundle
+from backend.dialogue import graph_parser
+from utils.exceptions import BundleCorruptedException
+
+
+def test_diff_bundle():
+    graphs = {"graph_one": {"id": "graph_one", "version": "v1"}, "graph_two": {"id": "graph_two"}}
+    full_bundle = bundle.make_bundle(graphs, {"intents": []})
+    assert set(full_bundle["manifest"]) == {"graph/graph_one", "graph/graph_two", "nlu"}
+    # 对话流程配置中的版本号不影响hash值
+    assert full_bundle["manifest"]["graph/graph_one"] == bundle.part_hash({"id": "graph_one", "version": "v2"})
+
+    assert bundle.diff_bundle(full_bundle, full_bundle["manifest"]) is None
+    remote = dict(full_bundle["manifest"], nlu="stale")
+    delta = bundle.diff_bundle(full_bundle, remote)
+    assert list(delta["parts"]) == ["nlu"]
+    assert delta["manifest"] == full_bundle["manifest"]
+
+    decoded = bundle.decode_bundle(bundle.encode_bundle(delta))
+    assert decoded == delta
+
+
+def test_decode_bundle_checks_hash():
+    delta = bundle.make_bundle({}, {"intents": []})
+    delta["parts"]["nlu"] = {"intents": ["changed"]}
+    with pytest.raises(BundleCorruptedException):
+        bundle.decode_bundle(bundle.encode_bundle(delta))
+    with pytest.raises(BundleCorruptedException):
+        bundle.decode_bundle("not a bundle")
+
+
+def test_manifest(tmpdir, monkeypatch):
+    monkeypatch.setattr(bundle, "graph_storage_folder", str(tmpdir))
+    assert bundle.load_manifest("robot") == {}
+    bundle.save_manifest("robot", {"nlu": "hash"})
+    assert bundle.load_manifest("robot") == {"nlu": "hash"}
+    bundle.clear_manifest("robot")
+    assert bundle.load_manifest("robot") == {}
+
+
+def test_replace_graphs(tmpdir, monkeypatch):
+    monkeypatch.setattr(graph_parser, "graph_storage_folder", str(tmpdir))
+    graph_parser.update_dialogue_graph("robot", "v1", {"id": "one"})
+    graph_parser.update_dialogue_graph("robot", "v1", {"id": "two"})
+
+    graphs = {"one": {"id": "one", "version": "v2"}, "three": {"id": "three", "version": "v2"}}
+    graph_parser.replace_graphs("robot", "v2", graphs, ["three"])
+    assert graph_parser.get_graph_data("robot") == graphs
+    assert list(graph_parser.get_graph_data("robot", "v2")) == ["three"]
+    # 旧版本的配置不变
+    assert set(graph_parser.get_graph_data("robot", "v1")) == {"one", "two"}
+
+    # 写入失败时保留原来的配置
+    def broken_dump(path, data):
+        raise OSError("磁盘已满")
+
+    monkeypatch.setattr(graph_parser, "_dump_graph", broken_dump)
+    with pytest.raises(OSError):
+        graph_parser.replace_graphs("robot", "v3", {"four": {"id": "four"}}, ["four"])
+    assert graph_parser.get_graph_data("robot") == graphs
+    assert tmpdir.join("robot").listdir(lambda path: path.basename.startswith(".")) == []
@@ -0,0 +1,44 @@
+import time
+
+from backend.faq.cache import AnswerCache
+
+
+def test_answer_cache():
+    cache = AnswerCache(maxsize=2, ttl=60)
+    key = cache.make_key("robot", " 苹果手机 多少钱", {"perspective": "default"})
+    assert cache.get(key) is None
+    cache.set(key, {"answer": "5400元"})
+
+    data = cache.get(cache.make_key("robot", "苹果手机  多少钱 ", {"perspective": "default"}))
+    assert data == {"answer": "5400元"}
+    # 返回的是副本，修改不影响缓存
+    data["answer"] = ""
+    assert cache.get(key) == {"answer": "5400元"}
+    assert cache.get(cache.make_key("robot", "苹果手机 多少钱", {"perspective": "other"})) is None
+
+    cache.set(cache.make_key("robot", "你好", {}), {})
+    cache.set(cache.make_key("robot", "再见", {}), {})
+    assert cache.get(key) is None
+    assert cache.cache_info() == {"hits": 2, "misses": 3, "hit_rate": 0.4, "size": 2, "maxsize": 2}
+
+
+def test_answer_cache_invalidate():
+    cache = AnswerCache(maxsize=10, ttl=60)
+    key = cache.make_key("robot", "你好")
+    other_key = cache.make_key("other_robot", "你好")
+    cache.set(other_key, {"answer": "你好"})
+
+    # 语料更新之前发出的请求，结果在更新之后返回，不进行缓存
+    cache.invalidate("robot")
+    cache.set(key, {"answer": "旧答案"})
+    assert cache.get(cache.make_key("robot", "你好")) is None
+    assert cache.get(other_key) == {"answer": "你好"}
+
+
+def test_answer_cache_ttl():
+    cache = AnswerCache(maxsize=10, ttl=0.01)
+    key = cache.make_key("robot", "你好")
+    cache.set(key, {"answer": "你好"})
+    time.sleep(0.02)
+    assert cache.get(key) is None
+    assert cache.cache_info()["size"] == 0
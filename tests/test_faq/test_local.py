@@ -0,0 +1,184 @@
+from collections import OrderedDict
+
+import pytest
+import pytest_asyncio
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+import backend.faq.api as api
+from backend.faq.cache import AnswerCache
+from backend.faq.local import LocalFaqEngine, make_app
+from utils.define import (FAQ_INTENT_GROUP_NOT_FOUND, FAQ_TYPE_NONUSWER, UNK,
+                          get_faq_master_robot_id, get_faq_test_robot_id)
+from utils.circuit_breaker import CircuitOpenError
+from utils.http_client import http_client
+
+INTENT_GROUP = {"weather": ["今天天气怎么样", "明天会下雨吗"], "music": ["放一首歌", "播放音乐"]}
+
+
+@pytest_asyncio.fixture
+async def engine(monkeypatch):
+    engine = LocalFaqEngine()
+    sock, port = bind_unused_port()
+    server = HTTPServer(make_app(engine))
+    server.add_sockets([sock])
+    monkeypatch.setattr(api, "FAQ_ENGINE_ADDR", "127.0.0.1:{}".format(port))
+    monkeypatch.setattr(api, "_registered_intent_groups", OrderedDict())
+    yield engine
+    server.stop()
+    await http_client.close()
+
+
+@pytest.mark.asyncio
+async def test_intent_classify_by_group_id(engine):
+    group_id = api.get_intent_group_id(INTENT_GROUP)
+    topn_score = await api.faq_intent_classify("后天会下雨吗", INTENT_GROUP, candidates=["weather"])
+    assert list(topn_score) == ["weather"]
+    assert group_id in engine.intent_groups
+
+    # faq引擎重启后意图组丢失，会自动重新注册
+    engine.intent_groups.clear()
+    assert engine.handle("intent_classify", {"question": "你好", "group_id": group_id})["status_code"] == (
+        FAQ_INTENT_GROUP_NOT_FOUND
+    )
+    assert await api.faq_intent_classify("后天会下雨吗", INTENT_GROUP, group_id=group_id) == {
+        **topn_score,
+        "music": [0, 0],
+    }
+
+
+@pytest.mark.asyncio
+async def test_intent_classify_without_register(engine, monkeypatch):
+    # 不支持注册意图组的faq引擎使用旧的协议
+    monkeypatch.setattr(engine, "register_intent_group", lambda request_data: {"status_code": 1})
+    topn_score = await api.faq_intent_classify("后天会下雨吗", INTENT_GROUP, candidates=["weather"])
+    assert list(topn_score) == ["weather"]
+    assert api._registered_intent_groups == {api.get_intent_group_id(INTENT_GROUP): False}
+
+
+@pytest.mark.asyncio
+async def test_bulk_update(engine, monkeypatch):
+    monkeypatch.setattr(api, "MASTER_ADDR", "")
+    items = [
+        {"faq_id": "id{}".format(i), "title": "问题{}".format(i), "similar_questions": ["相似问题{}".format(i)]}
+        for i in range(23)
+    ]
+    del items[12]["title"]
+    progress = []
+    report = await api.faq_bulk_update(
+        "robot", iter(items), chunk_size=5, concurrency=2, progress=lambda done, total: progress.append(done)
+    )
+    assert report["status_code"] == 1
+    assert (report["total"], report["succeeded"]) == (23, 18)
+    assert [(item["start"], item["end"]) for item in report["failed"]] == [(10, 15)]
+    assert sorted(progress)[-1] == 23
+
+    documents = engine.indexes[get_faq_master_robot_id("robot")].documents
+    assert len(documents) == 18 * 2
+    assert documents["id0_similar_0"]["question"] == "相似问题0"
+    assert documents["id0_similar_0"]["answer"] == documents["id0"]["answer"]
+
+    # 修正数据后从失败的位置重新导入
+    items[12]["title"] = "问题12"
+    report = await api.faq_bulk_update("robot", items, chunk_size=5, start=report["resume_from"])
+    assert report == {"total": 13, "succeeded": 13, "failed": [], "status_code": 0, "resume_from": None}
+    assert len(documents) == 23 * 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_circuit_open(engine, monkeypatch):
+    monkeypatch.setattr(api, "MASTER_ADDR", "")
+    request = api.faq_engine_request
+
+    async def faq_engine_request(name, request_data, **kwargs):
+        if request_data["documents"][0]["id"] == "id5":
+            raise CircuitOpenError("接口处于熔断状态")
+        return await request(name, request_data, **kwargs)
+
+    monkeypatch.setattr(api, "faq_engine_request", faq_engine_request)
+    items = [{"faq_id": "id{}".format(i), "title": "问题{}".format(i)} for i in range(12)]
+    report = await api.faq_bulk_update("robot", items, chunk_size=5, concurrency=2)
+    assert (report["succeeded"], report["resume_from"]) == (7, 5)
+    assert report["failed"] == [{"start": 5, "end": 10, "error": "CircuitOpenError: 接口处于熔断状态"}]
+
+
+@pytest.mark.asyncio
+async def test_ask(engine, monkeypatch):
+    monkeypatch.setattr(api, "MASTER_ADDR", "")
+    items = [
+        {"faq_id": "price", "title": "苹果手机多少钱", "similar_questions": ["iphone多少钱"], "answer": "5400元"},
+        {"faq_id": "color", "title": "苹果手机有哪些颜色", "answer": "黑色和白色"},
+        {"faq_id": "other", "title": "今天天气怎么样", "answer": "晴天", "perspective": "weather"},
+    ]
+    await api.faq_update("robot", items)
+
+    answer = await api.faq_ask("robot", "iPhone 多少钱")
+    assert (answer["faq_id"], answer["answer"], answer["confidence"]) == ("price", "5400元", 1.0)
+    answer = await api.faq_ask("robot", "苹果手机多少钱")
+    assert answer["faq_id"] == "price"
+    # 相似问题与原问题的答案相同，不会作为推荐问题
+    assert answer["recommendQuestions"] == ["苹果手机有哪些颜色"]
+
+    # 其他视角的问题不会被检索到
+    answer = await api.faq_ask("robot", "今天天气怎么样")
+    assert answer["faq_id"] == UNK
+    params = {"recommend_num": 5, "perspective": "weather", "dialogue_type": "text"}
+    assert (await api.faq_ask("robot", "今天天气怎么样", params))["faq_id"] == "other"
+
+    await api.faq_delete("robot", {"faq_ids": ["price"]})
+    assert (await api.faq_ask("robot", "iphone多少钱"))["faq_id"] == UNK
+
+    # 推送时复制语料，之后删除原机器人的语料不影响复制的语料
+    monkeypatch.setattr(api, "MASTER_ADDR", "127.0.0.1:1")
+    await api.faq_push(get_faq_test_robot_id("robot"))
+    await api.faq_delete_all("robot")
+    assert get_faq_test_robot_id("robot") not in engine.indexes
+    monkeypatch.setattr(api, "MASTER_ADDR", "")
+    assert (await api.faq_ask("robot", "苹果手机有哪些颜色"))["faq_id"] == "color"
+
+
+@pytest.mark.asyncio
+async def test_invalidate_cache_after_push(engine, monkeypatch):
+    monkeypatch.setattr(api, "answer_cache", AnswerCache())
+    monkeypatch.setattr(api, "MASTER_ADDR", "127.0.0.1:1")
+    await api.faq_update("robot", [{"faq_id": "price", "title": "苹果手机多少钱", "answer": "4999元"}])
+    monkeypatch.setattr(api, "MASTER_ADDR", "")
+    await api.faq_update("robot", [{"faq_id": "price", "title": "苹果手机多少钱", "answer": "5400元"}])
+    assert (await api.faq_ask("robot", "苹果手机多少钱"))["answer"] == "5400元"
+
+    # 测试环境推送时faq引擎直接复制语料，正式环境收到通知之前仍然命中缓存
+    engine.handle(
+        "copy", {"robot_code": get_faq_test_robot_id("robot"), "target_robot_code": get_faq_master_robot_id("robot")}
+    )
+    assert (await api.faq_ask("robot", "苹果手机多少钱"))["answer"] == "5400元"
+    assert (await api.faq_invalidate_cache("robot"))["status_code"] == 0
+    assert (await api.faq_ask("robot", "苹果手机多少钱"))["answer"] == "4999元"
+
+
+def test_ask_should_perspective(tmpdir):
+    engine = LocalFaqEngine(str(tmpdir))
+    documents = [
+        {"id": "q1", "question": "fix_questions", "answer": "1", "perspective": "lib1 q1 main_question"},
+        {"id": "q2", "question": "fix_questions", "answer": "2", "perspective": "lib1 q2 sub_question"},
+        {"id": "q3", "question": "fix_questions", "answer": "3", "perspective": "lib2 q3 main_question"},
+    ]
+    engine.handle("add_items", {"robot_code": "dynamic_db", "documents": documents})
+    request_data = {
+        "robot_code": "dynamic_db",
+        "question": "fix_questions",
+        "perspective": "lib1 main_question",
+        "should_perspective": "q1 q2 q3",
+        "recommend_num": -1,
+        "ans_threshold": 100,
+        "rcm_threshold": -100,
+    }
+    data = engine.handle("ask", request_data)["data"]
+    assert data["answer_type"] == FAQ_TYPE_NONUSWER
+    assert data["recommendAnswers"] == ["1"]
+
+    # 重启后从保存目录中恢复语料
+    engine = LocalFaqEngine(str(tmpdir))
+    assert engine.handle("ask", dict(request_data, perspective="main_question"))["data"]["recommendAnswers"] == [
+        "1",
+        "3",
+    ]
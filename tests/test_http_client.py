@@ -0,0 +1,153 @@
+import asyncio
+
+import aiohttp
+import pytest
+import pytest_asyncio
+import tornado.gen
+import tornado.web
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+from utils.exceptions import RpcException
+from utils.funcs import async_get_rpc, async_post_rpc
+from utils.http_client import CircuitOpenError, HttpClient, http_client, latency_budget
+
+
+class EchoHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.write({"text": self.get_argument("text")})
+
+    def post(self):
+        self.write(self.request.body)
+
+
+class SlowEchoHandler(tornado.web.RequestHandler):
+    async def post(self):
+        await tornado.gen.sleep(0.05)
+        self.write(self.request.body)
+
+
+class FirstSlowHandler(tornado.web.RequestHandler):
+    """第一次请求很慢，之后的请求立即返回."""
+
+    calls = 0
+
+    async def post(self):
+        FirstSlowHandler.calls += 1
+        if FirstSlowHandler.calls == 1:
+            await tornado.gen.sleep(1)
+        self.write(str(FirstSlowHandler.calls))
+
+
+@pytest_asyncio.fixture
+async def addr():
+    sock, port = bind_unused_port()
+    server = HTTPServer(tornado.web.Application([(r"/echo", EchoHandler), (r"/slow", SlowEchoHandler), (r"/first_slow", FirstSlowHandler)]))
+    server.add_sockets([sock])
+    yield "127.0.0.1:{}".format(port)
+    server.stop()
+    await http_client.close()
+
+
+@pytest.mark.asyncio
+async def test_connection_reused(addr):
+    url = "http://{}/echo".format(addr)
+    before = dict(http_client._get_stats("127.0.0.1"))
+    for i in range(5):
+        assert await async_post_rpc(url, {"i": i}) == {"i": i}
+    assert await async_get_rpc(url, {"text": "你好"}) == {"text": "你好"}
+
+    stats = http_client.pool_stats()["hosts"]["127.0.0.1"]
+    assert stats["requests"] - before["requests"] == 6
+    assert stats["connections_created"] - before["connections_created"] == 1
+    assert stats["connections_reused"] - before["connections_reused"] == 5
+    assert stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unreachable(addr):
+    errors = http_client._get_stats("127.0.0.1")["errors"]
+    with pytest.raises(RpcException):
+        await async_get_rpc("http://127.0.0.1:1/echo", {"text": ""})
+    assert http_client.pool_stats()["hosts"]["127.0.0.1"]["errors"] == errors + 1
+
+
+@pytest.mark.asyncio
+async def test_coalesce(addr):
+    url = "http://{}/slow".format(addr)
+    stats = http_client._get_stats("127.0.0.1")
+    requests, coalesced = stats["requests"], stats["coalesced"]
+    results = await asyncio.gather(
+        *(async_post_rpc(url, {"text": "喂", "n": 1}, coalesce=True) for _ in range(5)),
+        async_post_rpc(url, {"n": 1, "text": "喂"}, coalesce=True),
+        async_post_rpc(url, {"text": "你好"}, coalesce=True),
+        async_post_rpc(url, {"text": "喂", "n": 1}),
+    )
+    assert results == [{"text": "喂", "n": 1}] * 6 + [{"text": "你好"}, {"text": "喂", "n": 1}]
+    # 每个调用者得到的是独立的对象
+    assert results[0] is not results[1]
+    assert stats["requests"] - requests == 3
+    assert stats["coalesced"] - coalesced == 5
+    assert not http_client.inflight
+
+
+@pytest.mark.asyncio
+async def test_coalesce_cancel(addr):
+    url = "http://{}/slow".format(addr)
+    first = asyncio.ensure_future(async_post_rpc(url, {"text": "喂"}, coalesce=True))
+    second = asyncio.ensure_future(async_post_rpc(url, {"text": "喂"}, coalesce=True))
+    await asyncio.sleep(0.01)
+    # 第一个调用者超时被取消，不影响合并到同一个请求的其他调用者
+    first.cancel()
+    assert await second == {"text": "喂"}
+
+
+def test_endpoint_timeout():
+    client = HttpClient(timeouts={"127.0.0.1:8080": 5, "127.0.0.1:8080/robot_manager/single/ask": 1})
+    assert client.get_timeout("http://127.0.0.1:8080/robot_manager/single/ask", 10) == 1
+    assert client.get_timeout("http://127.0.0.1:8080/xiaoyu/rpc/sentiment?text=1", 3) == 5
+    assert client.get_timeout("http://127.0.0.1:9090/robot_manager/single/ask", 10) == 10
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker():
+    client = HttpClient(breaker_failures=2, breaker_recovery_time=60)
+    url = "http://127.0.0.1:1/echo"
+    for _ in range(2):
+        with pytest.raises(aiohttp.ClientError):
+            await client.request("GET", url)
+    # 熔断后直接失败，不再请求
+    with pytest.raises(CircuitOpenError):
+        await client.request("GET", url)
+    stats = client.endpoint_stats()["127.0.0.1:1/echo"]
+    assert stats["state"] == "open" and stats["opened"] == 1 and stats["rejected"] == 1
+    assert client.pool_stats()["hosts"]["127.0.0.1"]["requests"] == 2
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_hedge(addr):
+    client = HttpClient(hedge_percentile=95, hedge_min_samples=3)
+    url = "http://{}/first_slow".format(addr)
+    FirstSlowHandler.calls = 0
+    for _ in range(3):
+        client._get_endpoint(url)[1].record(0.01)
+    # 第一个请求超过p95耗时后发送对冲请求，使用先返回的对冲请求的结果
+    assert await asyncio.wait_for(client.request("POST", url, hedge=True), 0.5) == "2"
+    stats = client.endpoint_stats()["{}/first_slow".format(addr)]
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_latency_budget(addr):
+    url = "http://{}/slow".format(addr)
+    with latency_budget(0.01):
+        with pytest.raises(RpcException):
+            await async_post_rpc(url, {})
+        await asyncio.sleep(0.01)
+        # 预算用完后直接超时
+        with pytest.raises(RpcException):
+            await async_post_rpc("http://{}/echo".format(addr), {})
+    # 被预算截断的超时不计入熔断器的失败次数
+    assert http_client.endpoint_stats()["{}/slow".format(addr)]["failures"] == 0
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.jobs import JobManager
+from utils.exceptions import JobNotFoundException
+
+
+@pytest.mark.asyncio
+async def test_job_dedup():
+    job_manager = JobManager(max_workers=2, max_finished=1)
+    release = threading.Event()
+
+    def work(value):
+        release.wait(5)
+        return value * 2
+
+    job = job_manager.submit("double", "double:a", work, 1)
+    # 同一个key的任务没有结束时返回正在进行的任务
+    assert job_manager.submit("double", "double:a", work, 2) is job
+    other = job_manager.submit("double", "double:b", work, 3)
+    assert other is not job
+    assert job_manager.active_jobs() == 2
+
+    release.set()
+    while job_manager.active_jobs():
+        await asyncio.sleep(0.01)
+
+    assert other.to_dict()["status"] == "succeeded"
+    assert other.result == 6
+    assert other.to_dict()["run_seconds"] >= 0
+    # 只保留最近提交的一个已结束的任务
+    assert job_manager.get(other.job_id) is other
+    with pytest.raises(JobNotFoundException):
+        job_manager.get(job.job_id)
+
+    # 任务结束后可以重新提交
+    assert job_manager.submit("double", "double:a", work, 4) is not job
+
+
+@pytest.mark.asyncio
+async def test_job_failed():
+    job_manager = JobManager()
+
+    def work():
+        raise ValueError("boom")
+
+    job = job_manager.submit("fail", "fail", work)
+    while job_manager.active_jobs():
+        await asyncio.sleep(0.01)
+    result = job_manager.get(job.job_id).to_dict()
+    assert result["status"] == "failed"
+    assert "boom" in result["error"]
@@ -1,6 +1,9 @@
+import asyncio
+
 import pytest
 
 import backend.manager as manager
+from utils.exceptions import RpcException
 
 
 @pytest.fixture(scope="module", autouse=True)
@@ -59,3 +62,45 @@ async def test_sensitive_words(robot_code, text, labels, strict, masked_text, wo
         assert word["word"] == hyp_word["word"]
         assert word["start"] == hyp_word["start"]
         assert word["end"] == hyp_word["end"]
+
+
+@pytest.mark.asyncio
+async def test_sentiment_deadline(monkeypatch):
+    async def slow_sentiment(text, key):
+        await asyncio.sleep(10)
+        return 0.9
+
+    monkeypatch.setattr(manager, "SENTIMENT_SERVER_URL", "127.0.0.1:1")
+    monkeypatch.setattr(manager, "SENTIMENT_TIMEOUT", 0.01)
+    monkeypatch.setattr(manager, "_get_sentiment", slow_sentiment)
+    assert await manager.sentiment_analyze("你好") == -1
+
+
+@pytest.mark.asyncio
+async def test_sentiment_error(monkeypatch):
+    async def broken_sentiment(text, key):
+        raise RpcException("http://127.0.0.1:1/xiaoyu/rpc/sentiment", {"text": text}, "服务熔断中")
+
+    monkeypatch.setattr(manager, "SENTIMENT_SERVER_URL", "127.0.0.1:1")
+    monkeypatch.setattr(manager, "_get_sentiment", broken_sentiment)
+    assert await manager.sentiment_analyze("你好") == -1
+    assert await manager._analyze_sentiment("你好") == -1
+
+
+@pytest.mark.asyncio
+async def test_analyze_sentiments_concurrency(monkeypatch):
+    running = []
+    max_running = []
+
+    async def sentiment(text, key):
+        running.append(text)
+        max_running.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(text)
+        return len(text)
+
+    monkeypatch.setattr(manager, "SENTIMENT_BATCH_CONCURRENCY", 2)
+    monkeypatch.setattr(manager, "_get_sentiment", sentiment)
+    texts = ["你" * i for i in range(1, 11)]
+    assert await manager._analyze_sentiments(texts) == list(range(1, 11))
+    assert max(max_running) == 2
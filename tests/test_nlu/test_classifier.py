@@ -0,0 +1,16 @@
+from backend.nlu.classifier import IntentClassifier
+
+
+def test_intent_classifier():
+    classifier = IntentClassifier(
+        {"weather": ["今天天气怎么样", "明天会下雨吗"], "music": ["放一首歌", "播放音乐"], "empty": []}, topn=2
+    )
+    topn_score = classifier.classify("后天会下雨吗", ["weather", "music", "empty", "unknown"])
+    assert list(topn_score) == ["weather", "music"]
+    assert topn_score["weather"][0] > 0.5
+    assert topn_score["weather"] == sorted(topn_score["weather"], reverse=True)
+    assert topn_score["music"] == [0, 0]
+
+    meta, arrays = classifier.dump()
+    loaded = IntentClassifier.load(meta, {name: values for name, (typecode, values) in arrays.items()})
+    assert loaded.classify("后天会下雨吗", ["weather", "music"]) == topn_score
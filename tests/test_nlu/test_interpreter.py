@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+import backend.nlu.interpreter as interpreter_module
+from backend.nlu.interpreter import CustormInterpreter
+
+RAW_TRAINING_DATA = {
+    "regex_features": {"number": ["\\d+"]},
+    "key_words": {"city": ["广州", "深圳"]},
+    "intent_rules": {"deny": [{"regx": "不是", "strict": False}]},
+    "rasa_nlu_data": {
+        "common_examples": [
+            {"intent": "confirm", "text": "是的"},
+            {"intent": "confirm", "text": "对"},
+            {"intent": "deny", "text": "不对"},
+        ]
+    },
+}
+
+
+@pytest.fixture
+def interpreter(tmpdir):
+    nlu_data_path = str(tmpdir.join("raw_training_data.json"))
+    with open(nlu_data_path, "w") as f:
+        json.dump(RAW_TRAINING_DATA, f, ensure_ascii=False)
+    return CustormInterpreter("pytest_robot_code", "v1", _nlu_data_path=nlu_data_path)
+
+
+@pytest.mark.asyncio
+async def test_parse_cache(interpreter):
+    msg = await interpreter.parse("是的，广州123")
+    cached = await interpreter.parse("是的，广州123")
+    assert cached is not msg
+    assert cached.to_dict() == msg.to_dict()
+    assert interpreter.cache_info()["hits"] == 1
+
+    # 修改缓存返回的消息不影响后续的解析结果
+    cached.entities["city"].append("深圳")
+    assert (await interpreter.parse("是的，广州123")).entities["city"] == ["广州"]
+
+    # 空白字符不同的文本解析结果不同，不能命中同一条缓存
+    assert "city" not in (await interpreter.parse("是的，广 州123")).entities
+    assert interpreter.cache_info()["hits"] == 2
+
+    interpreter.clear_cache()
+    assert interpreter.cache_info()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_parse_batch(interpreter):
+    texts = ["不是", "是的", "不是"]
+    msgs = await interpreter.parse_batch(texts)
+    assert [msg.text for msg in msgs] == texts
+    for msg in msgs:
+        assert msg.to_dict() == (await interpreter.parse(msg.text)).to_dict()
+
+
+@pytest.mark.asyncio
+async def test_faq_prefetch(interpreter, monkeypatch):
+    questions = []
+
+    async def faq_ask(robot_code, text):
+        questions.append(text)
+        return {"faq_id": "faq1", "answer": "你好，有什么可以帮您"}
+
+    monkeypatch.setattr(interpreter_module, "faq_ask", faq_ask)
+    msg = await interpreter.parse("你好")
+    msg.prefetch_faq()
+    await msg.perform_faq()
+    assert msg.get_faq_answer() == "你好，有什么可以帮您"
+    assert questions == ["你好"]
+
+    # 对话流程没有用到faq时取消预取
+    msg = await interpreter.parse("你好")
+    msg.prefetch_faq()
+    msg.cancel_faq_prefetch()
+    assert msg.faq_task is None and msg.faq_result is None
+
+
+@pytest.mark.asyncio
+async def test_lazy_message_containers(interpreter):
+    msg = await interpreter.parse("不是")
+    assert msg._key_words is None and msg._options is None and msg._traceback_data is None
+    assert msg.is_traceback_empty
+    # 意图id与语义理解器中的key是同一个对象
+    assert msg.intent == "deny" and msg.intent is next(key for key in interpreter.intent if key == "deny")
+
+    msg.options.append("选项")
+    copied = msg.copy()
+    copied.options.append("另一个选项")
+    assert msg.options == ["选项"]
+    assert copied._key_words is None
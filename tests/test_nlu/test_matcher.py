@@ -0,0 +1,99 @@
+import re
+
+from backend.nlu.compiled import get_compiled_path, load_compiled, save_compiled
+from backend.nlu.matcher import AhoCorasick, IntentRuleMatcher, KeywordMatcher, NgramIndex
+
+
+def test_aho_corasick():
+    automaton = AhoCorasick()
+    for word in ["he", "she", "his", "hers"]:
+        automaton.add_word(word)
+    automaton.build()
+    matches = sorted((end, automaton.words[index]) for end, index in automaton.iter("ushers"))
+    assert matches == [(4, "he"), (4, "she"), (6, "hers")]
+
+
+def test_intent_rule_matcher():
+    intent_rules = {
+        "confirm": [{"regx": re.escape("是的"), "strict": False}, {"regx": "^对+$", "strict": False}],
+        "deny": [{"regx": "不是", "strict": False}, {"regx": "不(对|行)", "strict": False}],
+    }
+    matcher = IntentRuleMatcher(intent_rules)
+    assert list(matcher.match("对对对")) == ["confirm"]
+    assert list(matcher.match("不是的")) == ["confirm", "deny"]
+    assert matcher.match("不行")["deny"] is intent_rules["deny"][1]
+    assert matcher.match("你好") == {}
+
+
+def test_intent_rule_matcher_examples():
+    intent_rules = {"deny": [{"regx": "不(对|行)", "strict": False}]}
+    matcher = IntentRuleMatcher(intent_rules, {"confirm": ["是的", "对"], "deny": ["不要"]})
+    assert list(matcher.match("是的不要")) == ["deny", "confirm"]
+    assert matcher.match("不要")["deny"] == {"regx": re.escape("不要"), "strict": False}
+    assert matcher.match("不对")["deny"] is intent_rules["deny"][0]
+    assert matcher.match("对") == {}
+
+
+def test_ngram_index():
+    index = NgramIndex({"confirm": ["是的", "是的呢", "对的"], "deny": ["不是的"]}, N=2, threshold=0.2)
+    ranking = index.search("是的")
+    assert list(ranking) == ["confirm", "deny"]
+    # "是的" 与例句 "是的" 的相似度为1，noisy-or 合并后置信度为1
+    assert ranking["confirm"] == 1
+    assert 0.2 <= ranking["deny"] < 1
+    assert index.search("你好") == {}
+
+
+def test_keyword_matcher():
+    matcher = KeywordMatcher({"city": ["广州", "广州市", "深圳"], "district": ["天河"]})
+    entities, spans = matcher.search("深圳到广州市天河区")
+    assert entities == {"city": ["广州", "广州市", "深圳"], "district": ["天河"]}
+    assert [(item["value"], item["start"], item["end"]) for item in spans["city"]] == [
+        ("深圳", 0, 2),
+        ("广州", 3, 5),
+        ("广州市", 3, 6),
+    ]
+    assert matcher.search("你好") == ({}, {})
+
+
+def test_compiled_round_trip(tmpdir):
+    index = NgramIndex({"confirm": ["是的", "对的"], "deny": ["不是的"]})
+    matcher = KeywordMatcher({"city": ["广州", "深圳"]})
+    intent_rules = {"deny": [{"regx": "不(对|行)", "strict": False}]}
+    rule_matcher = IntentRuleMatcher(intent_rules, {"confirm": ["是的"], "deny": ["不要"]})
+    meta = {}
+    arrays = {}
+    for name, item in [("ngram", index), ("key_words", matcher), ("rules", rule_matcher)]:
+        meta[name], item_arrays = item.dump()
+        arrays.update({name + "." + key: value for key, value in item_arrays.items()})
+    path = get_compiled_path(str(tmpdir.join("raw_training_data.json")), b"{}")
+    save_compiled(path, meta, arrays)
+
+    meta, arrays = load_compiled(path)
+    loaded_index = NgramIndex.load(meta["ngram"], {key[6:]: value for key, value in arrays.items() if key.startswith("ngram.")})
+    loaded_matcher = KeywordMatcher.load(
+        meta["key_words"], {key[10:]: value for key, value in arrays.items() if key.startswith("key_words.")}
+    )
+    loaded_rule_matcher = IntentRuleMatcher.load(
+        meta["rules"], {key[6:]: value for key, value in arrays.items() if key.startswith("rules.")}, intent_rules
+    )
+    assert loaded_index.search("是的") == index.search("是的")
+    assert loaded_index.search("你好") == {}
+    assert loaded_matcher.search("深圳到广州") == matcher.search("深圳到广州")
+    for text in ["是的不要", "不行", "你好"]:
+        assert loaded_rule_matcher.match(text) == rule_matcher.match(text)
+    assert load_compiled(str(tmpdir.join("missing.bin"))) == (None, None)
+
+
+def test_load_truncated_compiled(tmpdir):
+    meta, arrays = NgramIndex({"confirm": ["是的", "对的"], "deny": ["不是的"]}).dump()
+    path = get_compiled_path(str(tmpdir.join("raw_training_data.json")), b"{}")
+    save_compiled(path, meta, arrays)
+    with open(path, "rb") as f:
+        content = f.read()
+
+    # 写入中断时文件可能只有一部分，读取时返回None，由调用方重新编译
+    for size in [0, 4, 20, len(content) // 2, len(content) - 1]:
+        with open(path, "wb") as f:
+            f.write(content[:size])
+        assert load_compiled(path) == (None, None)
@@ -0,0 +1,19 @@
+import dimsim
+
+from backend.nlu.phonetic import PhoneticIndex, to_syllables
+
+
+def test_phonetic_index():
+    intent_examples = {"bank": ["银行", "去银行"], "music": ["放歌", "play"], "number": ["123"]}
+    index = PhoneticIndex(intent_examples)
+    # 不能转换为拼音的例句在构建时跳过
+    assert index.num_skipped == 2
+    assert to_syllables("play") is None
+
+    intent_indexes, distances = index.distances("放个")
+    for intent_index, distance, example in zip(intent_indexes, distances, ["银行", "放歌"]):
+        assert index.intents[intent_index] in intent_examples
+        assert distance == dimsim.get_distance(example, "放个")
+    assert index.match("放个", ["bank", "music"]) == ["music"]
+    assert index.match("放个", ["bank"]) == []
+    assert index.match("hi", ["bank"]) == []
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from backend.dialogue.cursor import NodeCursor
+from backend.dialogue.nodes.fill_slots import FillSlotsNode
+from backend.nlu.interpreter import Message
+from utils.define import UNK
+
+
+class EmptyClassifier(object):
+    """没有任何意图的本地意图分类器"""
+
+    def classify(self, text, intent_group):
+        return {}
+
+
+def make_msg(context, text, entities):
+    raw_msg = {
+        "text": text,
+        "intent": "",
+        "entities": [{"entity": key, "value": value} for key, value in entities.items()],
+    }
+    msg = Message(raw_msg, context.robot_code, intent_classifier=EmptyClassifier())
+    msg.intent = UNK
+    return msg
+
+
+@pytest.mark.asyncio
+async def test_resume_from_saved_cursor(context):
+    """追问槽位之后，游标经过序列化再恢复，可以用下一条消息继续填槽"""
+    node = FillSlotsNode(
+        {
+            "node_id": "fill_city",
+            "node_name": "询问城市",
+            "node_type": "填槽节点",
+            "slots": [
+                {
+                    "slot_name": "city",
+                    "multi": False,
+                    "rounds": 1,
+                    "reask_words": ["请问您在哪个城市"],
+                    "callback_words": [],
+                    "is_necessary": True,
+                }
+            ],
+        }
+    )
+    context.agent.slots_abilities["city"] = "@city"
+    context.slots["city"] = ""
+
+    msg = make_msg(context, "你好", {})
+    context.msg_recorder.append(msg)
+    cursor = node.cursor()
+    assert await node.run(context, cursor) == "请问您在哪个城市"
+
+    cursor = NodeCursor.from_list(json.loads(json.dumps(cursor.to_list())))
+    assert cursor.locals == {"cur": 0, "repeat_times": 0}
+
+    next_msg = make_msg(context, "广州", {"@city": "广州"})
+    next_msg.add_traceback_data(msg.get_latest_node_data())
+    context.msg_recorder.append(next_msg)
+    # 填槽节点没有子节点，填完槽位后结束流程
+    assert await node.run(context, cursor) is None
+    assert context.slots["city"] == "广州"
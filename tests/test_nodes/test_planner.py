@@ -0,0 +1,27 @@
+from backend.dialogue.nodes.builtin import builtin_regx
+from backend.dialogue.nodes.builtin.planner import (AbilityPlanner,
+                                                    extract_ability,
+                                                    process_builtin_intent)
+
+
+def test_ability_planner():
+    planner = AbilityPlanner(["@sys.phone", "@sys.plates", "自定义能力"])
+    assert planner.abilities == ["@sys.phone", "@sys.plates"]
+    # 两个识别能力共用同一个抽取函数
+    assert planner.extractors == [builtin_regx]
+
+
+def test_extract_ability_once_per_message(msg):
+    msg.text = "我的电话是13800138000"
+    list(extract_ability(msg, "@sys.phone"))
+    list(extract_ability(msg, "@sys.plates"))
+    assert msg.entities["@sys.phone"] == ["13800138000"]
+
+
+def test_builtin_intent_once_per_message(msg):
+    msg.text = "不对"
+    assert process_builtin_intent(msg, "@sys.intent.confirm") == "@sys.intent.deny"
+    msg.intent_ranking.pop("@sys.intent.deny")
+    assert process_builtin_intent(msg, "@sys.intent.deny") == "@sys.intent.deny"
+    assert msg.intent_ranking["@sys.intent.deny"] == 1
+    assert len(msg.builtin_results) == 1
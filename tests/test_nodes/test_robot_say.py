@@ -1,5 +1,6 @@
 import pytest
 
+from backend.dialogue.context import FAQ_FLAG
 from backend.dialogue.nodes.say import RobotSayNode
 from utils.exceptions import DialogueStaticCheckException
 
@@ -79,16 +80,12 @@ async def test_base(context, msg, config_base):
     await msg.perform_faq()
 
     # 应当首先返回回复内容，再返回`life_cycle`次拉回话术
-    expected = (
-        config_base["content"]
-        + config_base["callback_words"] * config_base["life_cycle"]
-    )
-    expected.append(node)
-
-    i = 0
-    async for reply in node(context):
-        assert reply == expected[i]
-        i += 1
+    cursor = node.cursor()
+    assert await node.run(context, cursor) == config_base["content"][0]
+    for _ in range(config_base["life_cycle"]):
+        assert await node.run(context, cursor) == FAQ_FLAG
+        assert msg.callback_words == config_base["callback_words"][0]
+    assert await node.run(context, cursor) is node
 
 
 def test_with_intent(context, config_intent):
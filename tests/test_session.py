@@ -0,0 +1,127 @@
+import time
+
+import pytest
+
+from backend.dialogue import session
+from backend.dialogue.context import MessageRecorder, TurnRecord
+from backend.dialogue.session import (LocalRedisClient, MemorySessionStore,
+                                      RedisSessionStore)
+from utils.exceptions import SessionConflictException
+
+
+def test_session_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    store = MemorySessionStore(expired_time=10)
+    store["a"] = "tracker_a"
+    now[0] += 5
+    store["b"] = "tracker_b"
+    now[0] += 4
+    # 收到新消息后重新计算过期时间
+    store.touch("a")
+    now[0] += 7
+
+    assert store.sweep() == 1
+    assert "b" not in store
+    assert store["a"] == "tracker_a"
+    assert store.stats() == {"sessions": 1, "evicted": 1}
+
+    # 没有清理的过期会话在访问时删除
+    now[0] += 11
+    assert store.get("a") is None
+    assert store.stats() == {"sessions": 0, "evicted": 2}
+    assert store.sweep() == 0
+
+
+class FakeTracker(object):
+    def __init__(self, user_id, turns=0):
+        self.user_id = user_id
+        self.turns = turns
+        self.version = 0
+
+    def dump_state(self):
+        return {"user_id": self.user_id, "turns": self.turns}
+
+
+def restore(state):
+    return FakeTracker(state["user_id"], state["turns"])
+
+
+@pytest.mark.asyncio
+async def test_redis_session_store(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    client = LocalRedisClient()
+    # 两个服务进程共享同一个Redis
+    worker_a = RedisSessionStore("robot", client, "session:robot:", 10, restore)
+    worker_b = RedisSessionStore("robot", client, "session:robot:", 10, restore)
+
+    assert await worker_a.load("s1") is None
+    tracker = FakeTracker("s1", turns=1)
+    await worker_a.save(tracker)
+    assert tracker.version == 1
+    # 版本号没有变化时使用本地缓存的会话对象
+    assert await worker_a.load("s1") is tracker
+
+    # 另一个服务进程从序列化的状态恢复会话
+    tracker_b = await worker_b.load("s1")
+    assert tracker_b is not tracker
+    assert (tracker_b.turns, tracker_b.version) == (1, 1)
+    tracker_b.turns = 2
+    await worker_b.save(tracker_b)
+
+    # 基于旧版本的修改不能覆盖其他进程保存的状态
+    tracker.turns = 5
+    with pytest.raises(SessionConflictException):
+        await worker_a.save(tracker)
+    assert worker_a.stats()["conflicts"] == 1
+    tracker = await worker_a.load("s1")
+    assert (tracker.turns, tracker.version) == (2, 2)
+
+    # 清空会话后所有服务进程都读取不到旧的会话
+    await worker_b.save(FakeTracker("s2"))
+    await worker_a.clear()
+    assert await worker_b.load("s1") is None
+    assert await worker_b.load("s2") is None
+
+    # 过期由存储管理，从最后一次保存开始计算
+    await worker_a.save(FakeTracker("s1"))
+    now[0] += 11
+    assert await worker_a.load("s1") is None
+
+
+class FakeMessage(object):
+    def __init__(self, text, intent, faq_id=None):
+        self.text = text
+        self.intent = intent
+        self.faq_id = faq_id
+
+    def get_faq_id(self):
+        return self.faq_id
+
+
+def test_message_recorder():
+    recorder = MessageRecorder(depth=2)
+    messages = [FakeMessage("第{}句话".format(i) + "很长" * 20, "intent_{}".format(i)) for i in range(1, 5)]
+    for msg in messages:
+        recorder.append(msg)
+
+    # 只保留最近一条完整的消息，更早的消息只保留最近depth条精简记录
+    assert len(recorder) == 4
+    assert recorder.latest is messages[-1]
+    assert [record.turn for record in recorder.records] == [2, 3]
+    assert recorder.records[-1] == TurnRecord(3, "intent_3", None, messages[2].text[:32])
+
+
+class SizedTracker(FakeTracker):
+    def memory_size(self):
+        return 100 * self.turns
+
+
+def test_memory_stats_sampling(monkeypatch):
+    monkeypatch.setattr(session, "MEMORY_SAMPLE_SIZE", 2)
+    store = MemorySessionStore(expired_time=10)
+    for turns in (9, 1, 2):
+        store[str(turns)] = SizedTracker(str(turns), turns)
+    # 只计算最近活跃的两个会话
+    assert store.memory_stats() == {"memory_bytes": 450, "max_session_bytes": 200}
@@ -0,0 +1,102 @@
+"""
+对外接口的熔断器和耗时统计
+
+每个接口（host:port/path）有一个熔断器：连续失败达到阈值后熔断，熔断期间的调用直接失败，不再等待超时；
+经过恢复时间后进入半开状态，放行一个探测请求，探测成功则恢复，失败则重新熔断。
+"""
+import math
+import time
+from collections import deque
+
+__all__ = ["CircuitBreaker", "CircuitOpenError", "LatencyRecorder"]
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """接口处于熔断状态，调用被拒绝."""
+
+
+class CircuitBreaker(object):
+    """熔断器.
+
+    Attributes:
+        failure_threshold (int): 连续失败多少次后熔断，0为不熔断
+        recovery_time (float): 熔断后经过多少秒进入半开状态
+        state (str): closed 正常，open 熔断，half_open 半开
+        failures (int): 当前连续失败次数
+        opened (int): 累计熔断次数
+        rejected (int): 熔断期间被拒绝的调用次数
+    """
+
+    def __init__(self, failure_threshold=5, recovery_time=10):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0
+        self._probing = False
+
+    def before_call(self):
+        """调用之前检查熔断状态，熔断时抛出CircuitOpenError."""
+        if self.state == STATE_OPEN and time.monotonic() - self._opened_at >= self.recovery_time:
+            self.state = STATE_HALF_OPEN
+        if self.state == STATE_OPEN or (self.state == STATE_HALF_OPEN and self._probing):
+            self.rejected += 1
+            raise CircuitOpenError()
+        if self.state == STATE_HALF_OPEN:
+            self._probing = True
+
+    def on_success(self):
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def on_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == STATE_HALF_OPEN or (
+            self.failure_threshold > 0 and self.failures >= self.failure_threshold
+        ):
+            if self.state != STATE_OPEN:
+                self.opened += 1
+            self.state = STATE_OPEN
+            self._opened_at = time.monotonic()
+
+    def on_cancel(self):
+        """调用被调用者取消，既不算成功也不算失败."""
+        self._probing = False
+
+
+class LatencyRecorder(object):
+    """记录最近若干次调用的耗时，用于计算分位数.
+
+    Attributes:
+        samples (collections.deque): 最近的耗时（秒）
+    """
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, percent):
+        """耗时的分位数，没有样本时返回None.
+
+        Args:
+            percent (float): 0到100之间的百分数
+
+        Returns:
+            float: 分位数（秒）
+        """
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        # nearest-rank 方法
+        index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+        return ordered[min(index, len(ordered) - 1)]
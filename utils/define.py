@@ -54,6 +54,12 @@ FAQ_DEFAULT_PERSPECTIVE = "default_perspective"
 FAQ_TYPE_NONUSWER = -1  # 没有找到对应的答案
 FAQ_TYPE_MULTIANSWER = 1  # 匹配的答案有多种，需要澄清
 FAQ_TYPE_SINGLEANSWER = 0  # 匹配到了对应的答案，可以直接回答用户
+# faq引擎意图分类接口的状态码
+FAQ_INTENT_GROUP_NOT_FOUND = 404  # 意图组没有注册或者已经失效，需要重新注册
+# faq预取策略，收到用户消息时提前请求faq，与对话流程同时进行
+FAQ_PREFETCH_OFF = ""  # 不预取
+FAQ_PREFETCH_FAQ = "faq"  # 只预取faq
+FAQ_PREFETCH_CHITCHAT = "faq_chitchat"  # 预取faq，faq没有答案时继续预取闲聊
 
 # nlu相关
 NLU_MODEL_USING = "1001"  # 模型正在使用
@@ -238,3 +238,52 @@ class MethodNotAllowException(XiaoYuBaseException):
 
     def err_msg(self):
         return "不存在该方法（method）{}，允许的方法有{}".format(self.method, self.allowed)
+
+
+class JobNotFoundException(XiaoYuBaseException):
+    """查询后台任务状态时，任务id不存在或者任务记录已经被清理"""
+
+    ERR_CODE = 0x00A
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def err_msg(self):
+        return "后台任务{}不存在或者已经过期".format(self.job_id)
+
+
+class SessionConflictException(XiaoYuBaseException):
+    """会话在读取之后被其他服务进程修改，本轮对话的结果没有保存
+
+    Attributes:
+        robot_code (str): 机器人唯一标识
+        conversation_id (str): 会话唯一标识
+    """
+
+    ERR_CODE = 0x00B
+
+    def __init__(self, robot_code, conversation_id):
+        self.robot_code = robot_code
+        self.conversation_id = conversation_id
+
+    def err_msg(self):
+        msg = "会话同时收到了多条消息，请重新发送本条消息\n"
+        msg += "robot_code: {}\n".format(self.robot_code)
+        msg += "conversation_id: {}\n".format(self.conversation_id)
+        return msg
+
+
+class BundleCorruptedException(XiaoYuBaseException):
+    """推送的模型包无法解码，或者内容与manifest中的hash值不一致，模型包没有被应用
+
+    Attributes:
+        reason (str): 校验失败的原因
+    """
+
+    ERR_CODE = 0x00C
+
+    def __init__(self, reason):
+        self.reason = reason
+
+    def err_msg(self):
+        return "模型包校验失败，请重新推送\nreason: {}\n".format(self.reason)
@@ -1,9 +1,12 @@
 """
 项目帮助函数
 """
+import asyncio
 import json
+import sys
 import time
 import uuid
+from collections import deque
 from hashlib import blake2b
 
 import aiohttp
@@ -11,6 +14,7 @@ import requests
 from strsimpy.levenshtein import Levenshtein
 
 from utils.exceptions import RpcException
+from utils.http_client import CircuitOpenError, http_client
 
 __all__ = ["hash_string", "get_time_stamp", "post_rpc", "generate_uuid"]
 
@@ -59,6 +63,29 @@ def hash_string(content, size=20):
     return h.hexdigest()
 
 
+def deep_getsizeof(obj, seen=None):
+    """估算对象及其包含的容器、字符串等占用的内存字节数，同一个对象只计算一次
+
+    Args:
+        obj (object): dict、list、tuple、set、deque或者str、数字等基本类型的对象
+        seen (set): 已经计算过的对象id
+
+    Return:
+        int: 内存字节数
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_getsizeof(key, seen) + deep_getsizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_getsizeof(item, seen) for item in obj)
+    return size
+
+
 def get_time_stamp():
     """
     获取当前时间的时间戳
@@ -112,54 +139,61 @@ def get_rpc(url, params, **kwargs):
 
 
 async def async_post_rpc(
-    url, data=None, data_type="json", return_type="dict", **kwargs
+    url, data=None, data_type="json", return_type="dict", coalesce=False, hedge=False, **kwargs
 ):
     """
     给定url和调用参数，通过http post请求进行rpc调用。
-    post_rpc函数的异步版本
+    post_rpc函数的异步版本，使用进程内共享的连接池
 
     Args:
         url (str): 调用请求的url地址
         data (str): 调用接口的
         data_type (str, optional): json 或者 params
         return_type (str): dict 或者 text
+        coalesce (bool): 是否与正在进行的相同请求合并，只用于没有副作用的查询接口，参见utils.http_client
+        hedge (bool): 请求较慢时是否发送对冲请求，只用于没有副作用的查询接口，参见utils.http_client
     """
     try:
-        async with aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=10)
-        ) as session:
-            if data_type == "json":
-                response = await session.post(url, json=data, **kwargs)
-            else:
-                response = await session.post(url, data=data, **kwargs)
-            text = await response.text()
-            if return_type == "dict":
-                response_data = json.loads(await response.text())
-            else:
-                response_data = text
-
-    except aiohttp.ClientError:
+        if data_type == "json":
+            text = await http_client.request(
+                "POST", url, timeout=10, coalesce=coalesce, hedge=hedge, json=data, **kwargs
+            )
+        else:
+            text = await http_client.request(
+                "POST", url, timeout=10, coalesce=coalesce, hedge=hedge, data=data, **kwargs
+            )
+        if return_type == "dict":
+            response_data = json.loads(text)
+        else:
+            response_data = text
+
+    except CircuitOpenError:
+        raise RpcException(url, data, "服务熔断中")
+    except (aiohttp.ClientError, asyncio.TimeoutError):
         raise RpcException(url, data, "服务请求超时")
     except json.JSONDecodeError:
-        raise RpcException(url, data, response.text())
+        raise RpcException(url, data, text)
 
     return response_data
 
 
-async def async_get_rpc(url, params, **kwargs):
-    """给定url和调用参数，通过http get请求进行rpc调用。
+async def async_get_rpc(url, params, coalesce=False, hedge=False, **kwargs):
+    """给定url和调用参数，通过http get请求进行rpc调用，使用进程内共享的连接池。
 
     Args:
         url (str): 调用请求的url地址
         params (str): 调用接口的
+        coalesce (bool): 是否与正在进行的相同请求合并，参见async_post_rpc
+        hedge (bool): 请求较慢时是否发送对冲请求，参见async_post_rpc
     """
     try:
-        async with aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=3)
-        ) as session:
-            response = await session.get(url, params=params, **kwargs)
-            response_data = json.loads(await response.text())
-    except aiohttp.ClientError:
+        text = await http_client.request(
+            "GET", url, timeout=3, coalesce=coalesce, hedge=hedge, params=params, **kwargs
+        )
+        response_data = json.loads(text)
+    except CircuitOpenError:
+        raise RpcException(url, params, "服务熔断中")
+    except (aiohttp.ClientError, asyncio.TimeoutError):
         raise RpcException(url, params, "服务请求超时")
     except json.JSONDecodeError:
         raise RpcException(url, params, "服务返回值json解析失败")
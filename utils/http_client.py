@@ -0,0 +1,353 @@
+"""
+进程内共享的http客户端
+
+所有对外的异步rpc调用（faq引擎、情感分析、闲聊、rpc节点等）共用同一个 aiohttp.ClientSession，
+按照 host 复用keep-alive连接，并缓存dns解析结果，避免每次调用都重新建立tcp连接。
+session 与创建它的事件循环绑定，服务退出时通过 close 关闭。
+
+调用时指定 coalesce=True 可以合并相同的并发请求：url和请求参数完全相同的请求正在进行时，
+后来的请求不再发送，而是等待正在进行的请求并共享其返回内容。只应该对没有副作用的查询类接口使用。
+
+每个接口（host:port/path）有一个熔断器，参见 utils.circuit_breaker。指定 hedge=True 时，
+请求耗时超过该接口最近耗时的分位数后再发送一个相同的请求，使用先返回的结果，同样只用于查询类接口。
+通过 latency_budget 可以为一次处理（如一轮对话）中的所有请求设置总的耗时预算，
+其中创建的异步任务也会继承这个预算。
+"""
+import asyncio
+import contextlib
+import contextvars
+import json
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from config import global_config
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError, LatencyRecorder
+
+__all__ = ["HttpClient", "http_client", "latency_budget", "CircuitOpenError"]
+
+# 当前处理的截止时间（time.monotonic），None为没有耗时预算
+_deadline = contextvars.ContextVar("rpc_deadline", default=None)
+
+
+@contextlib.contextmanager
+def latency_budget(seconds):
+    """在with语句中设置耗时预算，超出预算后发出的请求直接超时，正在进行的请求的超时时间也不会超过预算.
+
+    Args:
+        seconds (float): 预算秒数，小于等于0时不设置预算
+    """
+    if seconds <= 0:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class HttpClient(object):
+    """带有连接池的http客户端.
+
+    Attributes:
+        pool_size (int): 连接池的总连接数上限
+        pool_size_per_host (int): 每个host的连接数上限
+        keepalive_timeout (float): 空闲连接保持的秒数
+        dns_cache_ttl (int): dns解析结果缓存的秒数
+        timeouts (dict): 按接口配置的超时秒数，key为 host:port 或者 host:port/path 前缀，最长的前缀优先
+        stats (dict): key为host，value为该host的请求统计
+        inflight (dict): 正在进行的可合并请求，key为请求的url和参数，value为发送请求的任务
+        breaker_failures (int): 接口连续失败多少次后熔断，0为不熔断
+        breaker_recovery_time (float): 熔断后经过多少秒尝试恢复
+        hedge_percentile (float): 请求耗时超过该分位数后发送对冲请求
+        hedge_min_samples (int): 耗时样本数达到该值后才进行对冲
+        endpoints (dict): key为 host:port/path，value为 (熔断器, 耗时统计, 对冲次数统计)
+    """
+
+    def __init__(self, pool_size=100, pool_size_per_host=20, keepalive_timeout=30,
+                 dns_cache_ttl=300, timeouts=None, breaker_failures=5, breaker_recovery_time=10,
+                 hedge_percentile=95, hedge_min_samples=20):
+        self.pool_size = pool_size
+        self.pool_size_per_host = pool_size_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeouts = sorted((timeouts or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.breaker_failures = breaker_failures
+        self.breaker_recovery_time = breaker_recovery_time
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.stats = {}
+        self.inflight = {}
+        self.endpoints = {}
+        self._session = None
+        self._loop = None
+
+    def _get_stats(self, host):
+        if host not in self.stats:
+            self.stats[host] = {
+                "requests": 0,
+                "errors": 0,
+                "in_flight": 0,
+                "connections_created": 0,
+                "connections_reused": 0,
+                "coalesced": 0,
+                "total_seconds": 0.0,
+            }
+        return self.stats[host]
+
+    def _get_endpoint(self, url):
+        parts = urlsplit(url)
+        endpoint = parts.netloc + parts.path
+        if endpoint not in self.endpoints:
+            breaker = CircuitBreaker(self.breaker_failures, self.breaker_recovery_time)
+            self.endpoints[endpoint] = (breaker, LatencyRecorder(), {"hedged": 0, "hedge_wins": 0})
+        return self.endpoints[endpoint]
+
+    @staticmethod
+    async def _on_connection_create_end(session, context, params):
+        # context.trace_request_ctx 为发送请求时传入的host统计
+        context.trace_request_ctx["connections_created"] += 1
+
+    @staticmethod
+    async def _on_connection_reuseconn(session, context, params):
+        context.trace_request_ctx["connections_reused"] += 1
+
+    @property
+    def session(self):
+        """当前事件循环中的session，不存在时创建."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            # 旧的事件循环已经结束时，其中的连接无法再使用，直接丢弃
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._on_connection_create_end)
+            trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+            self._loop = loop
+        return self._session
+
+    def get_timeout(self, url, default):
+        """获取接口的超时时间.
+
+        Args:
+            url (str): 请求地址
+            default (float): 没有单独配置时的超时秒数
+
+        Returns:
+            float: 超时秒数
+        """
+        parts = urlsplit(url)
+        endpoint = parts.netloc + parts.path
+        for prefix, timeout in self.timeouts:
+            if endpoint.startswith(prefix):
+                return float(timeout)
+        return default
+
+    async def request(self, method, url, timeout=10, coalesce=False, hedge=False, **kwargs):
+        """发送请求并读取返回内容，读取完成后连接归还到连接池.
+
+        Args:
+            method (str): GET 或者 POST
+            url (str): 请求地址
+            timeout (float): 没有单独配置超时时的超时秒数
+            coalesce (bool): 是否与正在进行的相同请求合并
+            hedge (bool): 请求较慢时是否发送对冲请求
+            **kwargs: 传递给 aiohttp.ClientSession.request 的参数
+
+        Returns:
+            str: 返回内容
+
+        Raises:
+            CircuitOpenError: 接口处于熔断状态
+            asyncio.TimeoutError: 请求超时或者超出耗时预算
+            aiohttp.ClientError: 请求失败
+        """
+        key = self._coalesce_key(method, url, kwargs) if coalesce else None
+        if key is None:
+            return await self._call(method, url, timeout, hedge, kwargs)
+
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(method, url, timeout, hedge, kwargs))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self._finish_inflight(key, task))
+        else:
+            self._get_stats(urlsplit(url).hostname)["coalesced"] += 1
+        # 某个调用者被取消（如超时）时，不影响其他等待同一个请求的调用者
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _coalesce_key(method, url, kwargs):
+        try:
+            payload = json.dumps(kwargs, ensure_ascii=False, sort_keys=True)
+        except TypeError:
+            # 参数不能json序列化时不合并
+            return None
+        return method, url, payload
+
+    def _finish_inflight(self, key, task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if not task.cancelled():
+            # 所有调用者都已经被取消时，避免asyncio打印异常没有被获取的警告
+            task.exception()
+
+    async def _call(self, method, url, timeout, hedge, kwargs):
+        """一次逻辑调用，经过熔断器检查，可能包含对冲请求."""
+        timeout = self.get_timeout(url, timeout)
+        deadline = _deadline.get()
+        # 被耗时预算截断的超时不计入熔断器的失败次数
+        truncated = deadline is not None and deadline - time.monotonic() < timeout
+        if truncated:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                raise asyncio.TimeoutError()
+
+        breaker, latencies, hedge_stats = self._get_endpoint(url)
+        breaker.before_call()
+        try:
+            delay = self._hedge_delay(latencies) if hedge else None
+            if delay is not None and delay < timeout:
+                text, status = await self._hedged_request(method, url, timeout, delay, hedge_stats, kwargs)
+            else:
+                text, status = await self._request(method, url, timeout, kwargs)
+        except asyncio.TimeoutError:
+            if truncated:
+                breaker.on_cancel()
+            else:
+                breaker.on_failure()
+            raise
+        except aiohttp.ClientError:
+            breaker.on_failure()
+            raise
+        except asyncio.CancelledError:
+            breaker.on_cancel()
+            raise
+
+        if status >= 500:
+            breaker.on_failure()
+        else:
+            breaker.on_success()
+        return text
+
+    def _hedge_delay(self, latencies):
+        if len(latencies.samples) < self.hedge_min_samples:
+            return None
+        return latencies.percentile(self.hedge_percentile)
+
+    async def _hedged_request(self, method, url, timeout, delay, hedge_stats, kwargs):
+        """先发送一个请求，delay秒后没有返回时再发送一个相同的请求，使用先成功返回的结果."""
+        first = asyncio.ensure_future(self._request(method, url, timeout, kwargs))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return first.result()
+
+            hedge_stats["hedged"] += 1
+            second = asyncio.ensure_future(self._request(method, url, timeout - delay, kwargs))
+            tasks.append(second)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            hedge_stats["hedge_wins"] += 1
+                        return task.result()
+            # 两个请求都失败时抛出第一个请求的异常
+            return first.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _request(self, method, url, timeout, kwargs):
+        stats = self._get_stats(urlsplit(url).hostname)
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        start = time.perf_counter()
+        try:
+            client_timeout = aiohttp.ClientTimeout(total=timeout)
+            async with self.session.request(
+                method, url, timeout=client_timeout, trace_request_ctx=stats, **kwargs
+            ) as response:
+                text = await response.text()
+            self._get_endpoint(url)[1].record(time.perf_counter() - start)
+            return text, response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            stats["errors"] += 1
+            raise
+        finally:
+            stats["in_flight"] -= 1
+            stats["total_seconds"] += time.perf_counter() - start
+
+    def pool_stats(self):
+        """连接池统计.
+
+        Returns:
+            dict: pool_size、pool_size_per_host为连接池配置，hosts为每个host的请求次数、失败次数、
+                  正在进行的请求数、新建连接数、复用连接数、合并到其他请求而节省的请求数以及平均耗时（秒）
+        """
+        hosts = {}
+        for host, stats in self.stats.items():
+            hosts[host] = {key: value for key, value in stats.items() if key != "total_seconds"}
+            hosts[host]["avg_seconds"] = (
+                round(stats["total_seconds"] / stats["requests"], 4) if stats["requests"] else 0
+            )
+        return {
+            "pool_size": self.pool_size,
+            "pool_size_per_host": self.pool_size_per_host,
+            "hosts": hosts,
+        }
+
+    def endpoint_stats(self):
+        """每个接口的熔断状态和耗时分位数.
+
+        Returns:
+            dict: key为 host:port/path，value包含熔断状态state、连续失败次数failures、累计熔断次数opened、
+                  熔断期间拒绝的调用次数rejected、对冲请求次数hedged、对冲请求先返回的次数hedge_wins，
+                  以及最近请求耗时的p50、p95、p99（秒）
+        """
+        endpoints = {}
+        for endpoint, (breaker, latencies, hedge_stats) in self.endpoints.items():
+            endpoints[endpoint] = {
+                "state": breaker.state,
+                "failures": breaker.failures,
+                "opened": breaker.opened,
+                "rejected": breaker.rejected,
+                **hedge_stats,
+            }
+            for percent in (50, 95, 99):
+                value = latencies.percentile(percent)
+                endpoints[endpoint]["p{}".format(percent)] = None if value is None else round(value, 4)
+        return endpoints
+
+    async def close(self):
+        """关闭session及其中的所有连接."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+http_client = HttpClient(
+    pool_size=int(global_config["http_pool_size"]),
+    pool_size_per_host=int(global_config["http_pool_size_per_host"]),
+    keepalive_timeout=float(global_config["http_keepalive_timeout"]),
+    dns_cache_ttl=int(global_config["http_dns_cache_ttl"]),
+    timeouts=global_config["rpc_timeouts"],
+    breaker_failures=int(global_config["rpc_breaker_failures"]),
+    breaker_recovery_time=float(global_config["rpc_breaker_recovery_time"]),
+    hedge_percentile=float(global_config["rpc_hedge_percentile"]),
+    hedge_min_samples=int(global_config["rpc_hedge_min_samples"]),
+)